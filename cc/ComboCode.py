@@ -18,7 +18,7 @@ from cc.tools.io import DataIO
 from cc.tools.numerical import Gridding
 from cc.managers.ModelingManager import ModelingManager as MM
 from cc.managers.PlottingManager import PlottingManager as PM
-from cc.managers import Vic
+from cc.managers import Vic, Scheduler
 from cc.modeling.objects import Star, Transition
 from cc.statistics import UnresoStats, ResoStats, SedStats, ChemStats
 from cc.data.instruments import Pacs, Spire
@@ -126,6 +126,8 @@ class ComboCode(object):
                           ('iterations',2),('plot_iterative',0),\
                           ('vic_account','vsc30226'),('statistics',0),\
                           ('vic_time_per_sphinx',30),('vic_credits',None),\
+                          ('vic_scheduler','pbs'),\
+                          ('vic_host','login.vic3.cc.kuleuven.be'),\
                           ('append_results',0),('write_dust_density',0),\
                           ('replace_db_entry',0),('update_spec',0),\
                           ('path_gastronoom',''),('path_mcmax',''),\
@@ -136,6 +138,8 @@ class ComboCode(object):
                           ('recover_sphinxfiles',0),('stat_print',0),\
                           ('stat_lll_p',None),('stat_method','clipping'),\
                           ('star_name','model'),('single_session',0),\
+                          ('db_journal',0),('num_workers',1),\
+                          ('gastronoom_jobs',1),\
                           ('stat_lll_vmin',0.0),('chemistry',0),\
                           ('stat_lll_vmax',0.0), ('print_check_t',1),\
                           ('chemstats',0),('chemstats_molecules',[])]
@@ -187,6 +191,7 @@ class ComboCode(object):
         oversampling = self.processed_input.pop('PACS_OVERSAMPLING','')
         intrinsic = self.processed_input.pop('PACS_INTRINSIC',1)
         linefit = self.processed_input.pop('PACS_LINEFIT','')
+        convolution = self.processed_input.pop('PACS_CONVOLUTION','windowed')
         
         #-- If PACS is not requested, put self.pacs to None. Still popping the
         #   PACS specific keywords to avoid clutter in the Star() objects.
@@ -201,7 +206,8 @@ class ComboCode(object):
                                       redo_convolution=redo_convolution,\
                                       oversampling=oversampling,\
                                       intrinsic=intrinsic,\
-                                      path_linefit=linefit)
+                                      path_linefit=linefit,\
+                                      convolution=convolution)
             self.pacs[sn].setData(searchstring=searchstring)
 
 
@@ -220,6 +226,7 @@ class ComboCode(object):
         intrinsic = self.processed_input.pop('SPIRE_INTRINSIC',1)
         oversampling = self.processed_input.pop('SPIRE_OVERSAMPLING',0)
         linefit = self.processed_input.pop('SPIRE_LINEFIT','')
+        convolution = self.processed_input.pop('SPIRE_CONVOLUTION','windowed')
         
         #-- If SPIRE is not requested, put self.spire to None. Still popping the
         #   SPIRE specific keywords to avoid clutter in the Star() objects.
@@ -234,7 +241,8 @@ class ComboCode(object):
                                          resolution=resolution,\
                                          intrinsic=intrinsic,\
                                          oversampling=oversampling,\
-                                         path_linefit=linefit)
+                                         path_linefit=linefit,\
+                                         convolution=convolution)
             self.spire[sn].setData(searchstring=searchstring)
 
 
@@ -616,11 +624,16 @@ class ComboCode(object):
         '''
 
         if self.vic and self.gastronoom and self.sphinx :
+            scheduler = Scheduler.makeScheduler(self.vic_scheduler,\
+                                                user=self.vic_account,\
+                                                host=self.vic_host,\
+                                                max_jobs=self.gastronoom_jobs)
             self.vic_manager = Vic.Vic(path=self.path_gastronoom,\
                                        account=self.vic_account,\
                                        time_per_sphinx=self.vic_time_per_sphinx,\
                                        credits_acc=self.vic_credits,\
-                                       recover_sphinxfiles=self.recover_sphinxfiles)
+                                       recover_sphinxfiles=self.recover_sphinxfiles,\
+                                       scheduler=scheduler)
             if self.update_spec:
                 self.vic_manager.updateLineSpec()
         else:
@@ -649,6 +662,8 @@ class ComboCode(object):
                                 skip_cooling=self.skip_cooling,\
                                 recover_sphinxfiles=self.recover_sphinxfiles,\
                                 single_session=self.single_session,\
+                                db_journal=self.db_journal,\
+                                gastronoom_jobs=self.gastronoom_jobs,\
                                 )
 
 
@@ -691,34 +706,57 @@ class ComboCode(object):
             print '***********************************'
             print '** Starting grid calculation.'
             print '***********************************'
-            for star_index, star in enumerate(self.star_grid):
+            if self.num_workers > 1 and self.vic_manager:
+                print 'Parallel grid calculation is not possible with VIC. '+\
+                      'Calculating the grid with a single worker.'
+                self.num_workers = 1
+            if self.num_workers > 1:
+                print '** Calculating %i models with %i workers.'\
+                      %(len(self.star_grid),self.num_workers)
                 print '***********************************'
-                print '** Model #%i out of %i requested models.'\
-                      %(star_index+1,len(self.star_grid))
-                print '***********************************'
-                self.model_manager.startModeling(star,star_index)
-                #-- mline_done is True if in previous model an mline calculation
-                #-- was done: Only then do a progress check, because a lot of time
-                #-- has passed, but then a wait time is used to make sure the newly
-                #-- queued sphinx models after the mline model are properly queued.
-                if self.vic_manager \
-                        and self.vic_manager.getQueue() \
-                        and self.model_manager.mline_done_list[-1]:
-                    print '***********************************'
-                    print '** Current VIC queue:'
-                    print self.vic_manager.getQueue()
-                    self.vic_manager.checkProgress(wait_qstat=1)
-
-            if self.single_session:
-                if self.gastronoom: 
-                    self.model_manager.cool_db.sync()
-                    self.model_manager.ml_db.sync()
-                    self.model_manager.sph_db.sync()
-                if self.mcmax:    
-                    self.model_manager.mcmax_db.sync()
+                #-- The databases are synchronised at the end in any case
+                self.model_manager.startParallelModeling(self.star_grid,\
+                                                         self.num_workers)
+            else:
+                self.__runSerial()
                 
                 
 
+    def __runSerial(self):
+    
+        '''
+        Run the modeling for the grid of Star() objects one by one.
+        
+        '''
+        
+        for star_index, star in enumerate(self.star_grid):
+            print '***********************************'
+            print '** Model #%i out of %i requested models.'\
+                  %(star_index+1,len(self.star_grid))
+            print '***********************************'
+            self.model_manager.startModeling(star,star_index)
+            #-- mline_done is True if in previous model an mline calculation
+            #-- was done: Only then do a progress check, because a lot of time
+            #-- has passed, but then a wait time is used to make sure the newly
+            #-- queued sphinx models after the mline model are properly queued.
+            if self.vic_manager \
+                    and self.vic_manager.getQueue() \
+                    and self.model_manager.mline_done_list[-1]:
+                print '***********************************'
+                print '** Current VIC queue:'
+                print self.vic_manager.getQueue()
+                self.vic_manager.checkProgress(wait_qstat=1)
+
+        if self.single_session:
+            if self.gastronoom: 
+                self.model_manager.cool_db.sync()
+                self.model_manager.ml_db.sync()
+                self.model_manager.sph_db.sync()
+            if self.mcmax:    
+                self.model_manager.mcmax_db.sync()
+            
+            
+
     def finalizeVic(self):
 
         '''
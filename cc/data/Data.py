@@ -8,12 +8,14 @@ Author: R. Lombaert
 """
 
 import collections
+import time
 from scipy import mean, std, sqrt, log, isfinite
 from scipy import array, zeros, arange
 from scipy.stats import tmean, tstd
 from scipy.optimize import leastsq
 from scipy.integrate import trapz
 from scipy.special import erf
+from scipy import sparse
 import numpy as np
 
 from cc.tools.numerical import Interpol
@@ -105,12 +107,21 @@ def alignY(datalists,xmin,xmax,zeropoint=0,p0=[1,0,1.5,-2.5],func='power'):
 
 
 
-def doConvolution(x_in,y_in,x_out,widths,factor=5,oversampling=1):
+def doConvolution(x_in,y_in,x_out,widths,factor=5,oversampling=1,\
+                  method='windowed'):
 
     '''
     Perform convolution on lists with a Gaussian filter.
 
     Reduce the input grid to the target grid by integration.
+    
+    Two methods are available:
+        - windowed: The windows are found by bisection in the sorted input 
+          grid, and the Gaussian kernel is evaluated for many target points
+          at once. See convolveWindowed().
+        - direct: Every target point is handled separately, and the window is
+          convolved with convolveArray(). 
+    Both give the same result, but the windowed method is much faster.
 
     @param x_in: The input x-values
     @type x_in: array
@@ -135,12 +146,22 @@ def doConvolution(x_in,y_in,x_out,widths,factor=5,oversampling=1):
 
                            (default: 1)
     @type oversampling: int
+    @keyword method: The convolution method: 'windowed' or 'direct'
+    
+                     (default: 'windowed')
+    @type method: string
 
     @return: The resulting y-values
     @rtype: list
 
     '''
 
+    if method == 'windowed':
+        return list(convolveWindowed(x_in,y_in,x_out,widths,factor=factor,\
+                                     oversampling=oversampling))
+    elif method != 'direct':
+        raise ValueError('Convolution method %s unknown. Choose from '%method+\
+                         'windowed or direct.')
     x_in,y_in,x_out,widths = array(x_in),array(y_in),array(x_out),array(widths)
     y_out = []
     print 'Convolving for x_out between %.2f micron and %.2f micron with oversampling %i.' \
@@ -181,7 +202,439 @@ def doConvolution(x_in,y_in,x_out,widths,factor=5,oversampling=1):
 
 
 
-def convolveArray(xx, yy=None, sigma=3):
+def convolveWindowed(x_in,y_in,x_out,widths,factor=5,oversampling=1):
+
+    '''
+    Perform convolution on lists with a Gaussian filter, and reduce the input 
+    grid to the target grid by integration, as doConvolution does. 
+    
+    The convolution is linear in y_in, and is done as the product of the 
+    convolution matrix of getConvolutionMatrix with y_in. Target points whose
+    window only contains zeroes are skipped.
+
+    @param x_in: The input x-values
+    @type x_in: array
+    @param y_in: The input y-values
+    @type y_in: array
+    @param x_out: The target x-grid
+    @type x_out: array
+    @param widths: The full width/half maximum spectral resolution as a
+                   function of wavelength, i.e. the fwhm of the gaussian
+    @type widths: array
+
+    @keyword factor: the sigma factor for determining the window pushed through
+                     the gaussian filter. Beyond sigma*factor the contribution 
+                     of the y values is assumed to be negligible.
+
+                     (default: 5)
+    @type factor: int
+    @keyword oversampling: oversampling factor of the target x-grid with
+                           respect to the given spectral resolution.
+
+                           (default: 1)
+    @type oversampling: int
+
+    @return: The resulting y-values
+    @rtype: array
+
+    '''
+
+    y_in = np.array(y_in,dtype=float)
+    matrix = getConvolutionMatrix(x_in,x_out,widths,factor=factor,\
+                                  oversampling=oversampling,y_in=y_in)
+    return matrix.dot(y_in)
+
+
+
+def getConvolutionMatrix(x_in,x_out,widths,factor=5,oversampling=1,\
+                         y_in=None):
+
+    '''
+    Make the sparse matrix that convolves y-values on the input grid with a 
+    Gaussian filter, and reduces them to the target grid by integration, as 
+    doConvolution does. 
+    
+    The input grid is sorted, such that the window of every target point, 
+    and the bin that is integrated, are found by bisection. The Gaussian 
+    kernel is then evaluated for a block of target points at once. 
+    
+    The matrix only depends on the grids, the widths and the oversampling, 
+    so it can be reused for any number of y-value arrays on the same input 
+    grid. 
+
+    @param x_in: The input x-values
+    @type x_in: array
+    @param x_out: The target x-grid
+    @type x_out: array
+    @param widths: The full width/half maximum spectral resolution as a
+                   function of wavelength, i.e. the fwhm of the gaussian
+    @type widths: array
+
+    @keyword factor: the sigma factor for determining the window pushed through
+                     the gaussian filter. Beyond sigma*factor the contribution 
+                     of the y values is assumed to be negligible.
+
+                     (default: 5)
+    @type factor: int
+    @keyword oversampling: oversampling factor of the target x-grid with
+                           respect to the given spectral resolution.
+
+                           (default: 1)
+    @type oversampling: int
+    @keyword y_in: If given, the rows of target points whose window only 
+                   contains zeroes in y_in are left empty, since they give 
+                   zero anyway.
+                   
+                   (default: None)
+    @type y_in: array
+
+    @return: The convolution matrix, of shape (len(x_out),len(x_in))
+    @rtype: scipy.sparse.csr_matrix
+
+    '''
+
+    x_in = np.array(x_in,dtype=float)
+    x_out,widths = np.array(x_out,dtype=float),np.array(widths,dtype=float)
+    print 'Convolving for x_out between %.2f micron and %.2f micron with oversampling %i.' \
+          %(x_out[0],x_out[-1],int(oversampling))
+    isort = np.argsort(x_in,kind='mergesort')
+    x_in = x_in[isort]
+
+    #- Convert FWHM's to sigma for the gaussians, and set the binsizes
+    sigma = widths/(2.*sqrt(2.*log(2.)))
+    binsize = widths/oversampling
+
+    #-- The window and the bin of every target point, as index ranges
+    lo = np.searchsorted(x_in,x_out-factor*sigma,side='left')
+    hi = np.searchsorted(x_in,x_out+factor*sigma,side='right')
+    blo = np.maximum(np.searchsorted(x_in,x_out-binsize,side='left'),lo)
+    bhi = np.minimum(np.searchsorted(x_in,x_out+binsize,side='right'),hi)
+    bhi = np.maximum(bhi,blo)
+
+    #-- Target points with an empty window, or only zeroes in it, give zero.
+    if y_in is None:
+        todo = np.flatnonzero(hi > lo)
+    else:
+        nonzero = np.array(y_in,dtype=float)[isort] != 0
+        nonzero = np.concatenate([[0],np.cumsum(nonzero)])
+        todo = np.flatnonzero((hi > lo) & (nonzero[hi]-nonzero[lo] > 0))
+    nbin = (bhi-blo)[todo]
+    matrices = []
+
+    #-- If one value in the bin: add value
+    ii = todo[nbin == 1]
+    if ii.size:
+        matrices.append(convolveWindows(x_in,None,lo[ii],hi[ii],blo[ii],\
+                                        bhi[ii],sigma[ii],reduce='first',\
+                                        rows=ii,nrows=len(x_out)))
+        print 'Convolution has a window of only one element at %i '%ii.size+\
+              'target points.'
+    
+    #-- If more than one value: integrate
+    ii = todo[nbin > 1]
+    if ii.size:
+        matrices.append(convolveWindows(x_in,None,lo[ii],hi[ii],blo[ii],\
+                                        bhi[ii],sigma[ii],reduce='trapz',\
+                                        rows=ii,nrows=len(x_out)))
+    
+    #-- If no values in the bin: average of the window. This should not occur
+    #   ideally!
+    ii = todo[nbin == 0]
+    if ii.size:
+        print 'Convolution has a window of no elements at %i '%ii.size + \
+              'target points. Careful! Average is taken of ' + \
+              'sigma*factor window! This should not be happening...'
+        matrices.append(convolveWindows(x_in,None,lo[ii],hi[ii],lo[ii],\
+                                        hi[ii],sigma[ii],reduce='mean',\
+                                        rows=ii,nrows=len(x_out)))
+    
+    matrix = sparse.csr_matrix((len(x_out),len(x_in)))
+    for m in matrices:
+        matrix = matrix + m
+    
+    #-- Put the columns back in the order of the input grid
+    if np.any(isort != np.arange(len(isort))):
+        unsort = np.empty(len(isort),dtype=int)
+        unsort[isort] = np.arange(len(isort))
+        matrix = matrix.tocsc()[:,unsort].tocsr()
+    return matrix
+
+
+
+def convolveWindows(xx,yy,lo,hi,klo,khi,sigma,open_ends=1,reduce='first',\
+                    rows=None,nrows=None,max_size=2**21):
+
+    '''
+    Evaluate the Gaussian convolution of windows of a sorted pixel grid, as 
+    convolveArray does for one window, for many windows at once.
+    
+    Pixel j extends from halfway pixel j-1 to halfway pixel j+1. The pixels
+    lo:hi of a window are convolved, and the result is evaluated at pixels
+    klo:khi. 
+    
+    The convolution is linear in yy. The weight of every pixel in a window is 
+    calculated first, such that the result can also be returned as a sparse 
+    matrix. The windows are padded to the same size, and done in blocks of at
+    most max_size kernel evaluations.
+
+    @param xx: The sorted x values
+    @type xx: array
+    @param yy: The y values. If None, the convolution matrix is returned.
+    @type yy: array
+    @param lo: The first pixel of every window
+    @type lo: array
+    @param hi: The pixel after the last pixel of every window
+    @type hi: array
+    @param klo: The first pixel where the convolution is evaluated for every
+                window. At least one pixel is required.
+    @type klo: array
+    @param khi: The pixel after the last pixel where the convolution is
+                evaluated for every window
+    @type khi: array
+    @param sigma: The width of the gaussian profile for every window
+    @type sigma: array
+
+    @keyword open_ends: The first and last pixel of a window extend to 
+                        infinity, as in convolveArray. Otherwise, only the
+                        first and last pixel of the grid do, and the windows
+                        are simply cut off.
+
+                        (default: 1)
+    @type open_ends: bool
+    @keyword reduce: How the convolution in pixels klo:khi is reduced to one
+                     value per window: 'first' for the value in pixel klo,
+                     'trapz' for the integral divided by the x range, or 
+                     'mean' for the average.
+
+                     (default: 'first')
+    @type reduce: string
+    @keyword rows: The row of the matrix for every window. Default is one row
+                   per window, in order. 
+
+                   (default: None)
+    @type rows: array
+    @keyword nrows: The number of rows of the matrix. Default is the number 
+                    of windows.
+
+                    (default: None)
+    @type nrows: int
+    @keyword max_size: The maximum number of kernel evaluations in a block
+
+                       (default: 2**21)
+    @type max_size: int
+
+    @return: The reduced convolution for every window, or the convolution 
+             matrix of shape (nrows,len(xx)) if yy is None
+    @rtype: array/scipy.sparse.csr_matrix
+
+    '''
+
+    xx = np.asarray(xx,dtype=float)
+    lo,hi,klo,khi = [np.asarray(a,dtype=int) for a in [lo,hi,klo,khi]]
+    sigma = np.asarray(sigma,dtype=float)*np.ones(len(lo))
+    if rows is None:
+        rows = np.arange(len(lo))
+    if nrows is None:
+        nrows = len(lo)
+    nx = len(xx)
+    #-- Pixel borders. Border j is the lower border of pixel j+1. The last 
+    #   pixel extends to infinity.
+    borders = np.concatenate([0.5*(xx[1:]+xx[:-1]),[np.inf]])
+    nwin,nk = hi-lo,khi-klo
+    nmax,kmax = nwin.max(),nk.max()
+    step = max(1,int(max_size/((nmax+1)*kmax)))
+    jj,kk = np.arange(nmax+1),np.arange(kmax)
+    mrows,mcols,mdata = [],[],[]
+    for i in xrange(0,len(lo),step):
+        sl = slice(i,i+step)
+        ilo,n,iklo,ink = lo[sl],nwin[sl],klo[sl],nk[sl]
+        
+        #-- The borders of the pixels in the windows. The padding is at 
+        #   infinity, so it does not contribute.
+        edges = borders[np.clip(ilo[:,None]+jj[None,:]-1,0,nx-1)]
+        if open_ends:
+            edges[:,0] = -np.inf
+            edges[jj[None,:] >= n[:,None]] = np.inf
+        else:
+            edges[:,0] = np.where(ilo > 0,borders[np.maximum(ilo-1,0)],\
+                                  -np.inf)
+            edges[jj[None,:] > n[:,None]] = np.inf
+        
+        #-- The weights of the evaluated pixels in the reduction
+        xk = xx[np.minimum(iklo[:,None]+kk[None,:],nx-1)]
+        valid = kk[None,:] < ink[:,None]
+        if reduce == 'first':
+            coeffs = np.zeros(xk.shape)
+            coeffs[:,0] = 1.
+        elif reduce == 'mean':
+            coeffs = valid/ink[:,None].astype(float)
+        elif reduce == 'trapz':
+            dx = np.where(valid[:,1:],np.diff(xk,axis=1),0.)
+            width = xk[np.arange(len(ink)),ink-1]-xk[:,0]
+            coeffs = np.zeros(xk.shape)
+            coeffs[:,1:] += 0.5*dx
+            coeffs[:,:-1] += 0.5*dx
+            coeffs /= width[:,None]
+        else:
+            raise ValueError('Reduction %s unknown. Choose from first, '%reduce\
+                             +'trapz or mean.')
+        
+        #-- The weight of every pixel in the windows
+        arg = (edges[:,None,:]-xk[:,:,None])\
+                    /(sqrt(2)*sigma[sl][:,None,None])
+        kernel = 0.5*np.diff(erf(arg),axis=2)
+        weights = np.sum(coeffs[:,:,None]*kernel,axis=1)
+        inwin = jj[None,:-1] < n[:,None]
+        mrows.append((rows[sl][:,None]*np.ones(nmax,dtype=int))[inwin])
+        mcols.append((ilo[:,None]+jj[None,:-1])[inwin])
+        mdata.append(weights[inwin])
+    matrix = sparse.csr_matrix((np.concatenate(mdata),\
+                                (np.concatenate(mrows),\
+                                 np.concatenate(mcols))),\
+                               shape=(nrows,nx))
+    if yy is None:
+        return matrix
+    return matrix.dot(np.asarray(yy,dtype=float))
+
+
+
+def getArrayConvolutionMatrix(xx,sigma=3,factor=5):
+
+    '''
+    Make the sparse matrix that convolves y-values on a sorted grid with a 
+    Gaussian of constant width, evaluated on the same grid, as convolveArray
+    does. Only pixels within factor*sigma contribute to the convolution in a
+    pixel.
+    
+    @param xx: The sorted x values
+    @type xx: array
+    
+    @keyword sigma: width of the gaussian profile
+
+                    (default: 3)
+    @type sigma: float
+    @keyword factor: The sigma factor beyond which pixels do not contribute
+    
+                     (default: 5)
+    @type factor: float
+    
+    @return: The convolution matrix, of shape (len(xx),len(xx))
+    @rtype: scipy.sparse.csr_matrix
+    
+    '''
+    
+    xx = np.asarray(xx,dtype=float)
+    ii = np.arange(len(xx))
+    lo = np.searchsorted(xx,xx-factor*sigma,side='left')
+    hi = np.searchsorted(xx,xx+factor*sigma,side='right')
+    return convolveWindows(xx,None,lo,hi,ii,ii+1,sigma,open_ends=0)
+
+
+
+def getRebinMatrix(x_in,x_out,binsize):
+
+    '''
+    Make the sparse matrix that integrates y-values on the input grid over a
+    bin around every target point, divided by the bin size. 
+    
+    The bin of a target point includes the input points within binsize of 
+    it. The integration uses the trapezoidal rule. Bins with fewer than two 
+    input points give zero.
+    
+    @param x_in: The sorted input x-values
+    @type x_in: array
+    @param x_out: The target x-grid
+    @type x_out: array
+    @param binsize: The half width of the bins
+    @type binsize: float
+    
+    @return: The rebin matrix, of shape (len(x_out),len(x_in))
+    @rtype: scipy.sparse.csr_matrix
+    
+    '''
+    
+    x_in,x_out = np.asarray(x_in,dtype=float),np.asarray(x_out,dtype=float)
+    lo = np.searchsorted(x_in,x_out-binsize,side='left')
+    hi = np.searchsorted(x_in,x_out+binsize,side='right')
+    mrows,mcols,mdata = [],[],[]
+    for i,(ilo,ihi) in enumerate(zip(lo,hi)):
+        if ihi-ilo < 2:
+            continue
+        dx = np.diff(x_in[ilo:ihi])
+        coeffs = np.zeros(ihi-ilo)
+        coeffs[1:] += 0.5*dx
+        coeffs[:-1] += 0.5*dx
+        mrows.append(i*np.ones(ihi-ilo,dtype=int))
+        mcols.append(np.arange(ilo,ihi))
+        mdata.append(coeffs/binsize)
+    if not mdata:
+        return sparse.csr_matrix((len(x_out),len(x_in)))
+    return sparse.csr_matrix((np.concatenate(mdata),\
+                              (np.concatenate(mrows),np.concatenate(mcols))),\
+                             shape=(len(x_out),len(x_in)))
+
+
+
+def benchmarkConvolution(x_in,y_in,x_out,widths,factor=5,oversampling=1,\
+                         repeat=3):
+
+    '''
+    Compare the windowed and direct convolution methods of doConvolution in
+    speed and result.
+
+    @param x_in: The input x-values
+    @type x_in: array
+    @param y_in: The input y-values
+    @type y_in: array
+    @param x_out: The target x-grid
+    @type x_out: array
+    @param widths: The full width/half maximum spectral resolution as a
+                   function of wavelength, i.e. the fwhm of the gaussian
+    @type widths: array
+
+    @keyword factor: the sigma factor for determining the window pushed 
+                     through the gaussian filter.
+
+                     (default: 5)
+    @type factor: int
+    @keyword oversampling: oversampling factor of the target x-grid with
+                           respect to the given spectral resolution.
+
+                           (default: 1)
+    @type oversampling: int
+    @keyword repeat: The number of times each method is ran. The fastest run
+                     is kept.
+                     
+                     (default: 3)
+    @type repeat: int
+
+    @return: The run time in seconds of the direct and of the windowed method,
+             and the maximum difference between both results relative to the
+             maximum of the direct result
+    @rtype: (float,float,float)
+
+    '''
+
+    times = dict()
+    results = dict()
+    for method in ['direct','windowed']:
+        times[method] = []
+        for i in xrange(repeat):
+            t0 = time.time()
+            results[method] = doConvolution(x_in,y_in,x_out,widths,\
+                                            factor=factor,method=method,\
+                                            oversampling=oversampling)
+            times[method].append(time.time()-t0)
+    direct,windowed = array(results['direct']),array(results['windowed'])
+    diff = np.max(np.abs(direct-windowed))/max(np.max(np.abs(direct)),1e-300)
+    print 'Direct convolution: %.3f s. Windowed convolution: %.3f s.'\
+          %(min(times['direct']),min(times['windowed']))
+    print 'Maximum relative difference: %.2e.'%diff
+    return min(times['direct']),min(times['windowed']),diff
+
+
+
+def convolveArray(xx, yy=None, sigma=3, factor=None):
 
     """
     Convolves an intensity-versus-velocity profile with
@@ -201,6 +654,12 @@ def convolveArray(xx, yy=None, sigma=3):
 
                     (default: 3)
     @type sigma: float
+    @keyword factor: If not None, only pixels within factor*sigma contribute
+                     to the convolution in a pixel, and the windows are 
+                     evaluated with convolveWindows. Requires xx to be sorted.
+                     
+                     (default: None)
+    @type factor: float
 
     @return: The new y values after convolution
     @rtype: array
@@ -211,6 +670,10 @@ def convolveArray(xx, yy=None, sigma=3):
         yy = xx[1,:]
         xx = xx[0,:]
 
+    if not factor is None:
+        matrix = getArrayConvolutionMatrix(xx,sigma=sigma,factor=factor)
+        return matrix.dot(np.asarray(yy,dtype=float))
+
     if xx == array([]):
         out = array([0.0])
     elif len(xx)==1:
@@ -41,14 +41,13 @@ def readTelescopeProperties(telescope):
     
     """
     
-    all_telescopes = DataIO.getInputData(keyword='TELESCOPE',start_index=5,\
-                                         filename='Telescope.dat')
     if 'PACS' in telescope: 
         telescope = 'PACS'
     else:
         telescope = telescope
     try:
-        tel_index = all_telescopes.index(telescope)
+        tel_index = DataIO.getInputIndex(telescope,keyword='TELESCOPE',\
+                                         start_index=5,filename='Telescope.dat')
     except ValueError:
         raise ValueError('%s not found in Telescope.dat.'%telescope)
                                  
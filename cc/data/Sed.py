@@ -8,6 +8,8 @@ Author: R. Lombaert
 """
 
 import os
+import hashlib
+from collections import OrderedDict
 from numpy import argsort,array
 from scipy.integrate import trapz
 from scipy.interpolate import interp1d
@@ -30,6 +32,17 @@ from cc.modeling.tools import Reddening
 from cc.modeling.codes import MCMax
 
 
+#-- The photometry integration weights of the last max_weights model 
+#   wavelength grids, see getPhotometryWeights.
+photometry_weights = OrderedDict()
+max_weights = 5
+
+#-- Version of the saved photometry weights. Weights with a different version
+#   are made anew.
+WEIGHTS_VERSION = 1
+
+
+
 def getCFlux(wav,seds=[],star_grid=[],nans=1,deredden=[],\
              law='Fitz2004Chiar2006',lawtype='ism',map='marshall'):
     
@@ -240,6 +253,319 @@ def calcPhotometry(w,f,photbands):
 
 
 
+def getInterpIndices(x,xp):
+
+    '''
+    Return the indices and fractions with which np.interp(x,xp,fp) 
+    interpolates any fp on the sorted grid xp, i.e. 
+    fp[i0] + t*(fp[i1]-fp[i0]).
+    
+    Points outside of xp are set to the nearest end point, as np.interp does.
+    
+    @param x: The x-coordinates at which to interpolate
+    @type x: array
+    @param xp: The sorted x-coordinates of the data points
+    @type xp: array
+    
+    @return: The lower and upper indices and the fractions
+    @rtype: (array,array,array)
+    
+    '''
+    
+    x,xp = np.asarray(x,dtype=float),np.asarray(xp,dtype=float)
+    if len(xp) == 1:
+        i0 = np.zeros(len(x),dtype=int)
+        return i0, i0, np.zeros(len(x))
+    i0 = np.clip(np.searchsorted(xp,x,side='right')-1,0,len(xp)-2)
+    i1 = i0 + 1
+    dx = xp[i1]-xp[i0]
+    t = np.where(dx > 0,(x-xp[i0])/np.where(dx > 0,dx,1.),0.)
+    return i0, i1, np.clip(t,0.,1.)
+    
+    
+    
+def getTrapzWeights(x):
+
+    '''
+    Return the weights with which np.trapz(y,x=x) sums any y.
+    
+    @param x: The x-coordinates
+    @type x: array
+    
+    @return: The weights
+    @rtype: array
+    
+    '''
+    
+    dx = np.diff(np.asarray(x,dtype=float))
+    weights = np.zeros(len(x))
+    weights[:-1] += 0.5*dx
+    weights[1:] += 0.5*dx
+    return weights
+
+
+
+def makePhotometryWeights(w,photbands):
+
+    ''' 
+    Make the weights that integrate a model spectrum over a set of 
+    photometric bands, as calcPhotometry does through synthetic_flux of the 
+    IvS repo. 
+    
+    The integration only depends on the wavelength grid of the model and the
+    bands. It is linear in the flux, except for infrared bands that are 
+    integrated on a dense logarithmic grid, onto which synthetic_flux 
+    interpolates the logarithm of the flux. For those bands, the interpolation
+    indices and fractions on the model grid are kept together with the 
+    weights on the dense grid.
+    
+    The conversions of the flux from Jy to erg/s/cm2/Hz and back cancel, and 
+    are left out.
+    
+    @param w: the wavelengths in micron, as given to calcPhotometry
+    @type w: array()
+    @param photbands: the photometric bands
+    @type photbands: array(str)
+    
+    @return: The weights of the linear bands on the model grid ('linear', 
+             shape (len(w),len(photbands))), the bands for which no model 
+             points are available ('nan'), and the index of every band on the
+             dense grid with the lower and upper model grid indices, the 
+             fractions and the weights of the dense grid points ('log').
+    @rtype: dict
+    
+    '''
+    
+    #-- Speed of light in angstrom/s
+    c = 2.99792458e18
+    lam = np.asarray(w,dtype=float)*1e4
+    filter_info = filters.get_info()
+    keep = np.searchsorted(filter_info['photband'],photbands)
+    filter_info = filter_info[keep]
+    
+    weights = dict()
+    weights['linear'] = np.zeros((len(lam),len(photbands)))
+    weights['nan'] = np.zeros(len(photbands),dtype=bool)
+    weights['log'] = []
+    for i,photband in enumerate(photbands):
+        waver,transr = filters.get_response(photband)
+        region = ((waver[0]-0.4*waver[0])<=lam) & (lam<=(2*waver[-1]))
+        ireg = np.flatnonzero(region)
+        
+        #-- The infrared bands of coarse models are integrated on a dense 
+        #   logarithmic grid. Otherwise the model grid itself is used.
+        dense = filter_info['eff_wave'][i] >= 4e4 and 1 < ireg.size < 1e5
+        if dense:
+            wave_ = np.logspace(np.log10(lam[ireg[0]]),\
+                                np.log10(lam[ireg[-1]]),100000)
+            j0,j1,t = getInterpIndices(np.log10(wave_),np.log10(lam[ireg]))
+        else:
+            wave_ = lam[ireg]
+        if not len(wave_):
+            weights['nan'][i] = True
+            continue
+        
+        #-- Add the response curve grid if few points cover the band
+        nbase = len(wave_)
+        if (np.searchsorted(wave_,waver[-1])\
+                -np.searchsorted(wave_,waver[0])) < 5:
+            wave__ = np.sort(np.hstack([wave_,waver]))
+            k0,k1,u = getInterpIndices(wave__,wave_)
+            wave_ = wave__
+        else:
+            k0 = k1 = np.arange(nbase)
+            u = np.zeros(nbase)
+        
+        #-- The integration in Fnu, with the same ordering of the integrands 
+        #   as synthetic_flux
+        transr = np.interp(wave_,waver,transr,left=0,right=0)
+        freq_ = c/wave_
+        sa = np.argsort(freq_)
+        if filter_info['type'][i] == 'BOL':
+            coeffs = getTrapzWeights(freq_[sa])*transr[sa]
+        elif filter_info['type'][i] == 'CCD':
+            coeffs = getTrapzWeights(wave_)*transr[sa]/freq_[sa]
+        else:
+            coeffs = np.zeros(len(wave_))
+        norm = coeffs.sum()
+        if not norm and filter_info['type'][i] in ['BOL','CCD']:
+            weights['nan'][i] = True
+            continue
+        wf = np.zeros(len(wave_))
+        wf[sa] = coeffs/(norm or 1.)
+        
+        #-- Flambda to Fnu on the integration grid, and back to the grid of 
+        #   the model or the dense grid
+        wf *= wave_**2/c
+        wb = np.bincount(k0,wf*(1-u),minlength=nbase)[:nbase] \
+                + np.bincount(k1,wf*u,minlength=nbase)[:nbase]
+        if dense:
+            weights['log'].append((i,ireg[j0],ireg[j1],t,wb))
+        else:
+            #-- Jy to Flambda on the model grid
+            weights['linear'][ireg,i] = wb*c/lam[ireg]**2
+    return weights
+
+
+
+def getPhotometryWeights(w,photbands,folder=None):
+
+    ''' 
+    Return the weights that integrate model spectra on a wavelength grid over
+    a set of photometric bands, see makePhotometryWeights.
+    
+    The weights are made once per grid and set of bands, saved in the folder
+    if given, and kept in memory for the last max_weights grids.
+    
+    @param w: the wavelengths in micron
+    @type w: array()
+    @param photbands: the photometric bands
+    @type photbands: array(str)
+    
+    @keyword folder: The folder where the weights are saved. Not saved if 
+                     None.
+                     
+                     (default: None)
+    @type folder: str
+    
+    @return: The weights
+    @rtype: dict
+    
+    '''
+    
+    w = np.asarray(w,dtype=float)
+    md5 = hashlib.md5()
+    md5.update('%i %s'%(WEIGHTS_VERSION,' '.join(photbands)))
+    md5.update(w.tostring())
+    key = md5.hexdigest()
+    if photometry_weights.has_key(key):
+        weights = photometry_weights.pop(key)
+        photometry_weights[key] = weights
+        return weights
+    
+    #-- Read the weights from the folder if they were made before
+    fn = folder and os.path.join(folder,'photweights_%s.npz'%key)
+    weights = None
+    if fn and os.path.isfile(fn):
+        try:
+            npz = np.load(fn)
+            try:
+                weights = dict([('linear',npz['linear']),('nan',npz['nan']),\
+                                ('log',[])])
+                for i in npz['log_bands']:
+                    weights['log'].append((int(i),npz['j0_%i'%i],\
+                                           npz['j1_%i'%i],npz['t_%i'%i],\
+                                           npz['v_%i'%i]))
+            finally:
+                npz.close()
+        except (IOError,ValueError,KeyError):
+            weights = None
+    if weights is None:
+        weights = makePhotometryWeights(w,photbands)
+        if fn:
+            savePhotometryWeights(weights,fn)
+    
+    photometry_weights[key] = weights
+    while len(photometry_weights) > max_weights:
+        photometry_weights.popitem(last=False)
+    return weights
+
+
+
+def savePhotometryWeights(weights,fn):
+
+    ''' 
+    Save the photometry weights of a wavelength grid. 
+    
+    The weights are written to a temporary file first, which is then moved,
+    such that other sessions never read a partial file. Failing to write,
+    e.g. in a read-only folder, is not an error.
+    
+    @param weights: The weights, see makePhotometryWeights
+    @type weights: dict
+    @param fn: The filename
+    @type fn: str
+    
+    '''
+    
+    arrays = dict([('linear',weights['linear']),('nan',weights['nan'])])
+    arrays['log_bands'] = np.array([lw[0] for lw in weights['log']],dtype=int)
+    for i,j0,j1,t,v in weights['log']:
+        arrays['j0_%i'%i] = j0.astype(np.int32)
+        arrays['j1_%i'%i] = j1.astype(np.int32)
+        arrays['t_%i'%i] = t
+        arrays['v_%i'%i] = v
+    tmp = '%s.%i.tmp'%(fn,os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(fn)):
+            os.makedirs(os.path.dirname(fn))
+        FILE = open(tmp,'wb')
+        np.savez(FILE,**arrays)
+        FILE.close()
+        os.rename(tmp,fn)
+    except (IOError,OSError):
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+
+
+
+def calcGridPhotometry(w,fluxes,photbands,folder=None,max_size=2**22):
+
+    ''' 
+    Calculate the (model) photometry for a grid of models that share one 
+    wavelength grid, for a given set of photometric bands. 
+    
+    Gives the same photometry as calcPhotometry for every model, but the 
+    integration weights are made once per wavelength grid (see 
+    getPhotometryWeights). All bands that are linear in the flux are then 
+    calculated for all models with a single matrix product. The infrared bands
+    that are integrated on a dense grid are done per band for blocks of 
+    models.
+    
+    Reddening is assumed to have been done before this.
+    
+    @param w: the wavelengths in micron
+    @type w: array()
+    @param fluxes: Flux grids in Jy, one per model
+    @type fluxes: list[array]/array
+    @param photbands: the photometric bands
+    @type photbands: array(str)
+    
+    @keyword folder: The folder where the integration weights are saved. Not
+                     saved if None.
+                     
+                     (default: None)
+    @type folder: str
+    @keyword max_size: The maximum number of dense grid points evaluated at 
+                       once.
+                       
+                       (default: 2**22)
+    @type max_size: int
+    
+    @return: The photometry in Jy, one row per model
+    @rtype: array
+    
+    '''
+    
+    fluxes = np.atleast_2d(np.asarray(fluxes,dtype=float))
+    weights = getPhotometryWeights(w,photbands,folder=folder)
+    mphot = fluxes.dot(weights['linear'])
+    
+    if weights['log']:
+        c = 2.99792458e18
+        lam = np.asarray(w,dtype=float)*1e4
+        lflam = np.log10(fluxes*c/lam**2)
+        for i,j0,j1,t,v in weights['log']:
+            step = max(1,int(max_size/len(v)))
+            for k in xrange(0,len(fluxes),step):
+                lf = lflam[k:k+step]
+                dense = 10**(lf[:,j0]+t*(lf[:,j1]-lf[:,j0]))
+                mphot[k:k+step,i] = dense.dot(v)
+    mphot[:,weights['nan']] = np.nan
+    return mphot
+
+
+
 def buildPhotometry(star_name,fn='Photometric_IvS',remove=[]):
     '''
     Retrieve the photometry of a star through the IvS repo's SED builder. 
@@ -263,7 +589,7 @@ def buildPhotometry(star_name,fn='Photometric_IvS',remove=[]):
     '''
     
     #-- Get the SIMBAD name of the star
-    si = DataIO.getInputData(filename='Star.dat').index(star_name)
+    si = DataIO.getInputIndex(star_name,filename='Star.dat')
     sn_sim = DataIO.getInputData(keyword='STAR_NAME_PLOTS')[si]
     sn_sim = sn_sim.replace('$','').replace('\\','')
     
@@ -380,7 +706,7 @@ class Sed(object):
         
         """
         
-        self.star_index = DataIO.getInputData().index(self.star_name)
+        self.star_index = DataIO.getInputIndex(self.star_name)
         self.ll = DataIO.getInputData(keyword='LONG',rindex=self.star_index)
         self.bb = DataIO.getInputData(keyword='LAT',rindex=self.star_index)
         snp = DataIO.getInputData(keyword='STAR_NAME_PLOTS',\
@@ -8,12 +8,17 @@ Author: R. Lombaert
 """
 
 import os
+import hashlib
 from glob import glob
+from collections import OrderedDict
 from scipy import argmin,argmax,array,sqrt
+from scipy import sparse
 import scipy
+import numpy as np
 
 import cc.path
 from cc.tools.io import DataIO
+from cc.tools.numerical import Operators as op
 from cc.modeling.objects import Star
 
 
@@ -24,10 +29,13 @@ class Instrument(object):
     Instrument-specific calculations.
     
     """
+    
+    #-- The number of response matrices kept in memory by getResponse
+    max_responses = 10
         
     def __init__(self,star_name,instrument_name,oversampling,\
                  code='GASTRoNOoM',path=None,intrinsic=1,path_linefit='',\
-                 blend_factor=1.2):        
+                 blend_factor=1.2,convolution='windowed'):        
         
         """ 
         Initializing an instance of Instrument.
@@ -72,6 +80,12 @@ class Instrument(object):
                                
                                (default: 1.2)
         @type blend_factor: float
+        @keyword convolution: The method for convolving the Sphinx output
+                              with the spectral resolution: 'windowed' or 
+                              'direct'. See Data.doConvolution().
+                              
+                              (default: 'windowed')
+        @type convolution: string
 
         """
         
@@ -84,8 +98,10 @@ class Instrument(object):
         self.intrinsic = intrinsic
         self.oversampling = int(oversampling)
         self.blend_factor = float(blend_factor)
+        self.convolution = convolution
+        self.responses = OrderedDict()
         self.data_filenames = []
-        istar = DataIO.getInputData(keyword='STAR_NAME').index(star_name)
+        istar = DataIO.getInputIndex(star_name,keyword='STAR_NAME')
         #-- Set relevant velocities in cm/s
         self.c = 2.99792458e10 
         self.vlsr = float(DataIO.getInputData(keyword='V_LSR',rindex=istar))*10**5
@@ -99,6 +115,155 @@ class Instrument(object):
         
 
     
+    def getResponseFolder(self):
+    
+        '''
+        Return the folder where the response matrices of the instrument are 
+        saved, next to the results of the convolution of the models. 
+        
+        @return: The folder, or None if no model output path is set
+        @rtype: string
+        
+        '''
+        
+        if self.path is None:
+            return None
+        pp = getattr(cc.path,self.code.lower())
+        return os.path.join(pp,self.path,'stars',self.star_name,\
+                            '%s_results'%self.instrument.upper(),'responses')
+
+
+
+    def getResponse(self,x_in,x_out,widths,shared=1):
+    
+        '''
+        Return the response matrix that convolves a model spectrum on grid x_in
+        to the resolution of the data on grid x_out. 
+        
+        The matrix only depends on the grids, the resolution and the 
+        oversampling, not on the model flux. It is made by makeResponse once, 
+        and kept in memory for the last max_responses grids. The fluxes of all 
+        models on the same grid are then convolved with a single matrix 
+        product.
+        
+        The model grid usually follows the line profiles of the model, so most
+        grids belong to a single model. The matrix is only saved in the 
+        response folder for later sessions if the grid is shared by several 
+        models, otherwise the folder would hold a matrix for every model.
+        
+        @param x_in: The wavelength grid of the model
+        @type x_in: array
+        @param x_out: The wavelength grid of the data
+        @type x_out: array
+        @param widths: The spectral resolution on the data grid
+        @type widths: array/float
+        
+        @keyword shared: The grid is shared by several models, and the matrix
+                         is saved in the response folder.
+        
+                         (default: 1)
+        @type shared: bool
+        
+        @return: The response matrix, of shape (len(x_out),len(x_in))
+        @rtype: scipy.sparse.csr_matrix
+        
+        '''
+        
+        x_in,x_out = np.array(x_in,dtype=float),np.array(x_out,dtype=float)
+        widths = np.array(widths,dtype=float)
+        md5 = hashlib.md5()
+        md5.update('%s %i %s'%(self.instrument,self.oversampling,\
+                               self.convolution))
+        for arr in [x_in,x_out,widths]:
+            md5.update(arr.tostring())
+        key = md5.hexdigest()
+        if self.responses.has_key(key):
+            response = self.responses.pop(key)
+            self.responses[key] = response
+            return response
+        
+        #-- Read the matrix from the response folder if it was made before
+        folder = self.getResponseFolder()
+        fn = folder and os.path.join(folder,'response_%s.npz'%key)
+        response = None
+        if fn and os.path.isfile(fn):
+            try:
+                npz = np.load(fn)
+                try:
+                    response = sparse.csr_matrix((npz['data'],npz['indices'],\
+                                                  npz['indptr']),\
+                                                 shape=tuple(npz['shape']))
+                finally:
+                    npz.close()
+            except (IOError,ValueError,KeyError):
+                response = None
+        if response is None:
+            response = self.makeResponse(x_in,x_out,widths)
+            if fn and shared:
+                self.saveResponse(response,fn)
+        
+        self.responses[key] = response
+        while len(self.responses) > self.max_responses:
+            self.responses.popitem(last=False)
+        return response
+        
+        
+        
+    def makeResponse(self,x_in,x_out,widths):
+    
+        '''
+        Make the response matrix that convolves a model spectrum on grid x_in
+        to the resolution of the data on grid x_out. 
+        
+        Defined by the instrument-specific subclasses.
+        
+        @param x_in: The wavelength grid of the model
+        @type x_in: array
+        @param x_out: The wavelength grid of the data
+        @type x_out: array
+        @param widths: The spectral resolution on the data grid
+        @type widths: array
+        
+        @return: The response matrix, of shape (len(x_out),len(x_in))
+        @rtype: scipy.sparse.csr_matrix
+        
+        '''
+        
+        raise NotImplementedError
+        
+        
+        
+    def saveResponse(self,response,fn):
+    
+        '''
+        Save a response matrix. 
+        
+        The matrix is written to a temporary file first, which is then moved,
+        such that other sessions never read a partial file. Failing to write,
+        e.g. in a read-only folder, is not an error.
+        
+        @param response: The response matrix
+        @type response: scipy.sparse.csr_matrix
+        @param fn: The filename
+        @type fn: string
+        
+        '''
+        
+        tmp = '%s.%i.tmp'%(fn,os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(fn)):
+                os.makedirs(os.path.dirname(fn))
+            FILE = open(tmp,'wb')
+            np.savez(FILE,data=response.data,indices=response.indices,\
+                     indptr=response.indptr,shape=np.array(response.shape))
+            FILE.close()
+            os.rename(tmp,fn)
+        except (IOError,OSError):
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+        
+        
+        
     def readTelescopeProperties(self):
     
         """
@@ -317,8 +482,7 @@ class Instrument(object):
         #      With the exception of lines superimposed, which should typically
         #      be avoided. Line matching will not be very accurate in this 
         #      case.
-        imatches = [argmin(abs(lf.wave_fit-mwav))
-                    for (st,mwav) in strans]
+        imatches = op.findNearest(lf.wave_fit,[mwav for (st,mwav) in strans])
         matches = [(mwav <= lf.wave_fit[ii] + lf.fwhm_fit[ii] \
                         and mwav >= lf.wave_fit[ii] - lf.fwhm_fit[ii]) \
                     and (lf.wave_fit[ii],ii) or (None,None)
@@ -328,9 +492,11 @@ class Instrument(object):
         #      line. These are blended IN MODEL and/or IN DATA.
         #      Check for model blend is done by looking for ALL transitions 
         #      that have been matched with a single fitted wavelength.
-        matches_wv = array([mm[0] for mm in matches])
-        wf_blends = [list(array([st for st,mwav in strans])[matches_wv==wv]) 
-                     for wv in lf.wave_fit]
+        blends_wv = dict()
+        for (st,mwav),(match,ii) in zip(strans,matches):
+            if not match is None:
+                blends_wv.setdefault(match,[]).append(st)
+        wf_blends = [blends_wv.get(wv,[]) for wv in lf.wave_fit]
         #      Use the wave_fit array indices from matches[:][1] to check  
         #      if indeed multiple transitions were found for the same wav.
         #      If positive, include True if the particular transition is  
@@ -377,6 +543,37 @@ class Instrument(object):
                 
                 
                 
+    def getSphinxConvolutions(self,star_grid,fn):
+        
+        '''
+        Return the sphinx convolutions of a grid of models for one dataset, 
+        as one array with one row per model.
+        
+        The convolutions are given on the wavelength grid of the dataset. 
+        Models for which no convolution is available get a row of NaNs.
+        
+        @param star_grid: The Star() objects
+        @type star_grid: list[Star()]
+        @param fn: The filename of the dataset (band) for which the 
+                   convolutions are to be returned.
+        @type fn: str
+        
+        @return: The wavelength grid of the dataset, and the convolved fluxes
+        @rtype: (array,array)
+        
+        '''
+        
+        dwav = self.data_wave_list[self.data_filenames.index(fn)]
+        mfluxes = np.empty((len(star_grid),len(dwav)))
+        mfluxes.fill(np.nan)
+        for i,star in enumerate(star_grid):
+            mflux = self.getSphinxConvolution(star,fn)[1]
+            if len(mflux):
+                mfluxes[i] = mflux
+        return dwav, mfluxes
+        
+        
+        
     def mergeSphinx(self,star):
         
         '''
@@ -10,6 +10,8 @@ Author: R. Lombaert
 import os
 import subprocess
 import cPickle
+import hashlib
+from collections import OrderedDict
 from glob import glob
 from time import gmtime
 from scipy import array,argsort,interpolate
@@ -79,7 +81,7 @@ class Pacs(Instrument):
     """
     
     def __init__(self,star_name,oversampling,path=None,redo_convolution=0,\
-                 intrinsic=1,path_linefit=''):
+                 intrinsic=1,path_linefit='',convolution='windowed'):
         
         '''
         Initializing an instance of Pacs().
@@ -118,13 +120,20 @@ class Pacs(Instrument):
                                
                                (default: '')
         @type path_linefit: string
+        @keyword convolution: The method for convolving the Sphinx output
+                              with the spectral resolution: 'windowed' or 
+                              'direct'. See Data.doConvolution().
+                              
+                              (default: 'windowed')
+        @type convolution: string
         
         '''
         
         super(Pacs,self).__init__(star_name=star_name,code='GASTRoNOoM',\
                                   path_linefit=path_linefit,path=path,\
                                   oversampling=oversampling,blend_factor=1.2,\
-                                  instrument_name='PACS',intrinsic=intrinsic)
+                                  instrument_name='PACS',intrinsic=intrinsic,\
+                                  convolution=convolution)
         self.data_wave_list = []
         self.data_flux_list = []
         self.data_ordernames = []
@@ -147,6 +156,11 @@ class Pacs(Instrument):
                 self.db_path = None
         
         self.sphinx_prep_done = 0
+        #-- Sphinx models waiting to be convolved, see __convolvePending()
+        self.__pending = []
+        #-- Database entries of new PACS ids, added to the database once a
+        #   convolution has been written, see __makeNewId()
+        self.__new_entries = dict()
         self.readLineFit()
 
 
@@ -292,14 +306,19 @@ class Pacs(Instrument):
         if not self.sphinx_prep_done or redo_sphinx_prep:
             print '** Loading from database, or convolving with ' + \
                   'Gaussian and rebinning to data wavelength grid.'  
+            self.__pending = []
             for i,star in enumerate(star_grid):
                 print '* Sphinx model %i out of %i.' %(i+1,len(star_grid))
                 if not star['LAST_GASTRONOOM_MODEL']: 
                     print '* No cooling model found.'
                 else:
                     self.__convolveSphinx(star=star)
-                    if star['LAST_PACS_MODEL']:
+                    #-- Queued convolutions are done in __convolvePending
+                    if star['LAST_PACS_MODEL'] \
+                            and not star['LAST_PACS_MODEL'] \
+                                in [p[0] for p in self.__pending]:
                         print '* %s is done!'%star['LAST_PACS_MODEL']
+            self.__convolvePending()
             self.sphinx_prep_done = 1
             self.db.sync()
                       
@@ -333,6 +352,129 @@ class Pacs(Instrument):
 
 
 
+    def makeResponse(self,x_in,x_out,widths):
+    
+        '''
+        Make the response matrix that convolves a Sphinx model spectrum on 
+        grid x_in to the PACS resolution on the data grid x_out, as 
+        Data.doConvolution does. 
+        
+        @param x_in: The wavelength grid of the model
+        @type x_in: array
+        @param x_out: The wavelength grid of the data
+        @type x_out: array
+        @param widths: The spectral resolution on the data grid
+        @type widths: array
+        
+        @return: The response matrix, of shape (len(x_out),len(x_in))
+        @rtype: scipy.sparse.csr_matrix
+        
+        '''
+        
+        return Data.getConvolutionMatrix(x_in=x_in,x_out=x_out,widths=widths,\
+                                         oversampling=self.oversampling)
+
+
+
+    def __convolvePending(self):
+        
+        '''
+        Convolve the Sphinx models that were collected by __convolveSphinx.
+        
+        Models with the same wavelength grid are convolved for one data file
+        with a single product of the response matrix and the model fluxes.
+        
+        '''
+        
+        groups = OrderedDict()
+        for pending in self.__pending:
+            key = (pending[2],hashlib.md5(pending[3].tostring()).hexdigest())
+            groups.setdefault(key,[]).append(pending)
+        for (i_file,grid),group in groups.items():
+            response = self.getResponse(x_in=group[0][3],\
+                                        x_out=self.data_wave_list[i_file],\
+                                        widths=self.data_delta_list[i_file],\
+                                        shared=len(group) > 1)
+            fluxes = np.column_stack([pending[4] for pending in group])
+            convolved = response.dot(fluxes)
+            for j,(pacs_id,filename,i_file,wave,flux) in enumerate(group):
+                self.__writeConvolution(pacs_id,filename,i_file,\
+                                        convolved[:,j])
+        for pacs_id in OrderedDict.fromkeys([p[0] for p in self.__pending]):
+            print '* %s is done!'%pacs_id
+        self.__pending = []
+        
+        
+        
+    def __makeNewId(self,star):
+        
+        '''
+        Make a new PACS id for a star, based on the current UTC. 
+        
+        The windowed convolution only queues the models, so several models of
+        a grid get a new id within the same second. An id that is in use in 
+        the database, or was already handed out in this session, gets a 
+        counter as suffix.
+        
+        The database entry of the id is kept aside until the first 
+        convolution of the model is written, see __writeConvolution.
+        
+        @param star: The parameter set
+        @type star: Star()
+        
+        @return: The PACS id
+        @rtype: string
+        
+        '''
+        
+        base_id = 'pacs_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i'%tuple(gmtime()[:6])
+        pacs_id = base_id
+        i = 1
+        while self.db.has_key(pacs_id) or self.__new_entries.has_key(pacs_id):
+            pacs_id = '%s_%i'%(base_id,i)
+            i += 1
+        self.__new_entries[pacs_id] = \
+            dict([('filenames',[]),\
+                  ('trans_list',star.getTransList(dtype='PACS')),\
+                  ('cooling_id',star['LAST_GASTRONOOM_MODEL'])])
+        return pacs_id
+        
+        
+        
+    def __writeConvolution(self,pacs_id,filename,i_file,sph_conv):
+        
+        '''
+        Write a convolved Sphinx model and add it to the PACS database. 
+        
+        New PACS ids are added to the database here, once their first 
+        convolution is written.
+        
+        @param pacs_id: The PACS model id
+        @type pacs_id: string
+        @param filename: The filename of the data file
+        @type filename: string
+        @param i_file: The index of the data file
+        @type i_file: int
+        @param sph_conv: The convolved model flux on the data grid
+        @type sph_conv: array
+        
+        '''
+        
+        if self.__new_entries.has_key(pacs_id):
+            DataIO.testFolderExistence(\
+                os.path.join(cc.path.gout,'stars',self.star_name,\
+                             'PACS_results',pacs_id))
+            self.db[pacs_id] = self.__new_entries.pop(pacs_id)
+        sph_fn = os.path.join(cc.path.gout,'stars',self.star_name,\
+                              'PACS_results',pacs_id,\
+                              '_'.join(['sphinx',filename])) 
+        DataIO.writeCols(filename=sph_fn,\
+                         cols=[self.data_wave_list[i_file],sph_conv])
+        self.db[pacs_id]['filenames'].append(filename)
+        self.db.addChangedKey(pacs_id)
+
+
+
     def __convolveSphinx(self,star):
         
         '''
@@ -391,32 +533,25 @@ class Pacs(Instrument):
                 i_file = [os.path.split(f)[1] 
                           for f in self.data_filenames].index(filename)
                 if not star['LAST_PACS_MODEL']:
-                    star['LAST_PACS_MODEL'] = \
-                        'pacs_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i'\
-                        %(gmtime()[0],gmtime()[1],gmtime()[2],\
-                          gmtime()[3],gmtime()[4],gmtime()[5])
-                    self.db[star['LAST_PACS_MODEL']] = \
-                        dict([('filenames',[]),\
-                              ('trans_list',star.getTransList(dtype='PACS')),\
-                              ('cooling_id',star['LAST_GASTRONOOM_MODEL'])])
-                    DataIO.testFolderExistence(\
-                        os.path.join(cc.path.gout,'stars',self.star_name,\
-                                     'PACS_results',star['LAST_PACS_MODEL']))
+                    star['LAST_PACS_MODEL'] = self.__makeNewId(star)
                 #-- Correct for the v_lsr of the central source
                 sphinx_wave_corr = array(sphinx_wave)*(1./(1-self.vlsr/self.c))
+                
+                #-- The windowed convolution is done for all models at once 
+                if self.convolution == 'windowed':
+                    self.__pending.append((star['LAST_PACS_MODEL'],filename,\
+                                           i_file,sphinx_wave_corr,\
+                                           array(sphinx_flux)))
+                    continue
                 sph_conv = Data.doConvolution(\
                                         x_in=sphinx_wave_corr,\
                                         y_in=sphinx_flux,\
                                         x_out=self.data_wave_list[i_file],\
                                         widths=self.data_delta_list[i_file],\
-                                        oversampling=self.oversampling)
-                sph_fn = os.path.join(cc.path.gout,'stars',self.star_name,\
-                                      'PACS_results',star['LAST_PACS_MODEL'],\
-                                      '_'.join(['sphinx',filename])) 
-                DataIO.writeCols(filename=sph_fn,\
-                                 cols=[self.data_wave_list[i_file],sph_conv])
-                self.db[star['LAST_PACS_MODEL']]['filenames'].append(filename)
-                self.db.addChangedKey(star['LAST_PACS_MODEL'])        
+                                        oversampling=self.oversampling,\
+                                        method=self.convolution)
+                self.__writeConvolution(star['LAST_PACS_MODEL'],filename,\
+                                        i_file,sph_conv)
         
         #- Idea:
         #- 1) grab model flux and wavelength, data flux and wavelengthm, 
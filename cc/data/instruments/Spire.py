@@ -8,7 +8,9 @@ Author: R. Lombaert
 """
 
 import os
+import hashlib
 import numpy as np
+from collections import OrderedDict
 from scipy import array,sqrt,trapz,log, argmin
 
 import cc.path
@@ -27,7 +29,8 @@ class Spire(Instrument):
     """
     
     def __init__(self,star_name,resolution,oversampling,\
-                 path=None,intrinsic=1,path_linefit=''):
+                 path=None,intrinsic=1,path_linefit='',\
+                 convolution='windowed'):
         
         '''
         Initializing an instance of Spire().
@@ -60,17 +63,26 @@ class Spire(Instrument):
                                
                                (default: '')
         @type path_linefit: string
+        @keyword convolution: The method for convolving the Sphinx output
+                              with the spectral resolution: 'windowed' or 
+                              'direct'. See Data.doConvolution().
+                              
+                              (default: 'windowed')
+        @type convolution: string
         
         '''
         
         super(Spire,self).__init__(star_name=star_name,code='GASTRoNOoM',\
                                    path=path,oversampling=oversampling,\
                                    path_linefit=path_linefit,blend_factor=1.3,\
-                                   instrument_name='SPIRE',intrinsic=intrinsic)
+                                   instrument_name='SPIRE',intrinsic=intrinsic,\
+                                   convolution=convolution)
         #- resolution is given in cm^-1
         self.resolution = float(resolution)
         self.sigma = self.resolution/(2.*sqrt(2.*log(2.)))
         self.sphinx_convolution = dict()
+        #-- Sphinx models waiting to be convolved, see __convolvePending()
+        self.__pending = []
         if not self.resolution:
             print 'WARNING! SPIRE resolution is undefined!'
         self.readLineFit()
@@ -100,6 +112,7 @@ class Spire(Instrument):
         if not self.sphinx_convolution or redo_sphinx_prep:
             print 'Convolving with Gaussian and rebinning to data ' + \
                   'wavelength grid.'            
+            self.__pending = []
             for i,star in enumerate(star_grid):
                 print '* Sphinx model %i out of %i.' %(i+1,len(star_grid))
                 if not star['LAST_GASTRONOOM_MODEL']: 
@@ -108,6 +121,9 @@ class Spire(Instrument):
                     self.sphinx_convolution[i] = dict()
                     star['LAST_SPIRE_MODEL'] = i
                     self.__convolveSphinx(star=star)
+            self.__convolvePending()
+            for i,star in enumerate(star_grid):
+                if star['LAST_GASTRONOOM_MODEL']: 
                     if self.sphinx_convolution[i]:
                         print '* Model %i with cooling id %s is done!'\
                               %(i,star['LAST_GASTRONOOM_MODEL'])
@@ -183,6 +199,11 @@ class Spire(Instrument):
                 new_flux.append(f)
         new_wav, new_flux = array(new_wav), array(new_flux)
         
+        #-- The windowed convolution is done for all models at once 
+        if self.convolution == 'windowed':
+            self.__pending.append((star['LAST_SPIRE_MODEL'],new_wav,new_flux))
+            return
+        
         #-- convolve the model fluxes with a gaussian and constant sigma(spire)
         print '* Convolving Sphinx model for SPIRE.'
         convolution = Data.convolveArray(new_wav,new_flux,s)
@@ -203,6 +224,64 @@ class Spire(Instrument):
 
 
 
+    def makeResponse(self,x_in,x_out,widths):
+    
+        '''
+        Make the response matrix that convolves a Sphinx model spectrum on 
+        wave number grid x_in to the SPIRE resolution, and rebins it to the 
+        data wave number grid x_out.
+        
+        @param x_in: The wave number grid of the model
+        @type x_in: array
+        @param x_out: The wave number grid of the data
+        @type x_out: array
+        @param widths: The spectral resolution in wave number
+        @type widths: float
+        
+        @return: The response matrix, of shape (len(x_out),len(x_in))
+        @rtype: scipy.sparse.csr_matrix
+        
+        '''
+        
+        sigma = float(widths)/(2.*sqrt(2.*log(2.)))
+        convolution = Data.getArrayConvolutionMatrix(x_in,sigma=sigma,factor=5)
+        rebin = Data.getRebinMatrix(x_in,x_out,\
+                                    float(widths)/self.oversampling)
+        return rebin.dot(convolution).tocsr()
+
+
+
+    def __convolvePending(self):
+        
+        '''
+        Convolve the Sphinx models that were collected by __convolveSphinx.
+        
+        Models with the same wave number grid are convolved and rebinned for 
+        one data file with a single product of the response matrix and the 
+        model fluxes.
+        
+        '''
+        
+        groups = OrderedDict()
+        for pending in self.__pending:
+            key = hashlib.md5(pending[1].tostring()).hexdigest()
+            groups.setdefault(key,[]).append(pending)
+        for group in groups.values():
+            print '* Convolving %i Sphinx model(s) for SPIRE.'%len(group)
+            fluxes = np.column_stack([pending[2] for pending in group])
+            for data_wav,fn in zip(self.data_wave_list,self.data_filenames):
+                #-- Convert wavelengths to wave number
+                data_cm = 1./data_wav*10**4
+                response = self.getResponse(x_in=group[0][1],x_out=data_cm,\
+                                            widths=self.resolution,\
+                                            shared=len(group) > 1)
+                rebinned = response.dot(fluxes)
+                for j,(imodel,wav,flux) in enumerate(group):
+                    self.sphinx_convolution[imodel][fn] = rebinned[:,j]
+        self.__pending = []
+        
+        
+        
     def readLineFit(self):
         
         '''
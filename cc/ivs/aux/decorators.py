@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 Various decorator functions
-    - Memoization with args and kwargs (@memoized)
+    - Memoization with args and kwargs, with a size limit (@memoized)
     - Make a parallel version of a function (@make_parallel)
     - Retry with exponential backoff (@retry(3,2))
     - Retry accessing website with exponential backoff (@retry(3,2))
@@ -13,6 +13,7 @@ Various decorator functions
 """
 import functools
 import cPickle
+import hashlib
 import time
 import logging
 import sys
@@ -20,27 +21,145 @@ import math
 import socket
 import logging
 import inspect
+from collections import OrderedDict
+import numpy as np
 
 logger = logging.getLogger("DEC")
+#-- the memoized functions per module: {module name: {function name: Memoizer}}
 memory = {}
+#-- argument types that are used as they are in the memoization key
+_plain_types = (str,unicode,int,long,bool,type(None))
+#-- floating point types are keyed on their repr, since nan != nan
+_float_types = (float,complex,np.floating,np.complexfloating)
 
 #{ Common tools
-def memoized(fctn):
+def make_key(args,kwargs):
+    """
+    Make a hashable key for the arguments of a function call.
+    
+    Strings, numbers and other hashable objects are used as they are, tagged
+    with their type so that e.g. 1 and 1.0 give a different key. Floats are
+    keyed on their repr, so that calls with NaN arguments hit the cache. Arrays are
+    keyed on their dtype, shape and a digest of their data, lists, tuples and
+    dictionaries on their elements. Anything else is pickled.
+    
+    @param args: positional arguments
+    @type args: tuple
+    @param kwargs: keyword arguments
+    @type kwargs: dict
+    @return: the key
+    @rtype: tuple
+    """
+    return (make_key_item(args),
+            tuple([(key,make_key_item(kwargs[key])) for key in sorted(kwargs)]))
+
+def make_key_item(value):
+    """
+    Make a hashable key for a single argument, see L{make_key}.
+    
+    @param value: the argument
+    @type value: anything
+    @return: the key
+    @rtype: hashable
+    """
+    vtype = type(value)
+    if vtype in _plain_types:
+        return (vtype,value)
+    if isinstance(value,_float_types):
+        return (vtype,repr(value))
+    if isinstance(value,np.ndarray):
+        if value.dtype.hasobject:
+            return (vtype,cPickle.dumps(value,2))
+        digest = hashlib.md5(np.ascontiguousarray(value).view(np.uint8)).digest()
+        return (vtype,value.dtype.str,value.shape,digest)
+    if vtype in (list,tuple):
+        return (vtype,tuple([make_key_item(item) for item in value]))
+    if isinstance(value,dict):
+        return (vtype,tuple([(make_key_item(key),make_key_item(value[key]))
+                              for key in sorted(value)]))
+    try:
+        hash(value)
+        return (vtype,value)
+    except TypeError:
+        return (vtype,cPickle.dumps(value,2))
+
+class Memoizer(object):
+    """
+    Least-recently-used cache of the return values of one function.
+    
+    The number of hits and misses is counted, so that the cache can be
+    profiled with L{memoization_info}.
+    """
+    def __init__(self,fctn,maxsize=256):
+        """
+        @param fctn: the function
+        @type fctn: callable
+        @param maxsize: maximum number of return values that are kept. If None,
+        the cache is not bounded.
+        @type maxsize: int
+        """
+        self.fctn = fctn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.cache = OrderedDict()
+    
+    def __call__(self,*args,**kwargs):
+        key = make_key(args,kwargs)
+        if key in self.cache:
+            self.hits += 1
+            value = self.cache.pop(key)
+            self.cache[key] = value
+            return value
+        self.misses += 1
+        value = self.fctn(*args,**kwargs)
+        self.cache[key] = value
+        logger.debug("Function %s memoized"%(str(self.fctn)))
+        while self.maxsize is not None and len(self.cache)>self.maxsize:
+            self.cache.popitem(last=False)
+        return value
+    
+    def info(self):
+        """
+        Return the statistics of the cache.
+        
+        @return: number of hits, misses, current size and maximum size
+        @rtype: dict
+        """
+        return dict(hits=self.hits,misses=self.misses,size=len(self.cache),
+                    maxsize=self.maxsize)
+    
+    def clear(self):
+        """
+        Remove all return values from the cache. The counters are kept.
+        """
+        self.cache.clear()
+
+def memoized(fctn=None,maxsize=256):
     """
     Cache a function's return value each time it is called.
     If called later with the same arguments, the cached value is returned, and
     not re-evaluated.
+    
+    Only the last C{maxsize} return values are kept. Use as C{@memoized}, or
+    as C{@memoized(maxsize=4)} for functions that return large objects. The
+    cache is available as the C{memoizer} attribute of the decorated function,
+    and registered per module in C{memory}.
+    
+    @param fctn: the function
+    @type fctn: callable
+    @param maxsize: maximum number of return values that are kept, None for
+    no limit
+    @type maxsize: int
     """
+    if fctn is None:
+        return lambda fctn: memoized(fctn,maxsize=maxsize)
+    memoizer = Memoizer(fctn,maxsize=maxsize)
     @functools.wraps(fctn)
     def memo(*args,**kwargs):
-        haxh = cPickle.dumps((fctn.__name__, args, sorted(kwargs.iteritems())))
-        modname = fctn.__module__
-        if not (modname in memory):
-            memory[modname] = {}
-        if not (haxh in memory[modname]):
-            memory[modname][haxh] = fctn(*args,**kwargs)
-            logger.debug("Function %s memoized"%(str(fctn)))
-        return memory[modname][haxh]
+        return memoizer(*args,**kwargs)
+    memo.memoizer = memoizer
+    memory.setdefault(fctn.__module__,{})[fctn.__name__] = memoizer
     if memo.__doc__:
         memo.__doc__ = "\n".join([memo.__doc__,"This function is memoized."])
     return memo
@@ -48,14 +167,37 @@ def memoized(fctn):
 def clear_memoization(keys=None):
     """
     Clear contents of memory
+    
+    @param keys: the modules of which the memoized functions are cleared. All
+    modules if None.
+    @type keys: list of str
     """
     if keys is None:
         keys = memory.keys()
     for key in keys:
         if key in memory:
-            riddens = [memory[key].pop(ikey) for ikey in memory[key].keys()[:]]
+            for memoizer in memory[key].values():
+                memoizer.clear()
     logger.debug("Memoization cleared")
 
+def memoization_info(keys=None):
+    """
+    Return the hits, misses and sizes of the memoized functions.
+    
+    @param keys: the modules of which the memoized functions are included.
+    All modules if None.
+    @type keys: list of str
+    @return: the statistics per function, keyed by 'module.function'
+    @rtype: dict
+    """
+    if keys is None:
+        keys = memory.keys()
+    info = {}
+    for key in keys:
+        for name,memoizer in memory.get(key,{}).items():
+            info['.'.join([key,name])] = memoizer.info()
+    return info
+
 def make_parallel(fctn):
     """
     Make a parallel version of a function.
@@ -446,7 +446,7 @@ def add_custom_filter(wave,response,**kwargs):
         if 'lit' in name:
             myrow[name] = 0
         myrow[name] = kwargs.pop(name,myrow[name])
-    del decorators.memory[__name__]
+    decorators.clear_memoization(keys=[__name__])
     #-- add info:
     custom_filters[photband]['zp'] = myrow
     logger.debug('Added photband {0} to the predefined set'.format(photband))
@@ -1728,7 +1728,7 @@ def get_igrid_dimensions(**kwargs):
 
 
 
-@memoized
+@memoized(maxsize=4)
 def get_grid_mesh(wave=None,teffrange=None,loggrange=None,**kwargs):
     """
     Return InterpolatingFunction spanning the available grid of atmosphere models.
@@ -2276,7 +2276,7 @@ def luminosity(wave,flux,radius=1.):
 
 #}
 
-@memoized
+@memoized(maxsize=4)
 def _get_itable_markers(photbands,
                     teffrange=(-np.inf,np.inf),loggrange=(-np.inf,np.inf),
                     ebvrange=(-np.inf,np.inf),zrange=(-np.inf,np.inf),
@@ -2342,7 +2342,7 @@ def _get_itable_markers(photbands,
     return np.array(markers),(grid_teffs,grid_loggs,grid_ebvs,grid_z),gridpnts,flux
 
 
-@memoized
+@memoized(maxsize=4)
 def _get_pix_grid(photbands,
                     teffrange=(-np.inf,np.inf),loggrange=(-np.inf,np.inf),
                     ebvrange=(-np.inf,np.inf),zrange=(-np.inf,np.inf),
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+Running shell commands concurrently on the local machine.
+
+Author: R. Lombaert
+
+"""
+
+import time
+import subprocess
+from collections import deque
+
+
+
+class JobRunner(object):
+
+    """
+    A local job runner that executes shell commands in a bounded pool of
+    processes.
+
+    Jobs are submitted with a command, a log file to which the output of the
+    command is written, and a callback. At most max_jobs commands run at the
+    same time. The callbacks are called in the process of the JobRunner, in
+    the order in which the jobs finish, such that e.g. database updates are
+    never done concurrently.
+
+    Typical use:
+
+    >>> runner = JobRunner(max_jobs=4)
+    >>> for fn in filenames:
+    >>>     runner.submit('echo %s | sphinx'%fn,logfile=fn+'.log',\
+                          callback=check,args=(fn,))
+    >>> runner.wait()
+
+    """
+
+    def __init__(self,max_jobs=1,poll_time=1.):
+
+        """
+        Initializing a JobRunner instance.
+
+        @keyword max_jobs: The maximum number of commands running at the same
+                           time
+
+                           (default: 1)
+        @type max_jobs: int
+        @keyword poll_time: The time in seconds between two checks of the
+                            running commands
+
+                            (default: 1.)
+        @type poll_time: float
+
+        """
+
+        self.max_jobs = max(1,int(max_jobs))
+        self.poll_time = float(poll_time)
+        self.queue = deque()
+        self.running = []
+
+
+
+    def submit(self,command,logfile=None,callback=None,args=()):
+
+        '''
+        Submit a shell command to the runner.
+
+        The command is started right away if fewer than max_jobs commands are
+        running. Otherwise it is queued and started as soon as possible during
+        poll() or wait().
+
+        @param command: The shell command
+        @type command: string
+
+        @keyword logfile: The file to which stdout and stderr of the command are
+                          written. If None, the output goes to the shell.
+
+                          (default: None)
+        @type logfile: string
+        @keyword callback: Called with args and the return code of the command
+                           once the command is finished
+
+                           (default: None)
+        @type callback: function
+        @keyword args: The arguments passed to the callback
+
+                       (default: ())
+        @type args: tuple
+
+        '''
+
+        self.queue.append((command,logfile,callback,tuple(args)))
+        self.__start()
+
+
+
+    def __start(self):
+
+        '''
+        Start queued commands as long as fewer than max_jobs are running.
+
+        '''
+
+        while self.queue and len(self.running) < self.max_jobs:
+            command,logfile,callback,args = self.queue.popleft()
+            if logfile is None:
+                log = None
+            else:
+                log = open(logfile,'w')
+            process = subprocess.Popen(command,shell=True,stdout=log,\
+                                       stderr=log and subprocess.STDOUT)
+            self.running.append((process,log,callback,args,command))
+
+
+
+    def poll(self):
+
+        '''
+        Check the running commands, call the callbacks of the finished ones,
+        and start queued commands.
+
+        @return: The number of commands running or queued
+        @rtype: int
+
+        '''
+
+        still_running = []
+        finished = []
+        for job in self.running:
+            if job[0].poll() is None:
+                still_running.append(job)
+            else:
+                finished.append(job)
+        self.running = still_running
+        self.__start()
+        for process,log,callback,args,command in finished:
+            if not log is None:
+                log.close()
+            if not callback is None:
+                callback(*(args+(process.returncode,)))
+        return len(self.running) + len(self.queue)
+
+
+
+    def getCommands(self):
+
+        '''
+        Get the commands that are running or queued.
+
+        @return: The running commands, followed by the queued commands
+        @rtype: list[string]
+
+        '''
+
+        return [job[4] for job in self.running] + [job[0] for job in self.queue]
+
+
+
+    def wait(self):
+
+        '''
+        Wait until all submitted commands are finished.
+
+        The callbacks are called as the commands finish.
+
+        '''
+
+        while self.poll():
+            time.sleep(self.poll_time)
+
+
+
+    def terminate(self):
+
+        '''
+        Kill the running commands and clear the queue. No callbacks are called.
+
+        '''
+
+        self.queue.clear()
+        for process,log,callback,args,command in self.running:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if not log is None:
+                log.close()
+        self.running = []
+
@@ -8,14 +8,55 @@ Author: R. Lombaert
 """
 
 import os, time
+import multiprocessing
 
 import cc.path
 from cc.modeling.codes.MCMax import MCMax
 from cc.modeling.codes.Gastronoom import Gastronoom
+from cc.modeling.codes.ModelingSession import ModelingSession
 from cc.tools.io import Database
 
 
 
+#-- The ModelingManager used by the worker processes of a parallel grid 
+#   calculation. Inherited by the workers when they are forked.
+_worker_manager = None
+
+
+
+def _initWorker(manager):
+    
+    '''
+    Initialize a worker process of a parallel grid calculation.
+    
+    @param manager: The modeling manager of the CC session
+    @type manager: ModelingManager()
+    
+    '''
+    
+    global _worker_manager
+    _worker_manager = manager
+    
+
+
+def _modelStar(args):
+    
+    '''
+    Model a single Star() in a worker process of a parallel grid calculation.
+    
+    @param args: The index of the Star() object in the grid, and the Star()
+    @type args: tuple(int,Star())
+    
+    @return: The results of ModelingManager.modelStar() 
+    @rtype: tuple
+    
+    '''
+    
+    star_index, star = args
+    return _worker_manager.modelStar(star,star_index)
+
+
+
 class ModelingManager():
     
     """ 
@@ -27,7 +68,8 @@ class ModelingManager():
                  mcmax=0,gastronoom=0,sphinx=0,iterative=0,\
                  num_model_sessions=1,vic_manager=None,replace_db_entry=0,\
                  path_gastronoom='runTest',path_mcmax='runTest',\
-                 skip_cooling=0,recover_sphinxfiles=0,single_session=0):
+                 skip_cooling=0,recover_sphinxfiles=0,single_session=0,\
+                 db_journal=0,gastronoom_jobs=1):
         
         """ 
         Initializing a ModelingManager instance.
@@ -100,6 +142,18 @@ class ModelingManager():
                                  
                                  (default: 0)
         @type single_session: bool
+        @keyword db_journal: Synchronize the databases through a journal, 
+                             instead of rewriting the full database with 
+                             every synchronisation. See Database().
+                             
+                             (default: 0)
+        @type db_journal: bool
+        @keyword gastronoom_jobs: The number of mline and sphinx calculations 
+                                  ran at the same time for a single model. See
+                                  Gastronoom().
+                                  
+                                  (default: 1)
+        @type gastronoom_jobs: int
         
         """
         
@@ -121,6 +175,8 @@ class ModelingManager():
         self.path_gastronoom = path_gastronoom
         self.recover_sphinxfiles = recover_sphinxfiles
         self.single_session = single_session
+        self.db_journal = db_journal
+        self.gastronoom_jobs = int(gastronoom_jobs)
         
         #-- Convenience paths
         cc.path.gout = os.path.join(cc.path.gastronoom,self.path_gastronoom)
@@ -146,12 +202,16 @@ class ModelingManager():
                                       'GASTRoNOoM_mline_models.db')
             sph_db_path = os.path.join(cc.path.gout,\
                                        'GASTRoNOoM_sphinx_models.db')
-            self.cool_db = Database.Database(db_path=cool_db_path)
-            self.ml_db = Database.Database(db_path=ml_db_path)
-            self.sph_db = Database.Database(db_path=sph_db_path)       
+            self.cool_db = Database.Database(db_path=cool_db_path,\
+                                             journal=self.db_journal)
+            self.ml_db = Database.Database(db_path=ml_db_path,\
+                                           journal=self.db_journal)
+            self.sph_db = Database.Database(db_path=sph_db_path,\
+                                            journal=self.db_journal)
         if self.mcmax:
             mcmax_db_path = os.path.join(cc.path.mout,'MCMax_models.db')
-            self.mcmax_db = Database.Database(db_path=mcmax_db_path)
+            self.mcmax_db = Database.Database(db_path=mcmax_db_path,\
+                                              journal=self.db_journal)
         if not self.vic is None:
             self.vic.setSphinxDb(self.sph_db)
         
@@ -256,7 +316,8 @@ class ModelingManager():
                                         replace_db_entry=self.replace_db_entry,\
                                         new_entries=self.new_entries_cooling,\
                                         recover_sphinxfiles=self.recover_sphinxfiles,\
-                                        single_session=self.single_session)
+                                        single_session=self.single_session,\
+                                        jobs=self.gastronoom_jobs)
                     self.mline_done = False
                 #if self.mcmax_done:
                     #-- MCMax was ran successfully, in other words, quite a bit 
@@ -396,3 +457,113 @@ class ModelingManager():
         #- together showing the evolution of the modeling session for this 
         #- parameter set.
                 
+        
+        
+        
+    def modelStar(self,star,star_index):
+        
+        """
+        Model a single Star() and return the Star() and its bookkeeping.
+        
+        Used by the worker processes of a parallel grid calculation. The 
+        bookkeeping lists of the worker's copy of the modeling manager are 
+        reset first, such that only the results for this Star() are returned.
+        
+        @param star: The parameter set for this session
+        @type star: Star()
+        @param star_index: The index of the Star() object in the full list in 
+                           CC. 
+        @type star_index: int
+        
+        @return: The index of the Star() in the grid, the Star() itself after 
+                 modeling, and the entries this Star() adds to mline_done_list,
+                 trans_bool_list, mcmax_done_list and star_grid_old
+        @rtype: tuple(int,Star(),list,list,list,list)
+        
+        """
+        
+        self.mline_done_list = []
+        self.trans_bool_list = []
+        self.mcmax_done_list = []
+        self.star_grid_old[star_index] = []
+        self.startModeling(star,star_index)
+        return (star_index,star,self.mline_done_list,self.trans_bool_list,\
+                self.mcmax_done_list,self.star_grid_old[star_index])
+        
+        
+        
+    def startParallelModeling(self,star_grid,num_workers):
+        
+        """
+        Model the full grid of Star() objects with a pool of worker processes.
+        
+        Every worker models one Star() at a time, i.e. it runs startModeling, 
+        so MCMax, cooling, mline and sphinx are ran in the usual order for 
+        each grid point. The workers are separate CC sessions as far as the 
+        databases are concerned: identical models requested by different 
+        workers are reserved in the databases as IN_PROGRESS by the first, 
+        while the other waits for the result. 
+        
+        The Star() objects in star_grid are replaced by the modeled ones, and
+        the bookkeeping lists are filled in the order of the grid. Finally, the
+        databases are synchronised with the results of all workers.
+        
+        Not to be used in combination with a Vic() manager.
+        
+        @param star_grid: The parameter sets of the CC session
+        @type star_grid: list[Star()]
+        @param num_workers: The number of worker processes
+        @type num_workers: int
+        
+        """
+        
+        #-- Every worker checks the databases as a separate session. Model ids
+        #   and the ids of new entries for replace_db_entry are shared. 
+        single_session = self.single_session
+        self.single_session = 0
+        mp_manager = multiprocessing.Manager()
+        self.new_entries_mcmax = mp_manager.list(self.new_entries_mcmax)
+        self.new_entries_cooling = mp_manager.list(self.new_entries_cooling)
+        ModelingSession.setIdClock(multiprocessing.Lock(),\
+                                   multiprocessing.Value('l',0))
+        
+        results = [None]*len(star_grid)
+        pool = multiprocessing.Pool(processes=num_workers,\
+                                    initializer=_initWorker,\
+                                    initargs=(self,))
+        try:
+            for result in pool.imap_unordered(_modelStar,\
+                                              enumerate(star_grid)):
+                results[result[0]] = result
+                print '***********************************'
+                print '** Model #%i finished. %i out of %i requested models done.'\
+                      %(result[0]+1,len([r for r in results if r]),\
+                        len(star_grid))
+                print '***********************************'
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            ModelingSession.setIdClock()
+            self.new_entries_mcmax = list(self.new_entries_mcmax)
+            self.new_entries_cooling = list(self.new_entries_cooling)
+            mp_manager.shutdown()
+            self.single_session = single_session
+        
+        #-- Collect the results in the order of the grid
+        for star_index,star,mline_done,trans_bools,mcmax_done,old in results:
+            star_grid[star_index] = star
+            self.mline_done_list.extend(mline_done)
+            self.trans_bool_list.extend(trans_bools)
+            self.mcmax_done_list.extend(mcmax_done)
+            self.star_grid_old[star_index] = old
+        
+        #-- The databases of this process know nothing of the workers' changes
+        if self.gastronoom: 
+            self.cool_db.sync()
+            self.ml_db.sync()
+            self.sph_db.sync()
+        if self.mcmax:    
+            self.mcmax_db.sync()
@@ -0,0 +1,898 @@
+# -*- coding: utf-8 -*-
+
+"""
+Interface for running jobs and transferring files on a batch-scheduling target,
+such as a supercomputer cluster with a PBS or Slurm queue, or the local machine.
+
+Author: R. Lombaert
+
+"""
+
+import os
+import subprocess
+from pipes import quote
+
+from cc.managers.JobRunner import JobRunner
+
+
+
+def makeScheduler(name,user=None,host=None,max_jobs=1,root=None,home=None,\
+                  data=None):
+
+    '''
+    Create a scheduler based on its name.
+
+    @param name: The type of scheduler: 'pbs' or 'slurm' for a cluster
+                 accessed over ssh, or 'local' for the local machine.
+    @type name: string
+
+    @keyword user: The user account on the cluster. Required for 'pbs' and
+                   'slurm'.
+
+                   (default: None)
+    @type user: string
+    @keyword host: The login node of the cluster. Required for 'pbs' and
+                   'slurm'.
+
+                   (default: None)
+    @type host: string
+    @keyword max_jobs: The number of jobs ran at the same time by a local
+                       scheduler.
+
+                       (default: 1)
+    @type max_jobs: int
+    @keyword root: The local folder in which the paths of the target are
+                   located for a local scheduler. See LocalScheduler().
+
+                   (default: None)
+    @type root: string
+    @keyword home: The home folder on the target. See SshScheduler() and 
+                   LocalScheduler() for the defaults.
+
+                   (default: None)
+    @type home: string
+    @keyword data: The data folder on the target. See SshScheduler() and 
+                   LocalScheduler() for the defaults.
+
+                   (default: None)
+    @type data: string
+
+    @return: The scheduler
+    @rtype: Scheduler()
+
+    '''
+
+    name = name.lower()
+    if name in ['pbs','slurm']:
+        if not user or not host:
+            raise IOError('A %s scheduler requires a user and a host.'%name)
+        return SshScheduler(user=user,host=host,queue=name,home=home,\
+                            data=data)
+    elif name == 'local':
+        return LocalScheduler(max_jobs=max_jobs,root=root,home=home,data=data)
+    else:
+        raise IOError('Scheduler %s unknown. Choose from pbs, slurm or local.'\
+                      %name)
+
+
+
+class Scheduler(object):
+
+    """
+    The interface for a batch-scheduling target.
+
+    Every method that communicates with the target does so in one go, no
+    matter how many files or folders are involved. Inherited by SshScheduler()
+    and LocalScheduler().
+    
+    The scheduler also writes the job scripts for the target. A job script is
+    submitted as an array of array_size tasks. The run script submits every
+    job script a number of times. 
+
+    """
+    
+    #-- The number of tasks in one submission of a job script
+    array_size = 8
+
+    def __init__(self,home,data):
+
+        """
+        Initializing a Scheduler instance.
+        
+        @param home: The home folder on the target, for code and input
+        @type home: string
+        @param data: The data folder on the target, for model output
+        @type data: string
+
+        """
+
+        self.home = home
+        self.data = data
+
+
+
+    def getPath(self,path):
+
+        '''
+        Get the path for a path on the target, as seen by the jobs that run 
+        there. This is the path written in job scripts and input files. 
+
+        @param path: The path on the target
+        @type path: string
+
+        @return: The path as seen by the jobs
+        @rtype: string
+
+        '''
+
+        return path
+
+
+
+    def makeJobScript(self,lines,walltime):
+
+        '''
+        Make a job script for the target, from the lines of a template. 
+        
+        The shebang and the directives of any queue system in the template 
+        are replaced by those of the target, see getJobHeader.
+
+        @param lines: The lines of the template job script
+        @type lines: list[string]
+        @param walltime: The maximum run time of one task, as hh:mm:ss
+        @type walltime: string
+
+        @return: The lines of the job script
+        @rtype: list[string]
+
+        '''
+
+        body = [line 
+                for line in lines
+                if not line.startswith('#!') and not line.startswith('#PBS') \
+                    and not line.startswith('#SBATCH')]
+        return self.getJobHeader(lines,walltime) + body
+
+
+
+    def getJobHeader(self,lines,walltime):
+
+        '''
+        Get the shebang and queue directives of a job script.
+
+        @param lines: The lines of the template job script
+        @type lines: list[string]
+        @param walltime: The maximum run time of one task, as hh:mm:ss
+        @type walltime: string
+
+        @return: The header lines
+        @rtype: list[string]
+
+        '''
+
+        return ['#!/bin/bash -l']
+
+
+
+    def makeRunScript(self,folder,jobs,account=None):
+
+        '''
+        Make the script that submits job scripts on the target. 
+
+        @param folder: The folder on the target that contains the job scripts
+        @type folder: string
+        @param jobs: The filename of every job script in the folder, and the
+                     number of times it is submitted
+        @type jobs: list[(string,int)]
+
+        @keyword account: The credits account to be charged. The default 
+                          account of the user if None.
+
+                          (default: None)
+        @type account: string
+
+        @return: The lines of the run script
+        @rtype: list[string]
+
+        '''
+
+        lines = ['#!/bin/bash -l','cd %s'%quote(self.getPath(folder))]
+        lines.extend(self.getRunSetup())
+        for jobfile,number in jobs:
+            lines.extend(['for i in $(seq 1 %i) ;'%number,\
+                          'do %s ;'%self.getSubmitCommand(jobfile,account),\
+                          'done'])
+        return lines
+
+
+
+    def getRunSetup(self):
+
+        '''
+        Get the lines of the run script that prepare the submission of jobs.
+
+        @return: The lines
+        @rtype: list[string]
+
+        '''
+
+        return []
+
+
+
+    def getSubmitCommand(self,jobfile,account=None):
+
+        '''
+        Get the command that submits a job script as an array of array_size 
+        tasks.
+
+        @param jobfile: The filename of the job script
+        @type jobfile: string
+
+        @keyword account: The credits account to be charged. 
+
+                          (default: None)
+        @type account: string
+
+        @return: The command
+        @rtype: string
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def execute(self,command):
+
+        '''
+        Execute a shell command on the target and wait until it is done.
+
+        @param command: The shell command
+        @type command: string
+
+        @return: The output of the command
+        @rtype: string
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def put(self,files,target):
+
+        '''
+        Copy local files to the target.
+
+        @param files: The local filenames, which may include wildcards
+        @type files: list[string]
+        @param target: The folder on the target, or the filename on the target
+                       if only one file is copied
+        @type target: string
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def get(self,files,folder):
+
+        '''
+        Copy files from the target to a local folder.
+
+        @param files: The filenames on the target, which may include wildcards
+        @type files: list[string]
+        @param folder: The local folder
+        @type folder: string
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def submit(self,jobfile):
+
+        '''
+        Start a job script on the target without waiting for it to finish.
+
+        @param jobfile: The filename of the job script on the target
+        @type jobfile: string
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def getQueue(self):
+
+        '''
+        Get the jobs of the user that are still queued or running on the
+        target.
+
+        @return: A description of every job, one per job
+        @rtype: list[string]
+
+        '''
+
+        raise NotImplementedError
+
+
+
+    def mkdir(self,folders):
+
+        '''
+        Make folders on the target, if they do not exist yet.
+
+        @param folders: The folders on the target
+        @type folders: list[string]
+
+        '''
+
+        if folders:
+            self.execute('mkdir -p %s'%' '.join([quote(f) for f in folders]))
+
+
+
+    def remove(self,files):
+
+        '''
+        Remove files from the target. Wildcards are allowed.
+
+        Files are removed per 100 to keep the command lines short.
+
+        @param files: The filenames on the target
+        @type files: list[string]
+
+        '''
+
+        files = list(files)
+        for i in range(0,len(files),100):
+            self.execute('rm -f %s'%' '.join(files[i:i+100]))
+
+
+
+    def listFolders(self,folders):
+
+        '''
+        List the content of several folders on the target.
+
+        @param folders: The folders on the target
+        @type folders: list[string]
+
+        @return: The filenames in every folder. The list is empty if the folder
+                 does not exist.
+        @rtype: dict(string: list[string])
+
+        '''
+
+        if not folders:
+            return dict()
+        marker = '#### '
+        command = '; '.join(['echo %s; ls %s 2>/dev/null'\
+                             %(quote(marker+f),quote(f))
+                             for f in folders])
+        listing = dict([(f,[]) for f in folders])
+        current = None
+        for line in self.execute(command).split('\n'):
+            if line.startswith(marker):
+                current = line[len(marker):]
+            elif line and not current is None:
+                listing[current].append(line)
+        return listing
+
+
+
+class SshScheduler(Scheduler):
+
+    """
+    A PBS or Slurm cluster accessed over ssh.
+
+    Commands are ran on the login node through ssh, files are copied to the
+    cluster with a single scp per call of put(), and from the cluster with a
+    single ssh stream per folder in get().
+    
+    Job arrays are submitted with the worker framework on PBS (wsub), and 
+    with sbatch --array on Slurm.
+
+    """
+
+    def __init__(self,user,host,queue='pbs',home=None,data=None):
+
+        """
+        Initializing an SshScheduler instance.
+
+        @param user: The user account on the cluster
+        @type user: string
+        @param host: The login node of the cluster
+        @type host: string
+
+        @keyword queue: The queue system of the cluster: 'pbs' or 'slurm'
+
+                        (default: 'pbs')
+        @type queue: string
+        @keyword home: The home folder on the cluster. If None, the VSC home 
+                       folder of the user, e.g. /user/leuven/302/vsc30226.
+
+                       (default: None)
+        @type home: string
+        @keyword data: The data folder on the cluster. If None, the VSC data 
+                       folder of the user, e.g. /data/leuven/302/vsc30226.
+
+                       (default: None)
+        @type data: string
+
+        """
+
+        if home is None:
+            home = '/user/leuven/%s/%s'%(user[3:6],user)
+        if data is None:
+            data = '/data/leuven/%s/%s'%(user[3:6],user)
+        super(SshScheduler,self).__init__(home=home,data=data)
+        self.user = user
+        self.host = host
+        self.server = '%s@%s'%(user,host)
+        self.queue = queue.lower()
+        if self.queue == 'pbs':
+            self.queue_command = 'qstat -u %s'%user
+        elif self.queue == 'slurm':
+            self.queue_command = 'squeue -h -u %s'%user
+        else:
+            raise IOError('Queue system %s unknown. Choose from pbs or slurm.'\
+                          %queue)
+
+
+
+    def execute(self,command):
+
+        '''
+        Execute a shell command on the login node and wait until it is done.
+
+        @param command: The shell command
+        @type command: string
+
+        @return: The output of the command
+        @rtype: string
+
+        '''
+
+        process = subprocess.Popen('ssh %s %s'%(self.server,quote(command)),\
+                                   shell=True,stdout=subprocess.PIPE)
+        return process.communicate()[0]
+
+
+
+    def put(self,files,target):
+
+        '''
+        Copy local files to the cluster with a single scp.
+
+        @param files: The local filenames, which may include wildcards
+        @type files: list[string]
+        @param target: The folder on the cluster, or the filename on the
+                       cluster if only one file is copied
+        @type target: string
+
+        '''
+
+        if files:
+            subprocess.call('scp %s %s:%s'%(' '.join(files),self.server,\
+                                            target),\
+                            shell=True)
+
+
+
+    def get(self,files,folder):
+
+        '''
+        Copy files from the cluster to a local folder.
+
+        The files are streamed as a tar archive, with one ssh connection per
+        folder on the cluster.
+
+        @param files: The filenames on the cluster, which may include wildcards
+        @type files: list[string]
+        @param folder: The local folder
+        @type folder: string
+
+        '''
+
+        for rfolder,names in groupByFolder(files).items():
+            command = 'cd %s && tar cf - %s'%(quote(rfolder),' '.join(names))
+            subprocess.call('ssh %s %s | tar xf - -C %s'\
+                            %(self.server,quote(command),quote(folder)),\
+                            shell=True,stdout=subprocess.PIPE,\
+                            stderr=subprocess.PIPE)
+
+
+
+    def submit(self,jobfile):
+
+        '''
+        Run a job script on the login node without waiting for it to finish.
+
+        The script is expected to queue the actual jobs.
+
+        @param jobfile: The filename of the job script on the cluster
+        @type jobfile: string
+
+        '''
+
+        subprocess.Popen('ssh %s %s'%(self.server,quote(jobfile)),\
+                         shell=True,stdout=subprocess.PIPE,\
+                         stderr=subprocess.STDOUT)
+
+
+
+    def getJobHeader(self,lines,walltime):
+
+        '''
+        Get the shebang and queue directives of a job script. 
+        
+        On PBS, the directives of the template are kept, with the walltime of
+        the job. On Slurm, one task is requested per array element.
+
+        @param lines: The lines of the template job script
+        @type lines: list[string]
+        @param walltime: The maximum run time of one task, as hh:mm:ss
+        @type walltime: string
+
+        @return: The header lines
+        @rtype: list[string]
+
+        '''
+
+        header = ['#!/bin/bash -l']
+        if self.queue == 'slurm':
+            return header + ['#SBATCH --time=%s'%walltime,\
+                             '#SBATCH --ntasks=1']
+        directives = [line 
+                      for line in lines 
+                      if line.startswith('#PBS') \
+                        and line.split('=')[0].find('walltime') == -1]
+        return header + directives + ['#PBS -l walltime=%s'%walltime]
+
+
+
+    def getRunSetup(self):
+
+        '''
+        Get the lines of the run script that prepare the submission of jobs.
+
+        @return: The lines
+        @rtype: list[string]
+
+        '''
+
+        if self.queue == 'pbs':
+            return ['module load worker']
+        return []
+
+
+
+    def getSubmitCommand(self,jobfile,account=None):
+
+        '''
+        Get the command that submits a job script as an array of array_size 
+        tasks.
+
+        @param jobfile: The filename of the job script
+        @type jobfile: string
+
+        @keyword account: The credits account to be charged. 
+
+                          (default: None)
+        @type account: string
+
+        @return: The command
+        @rtype: string
+
+        '''
+
+        acc = ''
+        if self.queue == 'slurm':
+            if account: acc = ' -A %s'%account
+            return 'sbatch%s --array=1-%i %s'%(acc,self.array_size,jobfile)
+        if account: acc = ' -A %s'%account
+        return 'wsub%s -t 1-%i -batch %s'%(acc,self.array_size,jobfile)
+
+
+
+    def getQueue(self):
+
+        '''
+        Get the jobs of the user in the queue of the cluster, with a single
+        query.
+        
+        The query only concerns the jobs of the user. The user column may be 
+        truncated in the output, so the lines are not filtered on the user 
+        name. Only the header of the qstat output is skipped.
+
+        @return: The lines of the queue overview, one per job
+        @rtype: list[string]
+
+        '''
+
+        lines = [line 
+                 for line in self.execute(self.queue_command).split('\n')
+                 if line.strip()]
+        #-- The qstat header ends with a line of dashes
+        separators = [i for i,line in enumerate(lines) 
+                      if line.strip().startswith('---')]
+        if separators:
+            lines = lines[separators[-1]+1:]
+        return lines
+
+
+
+class LocalScheduler(Scheduler):
+
+    """
+    The local machine as a batch-scheduling target.
+
+    Run scripts are ran in a pool of local processes, and run the tasks of 
+    their job scripts one after the other with bash. The paths on the target
+    are located in a local root folder, such that the local scheduler can
+    stand in for a cluster when testing.
+
+    """
+
+    def __init__(self,max_jobs=1,root=None,home=None,data=None):
+
+        """
+        Initializing a LocalScheduler instance.
+
+        @keyword max_jobs: The number of job scripts ran at the same time
+
+                           (default: 1)
+        @type max_jobs: int
+        @keyword root: The local folder in which absolute paths on the target
+                       are located, e.g. /data/x becomes root/data/x. If empty,
+                       the paths are used as they are. If None, the folder 
+                       .cc_scheduler in the home folder of the user.
+
+                       (default: None)
+        @type root: string
+        @keyword home: The home folder on the target
+        
+                       (default: '/user')
+        @type home: string
+        @keyword data: The data folder on the target
+        
+                       (default: '/data')
+        @type data: string
+
+        """
+
+        super(LocalScheduler,self).__init__(home=home or '/user',\
+                                            data=data or '/data')
+        if root is None:
+            root = os.path.join(os.path.expanduser('~'),'.cc_scheduler')
+        self.root = root
+        self.runner = JobRunner(max_jobs=max_jobs)
+
+
+
+    def getPath(self,path):
+
+        '''
+        Get the local path for a path on the target. The jobs run locally, so
+        this is also the path written in job scripts and input files.
+
+        @param path: The path on the target
+        @type path: string
+
+        @return: The local path
+        @rtype: string
+
+        '''
+
+        if not self.root:
+            return path
+        return os.path.join(self.root,path.lstrip('/'))
+
+
+
+    def getJobHeader(self,lines,walltime):
+
+        '''
+        Get the shebang of a job script. No queue directives are needed.
+
+        @param lines: The lines of the template job script
+        @type lines: list[string]
+        @param walltime: The maximum run time of one task, not used.
+        @type walltime: string
+
+        @return: The header lines
+        @rtype: list[string]
+
+        '''
+
+        return ['#!/bin/bash']
+
+
+
+    def getSubmitCommand(self,jobfile,account=None):
+
+        '''
+        Get the command that runs the array_size tasks of a job script one 
+        after the other.
+
+        @param jobfile: The filename of the job script
+        @type jobfile: string
+
+        @keyword account: Not used locally.
+
+                          (default: None)
+        @type account: string
+
+        @return: The command
+        @rtype: string
+
+        '''
+
+        return 'for j in $(seq 1 %i) ; do bash %s ; done'\
+               %(self.array_size,jobfile)
+
+
+
+    def execute(self,command):
+
+        '''
+        Execute a shell command locally and wait until it is done.
+
+        Paths in the command are not converted. Use the methods of the
+        scheduler to handle paths on the target.
+
+        @param command: The shell command
+        @type command: string
+
+        @return: The output of the command
+        @rtype: string
+
+        '''
+
+        process = subprocess.Popen(command,shell=True,stdout=subprocess.PIPE)
+        return process.communicate()[0]
+
+
+
+    def mkdir(self,folders):
+
+        '''
+        Make folders on the target, if they do not exist yet.
+
+        @param folders: The folders on the target
+        @type folders: list[string]
+
+        '''
+
+        super(LocalScheduler,self).mkdir([self.getPath(f) for f in folders])
+
+
+
+    def remove(self,files):
+
+        '''
+        Remove files from the target. Wildcards are allowed.
+
+        @param files: The filenames on the target
+        @type files: list[string]
+
+        '''
+
+        super(LocalScheduler,self).remove([self.getPath(f) for f in files])
+
+
+
+    def listFolders(self,folders):
+
+        '''
+        List the content of several folders on the target.
+
+        @param folders: The folders on the target
+        @type folders: list[string]
+
+        @return: The filenames in every folder. The list is empty if the folder
+                 does not exist.
+        @rtype: dict(string: list[string])
+
+        '''
+
+        listing = super(LocalScheduler,self)\
+                    .listFolders([self.getPath(f) for f in folders])
+        return dict([(f,listing[self.getPath(f)]) for f in folders])
+
+
+
+    def put(self,files,target):
+
+        '''
+        Copy local files to the target.
+
+        @param files: The local filenames, which may include wildcards
+        @type files: list[string]
+        @param target: The folder on the target, or the filename on the target
+                       if only one file is copied
+        @type target: string
+
+        '''
+
+        if files:
+            self.execute('cp %s %s'%(' '.join(files),\
+                                     quote(self.getPath(target))))
+
+
+
+    def get(self,files,folder):
+
+        '''
+        Copy files from the target to a local folder.
+
+        @param files: The filenames on the target, which may include wildcards
+        @type files: list[string]
+        @param folder: The local folder
+        @type folder: string
+
+        '''
+
+        if files:
+            self.execute('cp %s %s 2>/dev/null'\
+                         %(' '.join([self.getPath(f) for f in files]),\
+                           quote(folder)))
+
+
+
+    def submit(self,jobfile):
+
+        '''
+        Run a job script in the local process pool.
+
+        The script is started once fewer than max_jobs scripts are running.
+
+        @param jobfile: The filename of the job script on the target
+        @type jobfile: string
+
+        '''
+
+        self.runner.submit(quote(self.getPath(jobfile)))
+
+
+
+    def getQueue(self):
+
+        '''
+        Get the job scripts still queued or running in the local process pool.
+
+        @return: The commands of the job scripts
+        @rtype: list[string]
+
+        '''
+
+        self.runner.poll()
+        return self.runner.getCommands()
+
+
+
+def groupByFolder(files):
+
+    '''
+    Group filenames by their folder.
+
+    @param files: The filenames
+    @type files: list[string]
+
+    @return: The basenames per folder
+    @rtype: dict(string: list[string])
+
+    '''
+
+    folders = dict()
+    for f in files:
+        folder,name = os.path.split(f)
+        folders.setdefault(folder,[]).append(name)
+    return folders
+
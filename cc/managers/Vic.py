@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
 """
-Interface for communicating with and managing modeling through VIC3.
+Interface for communicating with and managing modeling through VIC3, or any
+other batch-scheduling target. See Scheduler.
 
 Author: R. Lombaert
 
@@ -15,6 +16,7 @@ from time import gmtime, sleep
 import cc.path
 from cc.tools.io import DataIO
 from cc.modeling.codes import Gastronoom
+from cc.managers import Scheduler
 
 
 
@@ -27,7 +29,7 @@ class Vic():
     """
     
     def __init__(self,account,path='code23-01-2010',credits_acc=None,\
-                 time_per_sphinx=30,recover_sphinxfiles=0):
+                 time_per_sphinx=30,recover_sphinxfiles=0,scheduler=None):
         
         """ 
         Initializing a Vic instance.
@@ -58,6 +60,13 @@ class Vic():
                                       
                                       (default: 0) 
         @type recover_sphinxfiles: bool
+        @keyword scheduler: The target on which the sphinx models are ran. If
+                            None, the PBS queue of VIC3 is used over ssh. The
+                            scheduler writes the job scripts, and its home and
+                            data folders contain the COCode folders.
+                            
+                            (default: None)
+        @type scheduler: Scheduler()
 
         """
 
@@ -71,7 +80,6 @@ class Vic():
         self.trans_in_progress = [] 
         self.path = path
         self.account = account
-        self.disk = account[3:6]
         self.uname = os.path.split(os.path.expanduser('~')+'/'.rstrip('/'))[-1]
         self.time_per_sphinx = float(time_per_sphinx)
         self.recover_sphinxfiles = recover_sphinxfiles
@@ -81,19 +89,20 @@ class Vic():
         else:
             self.credits_acc = credits_acc
         
-        main_vic_folder = os.path.join('/data','leuven',self.disk,\
-                                       self.account,'COCode')
-        subprocess.call('ssh %s@login.vic3.cc.kuleuven.be mkdir %s/output/'\
-                        %(self.account,main_vic_folder),shell=True)
-        subprocess.call('ssh %s@login.vic3.cc.kuleuven.be mkdir %s'\
-                        %(self.account,main_vic_folder) + '/dust_files/',\
-                        shell=True)
-        subprocess.call('ssh %s@login.vic3.cc.kuleuven.be mkdir %s'\
-                        %(self.account,main_vic_folder) +'/CustomAbundances/',\
-                        shell=True)
-        subprocess.call('ssh %s@login.vic3.cc.kuleuven.be mkdir %s'\
-                        %(self.account,main_vic_folder) +'/StarFiles/',\
-                        shell=True)
+        if scheduler is None:
+            scheduler = Scheduler.makeScheduler('pbs',user=self.account,\
+                                                host='login.vic3.cc.kuleuven.be')
+        self.scheduler = scheduler
+        
+        #-- The COCode folders on the target: code, data files and job 
+        #   scripts in the home folder, input and output in the data folder
+        self.vic_home = os.path.join(self.scheduler.home,'COCode')
+        self.vic_data = os.path.join(self.scheduler.data,'COCode')
+        self.scheduler.mkdir([os.path.join(self.vic_data,f)
+                              for f in ['output','dust_files',\
+                                        'CustomAbundances','CustomFiles',\
+                                        'StarFiles']] \
+                             + [os.path.join(self.vic_home,'data')])
 
 
     def setSphinxDb(self,sph_db):
@@ -118,10 +127,8 @@ class Vic():
         '''
         
         homespec = os.path.join(cc.path.gdata,'*spec')
-        vicspec = os.path.join('/user','leuven',self.disk,self.account,\
-                               'COCode','data','.')
-        subprocess.call(['scp %s %s@login.vic3.cc.kuleuven.be:%s'\
-                         %(homespec,self.account,vicspec)],shell=True)
+        vicspec = os.path.join(self.vic_home,'data','.')
+        self.scheduler.put([homespec],vicspec)
         
 
 
@@ -227,12 +234,9 @@ class Vic():
             printing = self.makeJobFile()
             self.makeInputFiles()
             model_id = self.models[self.current_model]
-            jobfile = os.path.join('/user','leuven',self.disk,self.account,\
-                                   'COCode','vic_run_jobs_%s_%i.sh'\
-                                   %(model_id,self.current_model))
-            subprocess.Popen('ssh %s@login.vic3.cc.kuleuven.be %s'\
-                             %(self.account,jobfile),shell=True,\
-                             stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+            jobfile = os.path.join(self.vic_home,'vic_run_jobs_%s_%i.sh'\
+                                                 %(model_id,self.current_model))
+            self.scheduler.submit(jobfile)
             if printing: print '\n'.join(printing)
         self.current_model += 1
 
@@ -260,6 +264,10 @@ class Vic():
         Make the job file that will run the loop on VIC3 and copy the cooling
         and mline output to VIC3.
         
+        The body of the job file is read from vic_job_example.sh in the 
+        GASTRoNOoM home folder. The queue directives of the job file and the 
+        run-jobs file that submits it are made by the scheduler.
+        
         @return: to be printed strings once all the copying is done, which 
                  shows how many transitions are being calculated for which 
                  sphinx model id
@@ -268,9 +276,14 @@ class Vic():
         '''
         
         model_id = self.models[self.current_model]
-        vic_server = '%s@login.vic3.cc.kuleuven.be'%self.account
         jobfiles = []
         printing = []
+        #-- All files are copied to VIC once the job files are made, in one go
+        #   per destination folder.
+        vic_cocode = self.vic_home + '/'
+        vic_folders = []
+        jobfiles_local = []
+        to_vic = [] 
         for model_id_sphinx in self.sphinx_model_ids[self.current_model]:
             these_trans = [trans 
                            for trans in self.transitions[self.current_model] 
@@ -290,19 +303,14 @@ class Vic():
                                                    'vic_job_example.sh'))
             new_jobfile = []
             for line in jobfile:
-                #if line.find('#PBS -l nodes=1:ppn=8') != -1:
-                #    new_line = line.replace('ppn=8','ppn=%i'%)
-                if line.split('=')[0].find('#PBS -l walltime') != -1:
-                    new_line = '='.join([line.split('=')[0],walltimestring])
-                elif line.split('=')[0].find('export COCODEHOME') != -1:
-                    new_line = line.replace('vsc30226',self.account)\
-                                        .replace('/302/','/%s/'%self.disk)
+                if line.split('=')[0].find('export COCODEHOME') != -1:
+                    new_line = '='.join([line.split('=')[0],\
+                            self.scheduler.getPath(self.vic_home)+'/'])
                 elif line.split('=')[0].find('export COCODEDATA') != -1:
                     new_line = '='.join([line.split('=')[0],\
-                            os.path.join(line.split('=')[1],model_id+'_'+\
-                            str(self.current_model)+'/')])\
-                            .replace('vsc30226',self.account)\
-                            .replace('/302/','/%s/'%self.disk)
+                            self.scheduler.getPath(os.path.join(\
+                                self.vic_data,'%s_%i/'\
+                                %(model_id,self.current_model)))])
                 elif line.find('for i in $(seq 1 1)') != -1:
                     new_line = 'for i in $(seq 1 %i)'%models_in_job
                 elif line.split('=')[0].find('export MODELNUMBER') != -1:
@@ -311,25 +319,25 @@ class Vic():
                 else:
                     new_line = line
                 new_jobfile.append(new_line)
+            new_jobfile = self.scheduler.makeJobScript(new_jobfile,\
+                                                       walltimestring)
                 
             #- Save job file, change permission and copy to VIC
             local_folder = os.path.join(cc.path.gastronoom,\
                                         self.path,'models',model_id_sphinx)
-            jobfilename_vic = '/user/leuven/'+self.disk+'/' + self.account + \
-                              '/COCode/vic_job_' + model_id_sphinx + '.sh'
+            jobfilename_vic = os.path.join(self.vic_home,\
+                                           'vic_job_%s.sh'%model_id_sphinx)
             jobfilename_local = os.path.join(local_folder,'vic_input',\
                                              'vic_job_%s.sh'%model_id_sphinx)
             DataIO.writeFile(jobfilename_local,new_jobfile)
             subprocess.call(['chmod +x %s'%jobfilename_local],shell=True)
-            subprocess.call(['scp %s %s:%s'%(jobfilename_local,vic_server,\
-                                             jobfilename_vic)],shell=True)
             jobfiles.append((jobfilename_vic,job_number))  
+            jobfiles_local.append(jobfilename_local)
             
-            #- Make the output folder on VIC
-            vic_folder = '/data/leuven/%s/%s/COCode/output/%s/'\
-                         %(self.disk,self.account,model_id_sphinx)
-            subprocess.call('ssh %s mkdir %s'%(vic_server,vic_folder),\
-                            shell=True)
+            #- The output folder on VIC
+            vic_folder = os.path.join(self.vic_data,'output',\
+                                      model_id_sphinx) + '/'
+            vic_folders.append(vic_folder)
             
             #-copy required GASTRoNOoM files, molecule specific.
             these_molecules = set(['sampling'] + \
@@ -341,43 +349,20 @@ class Vic():
             to_be_copied.extend(['ml*_%s.dat'%molec 
                                  for molec in these_molecules 
                                  if molec != 'sampling'])
-            for filecopy in to_be_copied:
-                subprocess.call(['scp %s %s:%s.'\
-                                 %(os.path.join(local_folder,filecopy),\
-                                   vic_server,vic_folder)], shell=True)
+            to_vic.append(([os.path.join(local_folder,filecopy)
+                            for filecopy in to_be_copied],vic_folder))
             
             #- number of nodes*number of cpus=amount of times to queue it
             printing.append('Running %i jobs with %i models each for ID %s.' \
                             %(job_number*7, models_in_job,model_id_sphinx))
         
-        #- Create the run-jobs file.
-        runjobsfile = DataIO.readFile(os.path.join(cc.path.gastronoom,\
-                                                   'vic_run_jobs_example.sh'))
-        new_runjobsfile = []
-        for i,job in enumerate(jobfiles):
-            for line in runjobsfile:
-                if line.find('#!/bin/bash -l') != -1 and i == 0:
-                    new_line = line
-                elif line.find('cd COCode') != -1 and i == 0:
-                    new_line = 'cd /user/leuven/'+self.disk+'/'+ self.account+\
-                               '/COCode/'
-                elif line.find('module load worker') != -1 and i == 0:
-                    new_line = line
-                elif line.find('for i in $(seq 1 1) ;') != -1:
-                    new_line = 'for i in $(seq 1 %i) ;' %(job[1])    
-                elif line.find('do wsub -A dummy -t 1-8 -batch') != -1:
-                    new_line = line.replace('vic_job_example.sh',\
-                                            os.path.split(job[0])[1])   
-                    if not self.credits_acc is None:
-                        new_line = new_line.replace('-A dummy',\
-                                                    '-A %s'%self.credits_acc)
-                    else:
-                        new_line = new_line.replace('-A dummy ','')
-                elif line.find('done') != -1:
-                    new_line = line
-                else:
-                    new_line = ''
-                new_runjobsfile.append(new_line)
+        #- Create the run-jobs file, which submits every job file job_number
+        #- times as an array of tasks.
+        new_runjobsfile = self.scheduler.makeRunScript(\
+                                folder=self.vic_home,\
+                                jobs=[(os.path.split(jobfilename)[1],number)
+                                      for jobfilename,number in jobfiles],\
+                                account=self.credits_acc)
         
         #- Run-jobs file: Write, change permission and copy to VIC
         runjobsfilename_local = os.path.join(cc.path.gastronoom,self.path,\
@@ -385,14 +370,15 @@ class Vic():
                                              'vic_run_jobs_%s_%s.sh'\
                                              %(model_id,\
                                                str(self.current_model)))
-        runjobsfilename_vic = '/user/leuven/%s/%s/COCode/vic_run_jobs_%s_%s.sh'\
-                              %(self.disk,self.account,model_id,\
-                                str(self.current_model))
         DataIO.writeFile(runjobsfilename_local,new_runjobsfile)
         subprocess.call(['chmod +x %s'%runjobsfilename_local],shell=True)
-        subprocess.call(['scp %s %s:%s'\
-                         %(runjobsfilename_local,vic_server,\
-                           runjobsfilename_vic)],shell=True)
+        
+        #- Copy everything to VIC: the job files and the run-jobs file have the
+        #- same names locally and on VIC.
+        self.scheduler.mkdir(vic_folders)
+        self.scheduler.put(jobfiles_local+[runjobsfilename_local],vic_cocode)
+        for files,vic_folder in to_vic:
+            self.scheduler.put(files,vic_folder)
         return printing
                 
   
@@ -408,11 +394,11 @@ class Vic():
         '''
         
         model_id = self.models[self.current_model] 
-        vic_model_folder = os.path.join('/data','leuven',self.disk,\
-                                        self.account,'COCode','%s_%i/'\
+        vic_model_folder = os.path.join(self.vic_data,'%s_%i/'\
                                         %(model_id,self.current_model))
-        subprocess.call('ssh %s@login.vic3.cc.kuleuven.be mkdir %s'\
-                        %(self.account,vic_model_folder),shell=True)
+        #-- Paths in the input files are seen from the jobs on the target
+        getPath = self.scheduler.getPath
+        self.scheduler.mkdir([vic_model_folder])
         will_calculate_stuff = 0
         custom_files = []
         opacity_files = []
@@ -425,28 +411,27 @@ class Vic():
                 will_calculate_stuff = 1
                 actual_command_list \
                     = self.command_lists[self.current_model].copy()
+                vic_output = os.path.join(self.vic_data,'output',\
+                                          trans.getModelId())
                 actual_command_list['DATA_DIRECTORY'] \
-                    = '"/user/leuven/%s/%s/COCode/data/"'\
-                      %(self.disk,self.account)
+                    = '"%s/"'%getPath(os.path.join(self.vic_home,'data'))
                 actual_command_list['OUTPUT_DIRECTORY'] \
-                    = '"/data/leuven/%s/%s/COCode/output/%s/"'\
-                      %(self.disk,self.account,trans.getModelId())
+                    = '"%s/"'%getPath(vic_output)
                 actual_command_list['PARAMETER_FILE'] \
-                    = '"/data/leuven/%s/%s/COCode/output/%s/%s"'\
-                      %(self.disk,self.account,trans.getModelId(),\
-                        'parameter_file_%s.dat'%trans.getModelId())
+                    = '"%s"'%getPath(os.path.join(vic_output,\
+                                                  'parameter_file_%s.dat'\
+                                                  %trans.getModelId()))
                 actual_command_list['OUTPUT_SUFFIX'] = trans.getModelId()
                 opacity_files.append(actual_command_list['TEMDUST_FILENAME'])
                 if int(actual_command_list['KEYWORD_DUST_TEMPERATURE_TABLE']):
+                    vic_dustfile = os.path.join(self.vic_data,'dust_files',\
+                                        os.path.split(actual_command_list\
+                                            ['DUST_TEMPERATURE_FILENAME']\
+                                            .strip('"'))[1])
                     actual_command_list['DUST_TEMPERATURE_FILENAME'] \
-                        = '"/data/leuven/%s/%s/COCode/dust_files/%s"'\
-                          %(self.disk,self.account,\
-                            os.path.split(actual_command_list\
-                                          ['DUST_TEMPERATURE_FILENAME']\
-                                          .strip('"'))[1])
-                path = '/data/leuven/%s/%s/COCode/CustomFiles/'\
-                       %(self.disk,self.account)
-                molec_dict = trans.molecule.makeDict(path)
+                        = '"%s"'%getPath(vic_dustfile)
+                path = os.path.join(self.vic_data,'CustomFiles') + '/'
+                molec_dict = trans.molecule.makeDict(getPath(path))
                 starfiles.append(molec_dict.pop('STARFILE',''))
                 commandfile = \
                      ['%s=%s'%(k,v) 
@@ -464,9 +449,11 @@ class Vic():
                                      'CHANGE_FRACTION_FILENAME',\
                                      'NEW_TEMPERATURE_FILENAME']):
                      if getattr(trans.molecule,key.lower()):
+                          vicfile = os.path.split(molec_dict[fkey]\
+                                                  .strip('"'))[1]
                           custom_files.append((getattr(trans.molecule,\
                                                        fkey.lower()),\
-                                               molec_dict[fkey].strip('"')))
+                                               os.path.join(path,vicfile)))
                 if actual_command_list.has_key('R_POINTS_MASS_LOSS'):
                     commandfile.extend(['%s=%s'%('R_POINTS_MASS_LOSS',v) 
                                         for v in actual_command_list\
@@ -479,9 +466,7 @@ class Vic():
                                               infile),\
                                  commandfile)
                 self.inputfiles[self.current_model]\
-                    .append(os.path.join('/data','leuven',self.disk,\
-                                         self.account,'COCode','%s_%i'\
-                                         %(model_id,self.current_model),\
+                    .append(os.path.join(vic_model_folder,\
                                          infile.replace('.inp','.*')))
             #- There is no overlap between filenames: All filenames with the 
             #- same trans model id get an increasing number i
@@ -494,42 +479,29 @@ class Vic():
             if len(starfiles) > 1: 
                 print('WARNING! Multiple starfiles detected in grid in Vic.py!')
             if starfiles:
-                path = os.path.join('/data','leuven',self.disk,self.account,\
-                                 'COCode','StarFiles','starfile_tablestar.dat')
-                subprocess.call(['scp ' + starfiles[0] + ' ' + self.account + \
-                                 '@login.vic3.cc.kuleuven.be:' + \
-                                 path],shell=True)
+                path = os.path.join(self.vic_data,'StarFiles',\
+                                    'starfile_tablestar.dat')
+                self.scheduler.put([starfiles[0]],path)
             opacity_files = [f 
                              for f in set(opacity_files)
                              if f != 'temdust.kappa']
-            for filename in opacity_files:
-                full_path = os.path.join(cc.path.gdata,filename)
-                full_path_vic = '/user/leuven/'+self.disk+'/'+self.account + \
-                                '/COCode/data/.'
-                subprocess.call(['scp ' + full_path + ' ' + self.account + \
-                                 '@login.vic3.cc.kuleuven.be:'+full_path_vic],\
-                                shell=True)
+            full_path_vic = os.path.join(self.vic_home,'data','.')
+            self.scheduler.put([os.path.join(cc.path.gdata,filename)
+                                for filename in opacity_files],\
+                               full_path_vic)
+            #- Custom files are renamed, so copy them one by one
             for filename,vicfile in set(custom_files):
-                subprocess.call(['scp ' + filename + ' ' + self.account + \
-                                 '@login.vic3.cc.kuleuven.be:' + vicfile],\
-                                shell=True)
+                self.scheduler.put([filename],vicfile)
             if int(self.command_lists[self.current_model]\
                                      ['KEYWORD_DUST_TEMPERATURE_TABLE']):
                 homefile = self.command_lists[self.current_model]\
                                              ['DUST_TEMPERATURE_FILENAME']\
                                              .strip('"')
-                vicfile = actual_command_list['DUST_TEMPERATURE_FILENAME']\
-                                             .strip('"')
-                subprocess.call(['scp %s %s@login.vic3.cc.kuleuven.be:%s'\
-                                 %(homefile,self.account,vicfile)],\
-                                shell=True)
-            homeinput = os.path.join(cc.data.gastronoom,self.path,'models',\
+                self.scheduler.put([homefile],vic_dustfile)
+            homeinput = os.path.join(cc.path.gastronoom,self.path,'models',\
                                      model_id,'vic_input','gastronoom_*.inp')
-            vicinput = os.path.join('/data','leuven',self.disk,self.account,\
-                                    'COCode',\
-                                    '%s_%i/.'%(model_id,self.current_model))
-            subprocess.call(['scp %s %s@login.vic3.cc.kuleuven.be:%s'\
-                             %(homeinput,self.account,vicinput)],shell=True)
+            vicinput = os.path.join(vic_model_folder,'.')
+            self.scheduler.put([homeinput],vicinput)
             subprocess.call(['rm %s'%homeinput],shell=True)
         
    
@@ -610,29 +582,28 @@ class Vic():
         
         '''
         
+        #- The state of VIC is queried once for all queued models: the input 
+        #- files that are left and the jobs still in the queue. 
+        vic_folders = dict([(current_model,\
+                             os.path.join(self.vic_data,'%s_%i/'\
+                                          %(self.models[current_model],\
+                                            current_model)))
+                            for current_model in self.transitions.keys()])
+        listing = self.scheduler.listFolders(vic_folders.values())
+        if wait_qstat and vic_folders:
+            sleep(10)    
+        queue = vic_folders and self.scheduler.getQueue() or []
+        to_be_removed = []
+        
         #- iteration op self.transitions, not self.models since the latter is 
         #- not updated as progress is checked...
         for current_model in self.transitions.keys():     
             model_id = self.models[current_model]
             print 'Currently checking %s...' %model_id
-            lsprocess = subprocess.Popen('ssh %s@login.vic3.cc.kuleuven.be '\
-                                         %self.account + \
-                                         'ls /data/leuven/%s/%s/COCode/%s_%i/'\
-                                         %(self.disk,self.account,model_id,\
-                                           current_model),\
-                                         shell=True,stdout=subprocess.PIPE)
-            lsfile = lsprocess.communicate()[0].split('\n')
             lsfile = [f 
-                      for f in lsfile 
+                      for f in listing[vic_folders[current_model]]
                       if f[-9:] != '.inp.done' and f != 'jobs.log' and f]
-            if wait_qstat:
-                sleep(10)    
-            qstatprocess = subprocess.Popen(\
-                    'ssh %s@login.vic3.cc.kuleuven.be qstat | grep %s'\
-                    %(self.account,self.account),shell=True,\
-                    stdout=subprocess.PIPE)
-            qstatfile = qstatprocess.communicate()[0].split('\n')
-            if not lsfile or qstatfile == ['']:
+            if not lsfile or not queue:
                 for model_id_sphinx in self.sphinx_model_ids[current_model]:
                     trans_strings = [trans.makeSphinxFilename() 
                                      for trans in self.transitions\
@@ -640,20 +611,16 @@ class Vic():
                                      if trans.getModelId() == model_id_sphinx]
                     heresph = os.path.join(cc.path.gastronoom,self.path,\
                                            'models',model_id_sphinx)
-                    for trans_string in trans_strings:
-                        vicsph = '/data/leuven/%s/%s/COCode/output/%s/%s'\
-                                 %(self.disk,self.account,model_id_sphinx,\
-                                   trans_string)
-                        subprocess.call('scp %s@login.vic3.cc.kuleuven.be:%s '\
-                                        %(self.account,vicsph)+'%s/.'%heresph,\
-                                        shell=True,stdout=subprocess.PIPE,\
-                                        stderr=subprocess.PIPE)
-                    vicjob = '/data/leuven/%s/%s/COCode/%s_%i/jobs.log'\
-                             %(self.disk,self.account,model_id,current_model)
-                    subprocess.call('scp %s@login.vic3.cc.kuleuven.be:%s '\
-                                    %(self.account,vicjob) + \
-                                    '%s/log_vic_jobs'%(heresph),\
-                                    shell=True,stdout=subprocess.PIPE)
+                    vicsph = [os.path.join(self.vic_data,'output',\
+                                           model_id_sphinx,trans_string)
+                              for trans_string in trans_strings]
+                    self.scheduler.get(vicsph,heresph)
+                    vicjob = os.path.join(vic_folders[current_model],\
+                                          'jobs.log')
+                    self.scheduler.get([vicjob],heresph)
+                    if os.path.isfile(os.path.join(heresph,'jobs.log')):
+                        os.rename(os.path.join(heresph,'jobs.log'),\
+                                  os.path.join(heresph,'log_vic_jobs'))
                     gas_session = Gastronoom.Gastronoom(\
                                         path_gastronoom=self.path,\
                                         sph_db=self.sph_db)
@@ -673,26 +640,15 @@ class Vic():
                         = [trans 
                            for trans in gas_session.trans_list 
                            if not trans.getModelId()]
-                    vicjob = '/user/leuven/%s/%s/COCode/vic_job_%s.sh*'\
-                             %(self.disk,self.account,model_id_sphinx)
-                    subprocess.call(['ssh %s@login.vic3.cc.kuleuven.be rm %s'\
-                                     %(self.account,vicjob)],shell=True)
+                    to_be_removed.append(os.path.join(self.vic_home,\
+                                         'vic_job_%s.sh*'%model_id_sphinx))
                 del self.transitions[current_model]
-                while self.inputfiles[current_model]:
-                    subprocess.call([' '.join(\
-                        ['ssh','%s@login.vic3.cc.kuleuven.be'%self.account,\
-                         'rm'] + \
-                        [self.inputfiles[current_model].pop() 
-                         for i in range(len(self.inputfiles[current_model]) \
-                                                < 100\
-                                            and len(self.inputfiles\
-                                                        [current_model])\
-                                            or 100)])],\
-                                    shell=True,stdout=subprocess.PIPE)
-                vicjobfile = '/user/leuven/%s/%s/COCode/vic_run_jobs_%s_%i.sh'\
-                             %(self.disk,self.account,model_id,current_model)
-                subprocess.call(['ssh %s@login.vic3.cc.kuleuven.be rm %s'\
-                                 %(self.account,vicjobfile)],shell=True)
+                to_be_removed.extend(self.inputfiles[current_model])
+                self.inputfiles[current_model] = []
+                to_be_removed.append(os.path.join(self.vic_home,\
+                                     'vic_run_jobs_%s_%i.sh'\
+                                     %(model_id,current_model)))
+        self.scheduler.remove(to_be_removed)
         self.sph_db.sync()
         if self.transitions:
             return True
@@ -152,13 +152,13 @@ class Chemistry(ModelingSession):
         
         """
         
-        #-- Lock the Chemistry database by opening it in read mode. It's closed
-        #   once the database check is finalised. Note that in a case of a crash
-        #   during the for loop, the python shell must be exited to unlock the 
-        #   sphinx database again. The sync() is now done only once at the very
-        #   end since the file on the disk will not change.
+        #-- Lock the Chemistry database for the duration of the check, such that
+        #   no other session can add the same model in the meantime. Note
+        #   that in a case of a crash during the for loop, the python shell
+        #   must be exited to unlock the database again. The sync() only
+        #   reads the database anew if another session wrote to it.
+        self.db.lock()
         if not self.single_session: self.db.sync()
-        chem_dbfile = self.db._open('r')
         db_ids = sorted(self.db.keys())
         for i,model_id in enumerate(db_ids):
             chem_dict = self.db[model_id]
@@ -212,8 +212,8 @@ class Chemistry(ModelingSession):
             finished = 0
         
         #-- Synchronize and unlock db.
-        chem_dbfile.close()
         if not self.single_session: self.db.sync()
+        self.db.unlock()
         return finished
         
         
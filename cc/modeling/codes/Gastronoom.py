@@ -17,6 +17,7 @@ import cc.path
 from cc.tools.io import DataIO
 from cc.tools.io import Atmosphere
 from cc.modeling.codes.ModelingSession import ModelingSession
+from cc.managers.JobRunner import JobRunner
 from cc.modeling.objects.Molecule import Molecule
 
 
@@ -31,7 +32,7 @@ class Gastronoom(ModelingSession):
     def __init__(self,path_gastronoom='runTest',vic=None,sphinx=0,\
                  replace_db_entry=0,cool_db=None,ml_db=None,sph_db=None,\
                  skip_cooling=0,recover_sphinxfiles=0,\
-                 new_entries=[],single_session=0):
+                 new_entries=[],single_session=0,jobs=1):
     
         """ 
         Initializing an instance of a GASTRoNOoM modeling session.
@@ -94,6 +95,13 @@ class Gastronoom(ModelingSession):
                                  
                                  (default: 0)
         @type single_session: bool
+        @keyword jobs: The number of mline and sphinx calculations ran at the 
+                       same time on the local machine. If more than 1, the 
+                       output of the calculations is written to log files in 
+                       the models folder instead of the shell.
+                       
+                       (default: 1)
+        @type jobs: int
                 
         """
         
@@ -147,6 +155,10 @@ class Gastronoom(ModelingSession):
         self.ml_db = ml_db
         self.sph_db = sph_db
         #self.pacs_db = pacs_db
+        if int(jobs) > 1:
+            self.runner = JobRunner(max_jobs=jobs)
+        else:
+            self.runner = None
         
 
 
@@ -203,6 +215,40 @@ class Gastronoom(ModelingSession):
 
 
     
+    def submitGastronoom(self,filename,subcode,callback,args=()):
+        
+        '''
+        Submit a subprocess of GASTRoNOoM, mline or sphinx, to the local job 
+        runner. 
+        
+        The output of the subcode is written to a log file with the name of
+        the inputfile. The callback is called with args once the calculation
+        is finished, when the runner is polled or waited for.
+        
+        @param filename: the full path+filename of the inputfile
+        @type filename: string
+        @param subcode: one of ['mline','sphinx'], the code to run
+        @type subcode: string
+        @param callback: Called once the calculation is finished
+        @type callback: function
+        
+        @keyword args: The arguments passed to the callback
+        
+                       (default: ())
+        @type args: tuple
+        
+        '''
+        
+        if not subcode.lower() in ['mline','sphinx']:
+            raise IOError('Subcode of GASTRoNOoM wrongly specified.')
+        logfile = os.path.splitext(filename)[0] + '.log'
+        print '** Submitting %s. Output is written to %s.'%(subcode,logfile)
+        self.runner.submit('echo %s | %s'%(filename,subcode.lower()),\
+                           logfile=logfile,\
+                           callback=lambda *x: callback(*x[:-1]),args=args)
+
+
+
     def makeIdLog(self,new_id,molec_id=None):
         
         '''
@@ -289,14 +335,19 @@ class Gastronoom(ModelingSession):
         
         """
         
-        #-- Lock the cooling database by opening it in read mode. It's closed
-        #   once the database check is finalised. Note that in a case of a crash
-        #   during the for loop, the python shell must be exited to unlock the 
-        #   sphinx database again. The sync() is now done only once at the very
-        #   end since the file on the disk will not change.
+        #-- Lock the cooling database for the duration of the check, such that
+        #   no other session can add the same model in the meantime. Note
+        #   that in a case of a crash during the for loop, the python shell
+        #   must be exited to unlock the database again. The sync() only
+        #   reads the database anew if another session wrote to it.
+        self.cool_db.lock()
         if not self.single_session: self.cool_db.sync()
-        cool_dbfile = self.cool_db._open('r')        
-        for i,model_id in enumerate(sorted(self.cool_db.keys())):
+        
+        #-- Only the entries selected by the parameter index can match. They
+        #   are checked in the same order as the full database would be.
+        candidates = self.getDbCandidates(self.cool_db,self.command_list,\
+                                          'cooling',extra_dict=molec_dict)
+        for model_id in candidates:
             cool_dict = self.cool_db[model_id]
             model_bool = self.cCL(self.command_list.copy(),cool_dict,'cooling',\
                                   extra_dict=molec_dict)
@@ -324,17 +375,10 @@ class Gastronoom(ModelingSession):
                     self.updateModel()
                     finished = 1
                     break
-            
-            #-- Reached the end of db without match. Make new entry in db, in
-            #   progress. Cant combine this with next line in case the last
-            #   model gives a match.
-            if i == len(self.cool_db)-1:
-                print 'No match found in GASTRoNOoM cooling database. ' + \
-                      'Calculating new model.'
-                finished = 0
-        
-        #-- In case of an empty db, the above loop is not accessed.
-        if not self.cool_db.keys():
+        
+        #-- Reached the end of the candidates without match, or the db is 
+        #   empty. Make new entry in db, in progress. 
+        else:
             print 'No match found in GASTRoNOoM cooling database. ' + \
                   'Calculating new model.'
             finished = 0
@@ -349,8 +393,8 @@ class Gastronoom(ModelingSession):
             self.cool_db[self.model_id] = molec_dict
         
         #-- Synchronize and unlock db.
-        cool_dbfile.close()
         if not self.single_session: self.cool_db.sync()
+        self.cool_db.unlock()
         return finished
                 
 
@@ -366,13 +410,13 @@ class Gastronoom(ModelingSession):
         
         """
         
-        #-- Lock the mline database by opening it in read mode. It's closed
-        #   once the database check is finalised. Note that in a case of a crash
-        #   during the for loop, the python shell must be exited to unlock the 
-        #   sphinx database again. The sync() is now done only once at the very
-        #   end since the file on the disk will not change.
+        #-- Lock the mline database for the duration of the check, such that
+        #   no other session can add the same model in the meantime. Note
+        #   that in a case of a crash during the for loop, the python shell
+        #   must be exited to unlock the database again. The sync() only
+        #   reads the database anew if another session wrote to it.
+        self.ml_db.lock()
         if not self.single_session: self.ml_db.sync()
-        ml_dbfile = self.ml_db._open('r')
         if not self.ml_db.has_key(self.model_id):
             self.ml_db[self.model_id] = dict([(self.model_id,dict())])
             for molec in self.molec_list:
@@ -381,8 +425,8 @@ class Gastronoom(ModelingSession):
                 md = molec.makeDict(in_progress=1)
                 self.ml_db[self.model_id][self.model_id][molec.molecule] = md
             self.ml_db.addChangedKey(self.model_id)
-            ml_dbfile.close()
             self.ml_db.sync()
+            self.ml_db.unlock()
             return [False]*len(self.molec_list)
 
         model_bools = []
@@ -482,8 +526,8 @@ class Gastronoom(ModelingSession):
                 print 'Mline model for %s '%molec.molecule + \
                       'has not been calculated before. Calculate anew with '+ \
                       'ID %s.'%(molec.getModelId())
-        ml_dbfile.close()
         if not self.single_session: self.ml_db.sync()
+        self.ml_db.unlock()
         return model_bools            
 
 
@@ -501,13 +545,13 @@ class Gastronoom(ModelingSession):
         #-- Remember which molecules have been added to new id, if applicable
         copied_molecs = []    
 
-        #-- Lock the sphinx database by opening it in read mode. It's closed
-        #   once the database check is finalised. Note that in a case of a crash
-        #   during the for loop, the python shell must be exited to unlock the 
-        #   sphinx database again. The sync() is now done only once at the very
-        #   end since the file on the disk will not change.
+        #-- Lock the sphinx database for the duration of the check, such that
+        #   no other session can add the same model in the meantime. Note
+        #   that in a case of a crash during the for loop, the python shell
+        #   must be exited to unlock the database again. The sync() only
+        #   reads the database anew if another session wrote to it.
+        self.sph_db.lock()
         if not self.single_session: self.sph_db.sync()
-        sph_dbfile = self.sph_db._open('r')
         if not self.sph_db.has_key(self.model_id):
             self.sph_db[self.model_id] = dict()
         for trans in self.trans_list:
@@ -630,8 +674,8 @@ class Gastronoom(ModelingSession):
                     self.sph_db[self.model_id][molec_id][k][str(trans)] = td
                     self.sph_db.addChangedKey(self.model_id)
 
-        sph_dbfile.close()
         if not self.single_session: self.sph_db.sync()
+        self.sph_db.unlock()
         
 
 
@@ -805,48 +849,27 @@ class Gastronoom(ModelingSession):
                                         for v in self.command_list\
                                                     ['R_POINTS_MASS_LOSS']] +\
                                        ['####'])
-                filename = os.path.join(cc.path.gout,'models',\
-                                        'gastronoom_%s.inp'%molec.getModelId())
+                #-- Molecules sharing a molecule id get their own inputfile
+                #   when ran concurrently.
+                if self.runner is None:
+                    fn = 'gastronoom_%s.inp'%molec.getModelId()
+                else:
+                    fn = 'gastronoom_%s_%s.inp'%(molec.getModelId(),\
+                                                 molec.molecule)
+                filename = os.path.join(cc.path.gout,'models',fn)
                 DataIO.writeFile(filename,commandfile)                
-                self.execGastronoom(subcode='mline',filename=filename)
                 self.mline_done=True
-                path = os.path.join(cc.path.gout,'models',molec.getModelId())
-                fns = 'ml*{}_{}.dat'.format(molec.getModelId(),molec.molecule)
-                if len(glob(os.path.join(path,fns))) == 3:
-                    #-- Remove in-progress entry.
-                    if self.ml_db[self.model_id][molec.getModelId()]\
-                            [molec.molecule].has_key('IN_PROGRESS'):
-                        del self.ml_db[self.model_id][molec.getModelId()]\
-                                      [molec.molecule]['IN_PROGRESS']
-                    
-                    #-- Write mline keywords not included in sph files but used 
-                    #   in the database in an extra log file. Only do this if it
-                    #   doesn't already exist. The parameters should be the same
-                    #   for all transitions with this model id.
-                    mlfn = 'mline_parameters_{}.log'.format(molec.molecule)
-                    mlfn = os.path.join(path,mlfn)
-                    if not os.path.isfile(mlfn):
-                        #-- Add MOLECULE too. Cuz, why not. For TRANSITION, that
-                        #   info is recreated from sph files. Not so for mline.
-                        mlfile = ['{}={}'.format(k,v)
-                                  for k,v in sorted(molec.makeDict().items())]
-                        DataIO.writeFile(mlfn,mlfile)
+                if self.runner is None:
+                    self.execGastronoom(subcode='mline',filename=filename)
+                    self.checkMlineOutput(molec)
                 else:
-                    del self.ml_db[self.model_id][molec.getModelId()]\
-                                  [molec.molecule] 
-                    #-- Remove the molecule id if it does not contain molecules
-                    #   anymore. The id is thus unused.
-                    if not self.ml_db[self.model_id][molec.getModelId()].keys():
-                        del self.ml_db[self.model_id][molec.getModelId()]
-                    print 'Mline model calculation failed for'\
-                          '%s. No entry is added to the database.'\
-                          %(molec.molecule)
-                    molec.setModelId('')
-                    
-                #-- Synchronize db: Both when successful or failure. 
-                self.ml_db.addChangedKey(self.model_id)
-                if not self.single_session: self.ml_db.sync()
-                
+                    self.submitGastronoom(subcode='mline',filename=filename,\
+                                          callback=self.checkMlineOutput,\
+                                          args=(molec,))
+        
+        #-- Collect the mline models ran concurrently as they finish
+        if not self.runner is None:
+            self.runner.wait()
                 
         if set([molec.getModelId() for molec in self.molec_list]) == set(['']):  
             #- no mline models calculated: stop GASTRoNOoM here
@@ -863,6 +886,58 @@ class Gastronoom(ModelingSession):
             
    
 
+    def checkMlineOutput(self,molec):
+        
+        '''
+        Check if mline output is complete and update the database with the 
+        calculated model. 
+        
+        Requires model_id and path defined in Gastronoom instance.
+        
+        @param molec: the molecule that is being checked
+        @type molec: Molecule()
+        
+        '''
+        
+        path = os.path.join(cc.path.gout,'models',molec.getModelId())
+        fns = 'ml*{}_{}.dat'.format(molec.getModelId(),molec.molecule)
+        if len(glob(os.path.join(path,fns))) == 3:
+            #-- Remove in-progress entry.
+            if self.ml_db[self.model_id][molec.getModelId()]\
+                    [molec.molecule].has_key('IN_PROGRESS'):
+                del self.ml_db[self.model_id][molec.getModelId()]\
+                              [molec.molecule]['IN_PROGRESS']
+            
+            #-- Write mline keywords not included in sph files but used 
+            #   in the database in an extra log file. Only do this if it
+            #   doesn't already exist. The parameters should be the same
+            #   for all transitions with this model id.
+            mlfn = 'mline_parameters_{}.log'.format(molec.molecule)
+            mlfn = os.path.join(path,mlfn)
+            if not os.path.isfile(mlfn):
+                #-- Add MOLECULE too. Cuz, why not. For TRANSITION, that
+                #   info is recreated from sph files. Not so for mline.
+                mlfile = ['{}={}'.format(k,v)
+                          for k,v in sorted(molec.makeDict().items())]
+                DataIO.writeFile(mlfn,mlfile)
+        else:
+            del self.ml_db[self.model_id][molec.getModelId()]\
+                          [molec.molecule] 
+            #-- Remove the molecule id if it does not contain molecules
+            #   anymore. The id is thus unused.
+            if not self.ml_db[self.model_id][molec.getModelId()].keys():
+                del self.ml_db[self.model_id][molec.getModelId()]
+            print 'Mline model calculation failed for'\
+                  '%s. No entry is added to the database.'\
+                  %(molec.molecule)
+            molec.setModelId('')
+            
+        #-- Synchronize db: Both when successful or failure. 
+        self.ml_db.addChangedKey(self.model_id)
+        if not self.single_session: self.ml_db.sync()
+        
+        
+
     def doSphinx(self,star):
         
         """
@@ -911,15 +986,29 @@ class Gastronoom(ModelingSession):
                                             for v in self.command_list\
                                                     ['R_POINTS_MASS_LOSS']] + \
                                            ['####'])
-                    filename = os.path.join(cc.path.gout,'models',\
-                                            'gastronoom_%s.inp'\
-                                            %trans.getModelId())
+                    #-- Transitions sharing a transition id get their own 
+                    #   inputfile when ran concurrently.
+                    if self.runner is None:
+                        fn = 'gastronoom_%s.inp'%trans.getModelId()
+                    else:
+                        fn = 'gastronoom_%s_%i.inp'%(trans.getModelId(),i+1)
+                    filename = os.path.join(cc.path.gout,'models',fn)
                     DataIO.writeFile(filename,commandfile)                
                     print 'Starting calculation for transition %i out of %i.'\
                           %(i+1,len(self.trans_bools))
-                    self.execGastronoom(subcode='sphinx',filename=filename)
-                    self.checkSphinxOutput(trans)
-                    if not self.single_session: self.sph_db.sync()
+                    if self.runner is None:
+                        self.execGastronoom(subcode='sphinx',filename=filename)
+                        self.checkSphinxOutput(trans)
+                        if not self.single_session: self.sph_db.sync()
+                    else:
+                        self.submitGastronoom(subcode='sphinx',\
+                                              filename=filename,\
+                                              callback=self.__collectSphinx,\
+                                              args=(trans,))
+        
+        #-- Collect the sphinx models ran concurrently as they finish
+        if not self.runner is None:
+            self.runner.wait()
                     
         #- check if at least one of the transitions was calculated: then 
         #- self.model_id doesnt have to be changed
@@ -946,6 +1035,22 @@ class Gastronoom(ModelingSession):
             
  
  
+    def __collectSphinx(self,trans):
+        
+        '''
+        Check the output of a sphinx model ran by the local job runner, and
+        synchronize the sphinx database.
+        
+        @param trans: the transition that is being checked
+        @type trans: Transition()
+        
+        '''
+        
+        self.checkSphinxOutput(trans)
+        if not self.single_session: self.sph_db.sync()
+        
+        
+
     def finalizeSphinx(self):
         
         '''
@@ -49,7 +49,7 @@ def readModelSpectrum(dpath,rt_spec=1,fn_spec='spectrum45.0.dat'):
     try:    
         if rt_spec:  
             dfile = os.path.join(dpath,fn_spec)
-            this_data = DataIO.readCols(dfile)
+            this_data = DataIO.readCols(dfile,binary=1)
             #- if the lists are not empty
             if list(this_data[0]) and list(this_data[1]):    
                 w = this_data[0]
@@ -60,8 +60,8 @@ def readModelSpectrum(dpath,rt_spec=1,fn_spec='spectrum45.0.dat'):
         print 'No spectrum was found or ray-tracing is off for ' + \
               'this model. Taking average of theta-grid MCSpectra.'
         dfiles = glob(os.path.join(dpath,'MCSpec*.dat'))
-        w = DataIO.readCols(filename=dfiles[0])[0]
-        mcy_list = [DataIO.readCols(f)[1] for f in dfiles]
+        w = DataIO.readCols(filename=dfiles[0],binary=1)[0]
+        mcy_list = [DataIO.readCols(f,binary=1)[1] for f in dfiles]
         f = sum(mcy_list)/len(mcy_list)
     return (w,f)
 
@@ -429,15 +429,18 @@ class MCMax(ModelingSession):
         
         """
         
-        #-- Lock the MCMax database by opening it in read mode. It's closed
-        #   once the database check is finalised. Note that in a case of a crash
-        #   during the for loop, the python shell must be exited to unlock the 
-        #   sphinx database again. The sync() is now done only once at the very
-        #   end since the file on the disk will not change.
+        #-- Lock the MCMax database for the duration of the check, such that
+        #   no other session can add the same model in the meantime. Note
+        #   that in a case of a crash during the for loop, the python shell
+        #   must be exited to unlock the database again. The sync() only
+        #   reads the database anew if another session wrote to it.
+        self.db.lock()
         if not self.single_session: self.db.sync()
-        mcm_dbfile = self.db._open('r')
-        db_ids = sorted(self.db.keys())
-        for i,model_id in enumerate(db_ids):
+        
+        #-- Only the entries selected by the parameter index can match. They
+        #   are checked in the same order as the full database would be.
+        db_ids = self.getDbCandidates(self.db,self.command_list,'mcmax')
+        for model_id in db_ids:
             mcm_dict = self.db[model_id]
             model_bool = self.compareCommandLists(self.command_list.copy(),\
                                                   mcm_dict)
@@ -464,16 +467,9 @@ class MCMax(ModelingSession):
                     finished = 1
                     break
         
-            #-- Reached the end of db without match. Make new entry in db, in
-            #   progress. Cant combine this with next line in case the last
-            #   model gives a match.
-            if i == len(self.db)-1:
-                print 'No match found in MCMax database. ' + \
-                      'Calculating new model.'
-                finished = 0
-        
-        #-- In case of an empty db, the above loop is not accessed.
-        if not self.db.keys():
+        #-- Reached the end of the candidates without match, or the db is 
+        #   empty. Make new entry in db, in progress. 
+        else:
             print 'No match found in MCMax database. Calculating new model.'
             finished = 0
         
@@ -484,8 +480,8 @@ class MCMax(ModelingSession):
             self.db[self.model_id]['IN_PROGRESS'] = 1
         
         #-- Synchronize and unlock db.
-        mcm_dbfile.close()
         if not self.single_session: self.db.sync()
+        self.db.unlock()
         return finished
         
         
@@ -8,7 +8,7 @@ Author: R. Lombaert
 """
 
 import os
-from time import gmtime
+from time import gmtime, time, sleep
 import types
 
 import cc.path
@@ -22,7 +22,12 @@ class ModelingSession(object):
     The basic modeling environment. Inherited by MCMax() and Gastronoom().
     
     """
-      
+    
+    #-- Shared by the worker processes of a parallel grid calculation, such 
+    #   that no two workers make the same model id. See setIdClock().
+    id_lock = None
+    id_clock = None
+    
     def __init__(self,code,path,replace_db_entry=0,new_entries=[],\
                  single_session=0):
         
@@ -80,11 +85,52 @@ class ModelingSession(object):
         '''
         Make a new model_id based on the current UTC in seconds since 1970.
         
+        If a shared id clock is set, the model_id is unique among all worker 
+        processes of the parallel grid calculation. A new id is then only made
+        once the last id handed out is at least one second old.
+        
+        '''
+        
+        if self.id_lock is None:
+            t = gmtime()
+        else:
+            self.id_lock.acquire()
+            try:
+                now = int(time())
+                while now <= self.id_clock.value:
+                    sleep(0.1)
+                    now = int(time())
+                self.id_clock.value = now
+            finally:
+                self.id_lock.release()
+            t = gmtime(now)
+        return 'model_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i'%tuple(t[:6])
+                  
+                  
+                  
+    @classmethod
+    def setIdClock(cls,lock=None,clock=None):
+        
+        '''
+        Set the lock and the time of the last model_id made, shared by the 
+        worker processes of a parallel grid calculation.
+        
+        Must be set before the worker processes are started. Without arguments
+        the shared clock is removed again.
+        
+        @keyword lock: The lock around the shared clock
+        
+                       (default: None)
+        @type lock: multiprocessing.Lock()
+        @keyword clock: The time in seconds since 1970 of the last model_id
+        
+                        (default: None)
+        @type clock: multiprocessing.Value('l')
+        
         '''
         
-        return 'model_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
-                %(gmtime()[0],gmtime()[1],gmtime()[2],\
-                  gmtime()[3],gmtime()[4],gmtime()[5])
+        cls.id_lock = lock
+        cls.id_clock = clock
                   
                   
                   
@@ -259,3 +305,41 @@ class ModelingSession(object):
         '''
         
         return self.compareCommandLists(*args,**kwargs)
+    
+    
+    
+    def getDbCandidates(self,db,this_list,code,extra_dict=None):
+        
+        '''
+        Return the ids of the database entries that can match a parameter set.
+        
+        The parameter index of the database is queried, so not every entry in
+        the database has to be compared. The candidates are sorted, and still
+        have to be checked with compareCommandLists. Any entry not returned is
+        guaranteed to fail that check.
+        
+        @param db: The database to be checked
+        @type db: Database()
+        @param this_list: parameters in this modeling session
+        @type this_list: dict
+        @param code: The (sub)code, as passed to compareCommandLists
+        @type code: string
+        
+        @keyword extra_dict: if not None this gives extra dictionary entries 
+                             to be used in the comparison on top of this_list.
+                             
+                             (default: None)
+        @type extra_dict: dict
+        
+        @return: The candidate model ids
+        @rtype: list[str]
+        
+        '''
+        
+        this_list = this_list.copy()
+        if not extra_dict is None: this_list.update(extra_dict)
+        if code == 'mcmax':
+            index = db.getIndex(code,exclude=['dust_species','IN_PROGRESS'])
+        else:
+            index = db.getIndex(code,keywords=getattr(self,code+'_keywords'))
+        return index.query(db,this_list)
@@ -337,9 +337,9 @@ class Molecule():
         self.n_impact_extra = int(n_impact_extra)
         self.path_gastronoom = path_gastronoom
         
-        self.molecule_index = DataIO.getInputData(keyword='TYPE_SHORT',\
-                                                  filename='Molecule.dat')\
-                                                 .index(self.molecule)
+        self.molecule_index = DataIO.getInputIndex(self.molecule,\
+                                                   keyword='TYPE_SHORT',\
+                                                   filename='Molecule.dat')
         mdata = ['MOLEC_TYPE','NAME_SHORT','NAME_PLOT',\
                  'SPEC_INDICES','USE_INDICES_DAT']
         attrs = ['molecule_full','molecule_short','molecule_plot',\
@@ -408,8 +408,9 @@ class Molecule():
             if self.use_indices_dat:
                 tag = '_'.join([self.molecule,str(self.ny_low),\
                                 str(self.ny_up),str(self.nline)])
-                i = DataIO.getInputData(start_index=4,keyword='MOLECULE',\
-                                        filename='Indices.dat').index(tag)
+                i = DataIO.getInputIndex(tag,start_index=4,\
+                                         keyword='MOLECULE',\
+                                         filename='Indices.dat')
                 fn = DataIO.getInputData(path=cc.path.usr,keyword='RADIAT',\
                                          filename='Indices.dat',start_index=4,\
                                          rindex=i)
@@ -417,7 +418,10 @@ class Molecule():
             else: 
                 fn = os.path.join(cc.path.gdata,'%s_radiat.dat'%self.molecule)
 
-            self.radiat = RadiatReader.RadiatReader(fn=fn,nline=self.nline,
+            #-- The spectroscopy is shared by all molecules with the same 
+            #   radiat file, ny and nline.
+            self.radiat = RadiatReader.RadiatReader.getShared(fn=fn,\
+                                                    nline=self.nline,\
                                                     ny=self.ny_up+self.ny_low)
             if self.spec_indices:
                 if self.use_indices_dat:
@@ -430,9 +434,16 @@ class Molecule():
                                          '{}_indices.dat'.format(self.molecule))
                 rf = DataIO.readFile(filename,' ')
                 self.radiat_indices = [[int(i) for i in line] for line in rf]
+                
+                #-- Map the quantum numbers to the level index. The first 
+                #   occurrence is kept, as list.index() does.
+                self.radiat_levels = dict()
+                for line in self.radiat_indices:
+                    self.radiat_levels.setdefault(tuple(line[1:]),line[0])
         else:
             self.radiat = None
             self.radiat_indices = None
+            self.radiat_levels = None
         self.starfile = starfile
         self.mline = None
 
@@ -168,6 +168,11 @@ class Star(dict):
         
         self.dust_list = None
         
+        #-- Index of GAS_LINES by transition key, see getTransition(). 
+        self.__trans_index = None
+        self.__trans_index_list = None
+        self.__trans_index_len = 0
+        
         
 
     def __getitem__(self,key):
@@ -697,11 +702,45 @@ class Star(dict):
         
         '''
         
-        try: 
-            i = self['GAS_LINES'].index(sample)
-            return self['GAS_LINES'][i]
-        except ValueError: 
+        #-- The index is rebuilt when GAS_LINES is replaced or extended.
+        gas_lines = self['GAS_LINES']
+        if self.__trans_index is None \
+                or not self.__trans_index_list is gas_lines \
+                or self.__trans_index_len != len(gas_lines):
+            self.__indexTransitions()
+        try:
+            key = sample.getKey()
+        except AttributeError:
+            key = str(sample)
+        i = self.__trans_index.get(key)
+        if i is None:
             return None
+        #-- A line may have been replaced in place. Rebuild the index once.
+        if i >= len(gas_lines) or gas_lines[i].getKey() != key:
+            self.__indexTransitions()
+            i = self.__trans_index.get(key)
+            if i is None:
+                return None
+        return gas_lines[i]
+
+
+
+    def __indexTransitions(self):
+        
+        '''
+        Index the transitions in GAS_LINES by their identity key.
+        
+        The first occurrence of a transition is kept, as list.index() does.
+        
+        '''
+        
+        gas_lines = self['GAS_LINES']
+        index = dict()
+        for i,trans in enumerate(gas_lines):
+            index.setdefault(trans.getKey(),i)
+        self.__trans_index = index
+        self.__trans_index_list = gas_lines
+        self.__trans_index_len = len(gas_lines)
 
 
 
@@ -3052,9 +3091,9 @@ class Star(dict):
                 #- the short names, since if len() is 2, it comes from 
                 #- PlottingSession.setPacsFromDb
                 molec_indices \
-                    = [DataIO.getInputData(keyword='MOLEC_TYPE',make_float=0,\
-                                           filename='Molecule.dat')\
-                                          .index(molec[0]) 
+                    = [DataIO.getInputIndex(molec[0],keyword='MOLEC_TYPE',\
+                                            make_float=0,\
+                                            filename='Molecule.dat')
                        for molec in self['MOLECULE']]
                 molecules_long = [molec[0] for molec in self['MOLECULE']]
                 self['MOLECULE'] \
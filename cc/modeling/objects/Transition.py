@@ -388,9 +388,8 @@ def makeTransition(trans,star=None,def_molecs=None,**kwargs):
     
     #-- The GASTRoNOoM syntax, with long molecule name (always includes a '.')
     if trans[0].find('.') != -1:
-        imolec = DataIO.getInputData(keyword='MOLEC_TYPE',\
-                                     filename='Molecule.dat',\
-                                     make_float=0).index(trans[0])
+        imolec = DataIO.getInputIndex(trans[0],keyword='MOLEC_TYPE',\
+                                      filename='Molecule.dat',make_float=0)
         molec_short = DataIO.getInputData(keyword='TYPE_SHORT',\
                                           filename='Molecule.dat')[imolec]
     else:
@@ -782,16 +781,68 @@ def checkUniqueness(trans_list):
     '''
 
     merged = []
+    #-- Position of every unique transition in merged, by identity key
+    positions = dict()
     for trans in trans_list:
-        if trans not in merged: 
+        key = trans.getKey()
+        if not positions.has_key(key): 
+            positions[key] = len(merged)
             merged.append(trans)
         else:
             #-- Only add data files if there are any to begin with.
             if not trans.datafiles is None:
                 ddict = dict(zip(trans.datafiles,trans.fittedlprof))
-                merged[merged.index(trans)].addDatafile(ddict)
+                merged[positions[key]].addDatafile(ddict)
     return merged
     
+
+
+def setBestVlsrs(trans_list,index=0):
+    
+    '''
+    Determine the best vlsr for a list of transitions at once, e.g. all models
+    calculated for one sample transition. 
+    
+    The result is the same as calling getBestVlsr for every transition. 
+    Transitions that are compared with the same data points and the same set 
+    of velocity shifts are grouped, and the chi squared values of all shifted 
+    model profiles in a group are calculated as a single array operation.
+    
+    Transitions for which the best vlsr is already known, or cannot be 
+    determined, are left alone.
+    
+    @param trans_list: The transitions
+    @type trans_list: list[Transition()]
+    
+    @keyword index: The data list index of the data used for the comparison
+    
+                    (default: 0)
+    @type index: int
+    
+    '''
+    
+    groups = dict()
+    for trans in trans_list:
+        if not trans.best_vlsr is None: 
+            continue
+        shifted = trans.getShiftedModels(index=index)
+        if shifted is None:
+            continue
+        vlsr_grid,mtmb_grid,(dsel,selection),noise = shifted
+        
+        #-- The data points, noise and the number of shifts identify a group
+        key = (noise,mtmb_grid.shape,selection.tostring(),dsel.tostring())
+        if not groups.has_key(key):
+            groups[key] = (dsel,selection,noise,[])
+        groups[key][3].append((trans,vlsr_grid,mtmb_grid))
+    
+    for dsel,selection,noise,group in groups.values():
+        #-- One chi squared value per model (rows) and velocity shift (columns)
+        models = array([g[2][:,selection] for g in group])
+        chisquared = bs.calcChiSquared(data=dsel,model=models,noise=noise)
+        for (trans,vlsr_grid,mtmb_grid),chi2 in zip(group,chisquared):
+            trans.setBestVlsr(vlsr_grid,mtmb_grid,chi2)
+    
     
 
 class Transition():
@@ -987,6 +1038,7 @@ class Transition():
         self.check_tau_step = check_tau_step
         
         self.__model_id = None
+        self.__key = None
         if nup is None or nlow is None:
             self.nup = self.kaup            
             self.nlow = self.kalow
@@ -1047,11 +1099,33 @@ class Transition():
         
         '''
         
-        ll = [self.molecule.molecule_full,self.vup,self.jup,self.kaup,\
-              self.kcup,self.vlow,self.jlow,self.kalow,self.kclow,\
-              self.telescope,self.offset]
-        tstr = 'TRANSITION={} {:d} {:d} {:d} {:d} {:d} {:d} {:d} {:d} {} {:.2f}'
-        return tstr.format(*ll)
+        return self.getKey()
+                    
+
+
+    def getKey(self):
+        
+        '''
+        Return the identity key of the transition, ie the string as it should
+        appear in the GASTRoNOoM input file.
+        
+        The key is made once and remembered. The quantum numbers, telescope 
+        and offset are not changed after the transition is made, so the key 
+        does not change either. 
+        
+        @return: The identity key
+        @rtype: string
+        
+        '''
+        
+        if self.__key is None:
+            ll = [self.molecule.molecule_full,self.vup,self.jup,self.kaup,\
+                  self.kcup,self.vlow,self.jlow,self.kalow,self.kclow,\
+                  self.telescope,self.offset]
+            tstr = 'TRANSITION={} {:d} {:d} {:d} {:d} {:d} {:d} {:d} {:d} '+\
+                   '{} {:.2f}'
+            self.__key = tstr.format(*ll)
+        return self.__key
                     
 
 
@@ -1074,6 +1148,8 @@ class Transition():
         '''
         
         try:        
+            if isinstance(other,Transition):
+                return self.getKey() == other.getKey()
             if str(self) == str(other):
                 return True
             else:
@@ -1102,6 +1178,8 @@ class Transition():
         '''
         
         try:
+            if isinstance(other,Transition):
+                return self.getKey() != other.getKey()
             if str(self) != str(other):
                 return True
             else:
@@ -1129,7 +1207,7 @@ class Transition():
         
         '''
         
-        return hash(str(self))
+        return hash(self.getKey())
 
 
 
@@ -1440,10 +1518,14 @@ class Transition():
             #-- Get index of the transition quantum numbers in the indices list
             #   If not present in list, ValueError is raised: probably caused 
             #   by using a linelist that doesn't include this transition.
-            self.lup  = indices[[i[1:] 
-                                for i in indices].index(quantum_up)][0]
-            self.llow = indices[[i[1:] 
-                                for i in indices].index(quantum_low)][0]
+            levels = self.molecule.radiat_levels
+            try:
+                self.lup  = levels[tuple(quantum_up)]
+                self.llow = levels[tuple(quantum_low)]
+            except KeyError:
+                msg = 'Quantum numbers of %s not found in the indices list.'\
+                      %self.getInputString(include_nquad=0)
+                raise ValueError(msg)
         
         #-- Retrieve the transition index based on the level indices. Check if 
         #   only a single index is returned. If not, something is wrong with the
@@ -1957,16 +2039,80 @@ class Transition():
         if not self.best_vlsr is None:
             return self.best_vlsr
 
-        #-- Read the data.
-        #   This will set the vexp, soft parabola and gaussian profiles
-        self.readData()
+        shifted = self.getShiftedModels(index=index)
         
         #-- Cannot be done for unresolved lines. 
         #   Cannot be done if sphinx has not been calculated.
         #   Then, return the vlsr from Star.dat
+        if shifted is None:
+            return self.getVlsr(index=index)
+        vlsr_grid,mtmb_grid,(dsel,selection),noise = shifted
+        
+        #-- Calculate the chi squared for every shifted model at once
+        chisquared = bs.calcChiSquared(data=dsel,\
+                                       model=mtmb_grid[:,selection],\
+                                       noise=noise)
+        self.setBestVlsr(vlsr_grid,mtmb_grid,chisquared)
+        return self.best_vlsr
+        
+        
+        
+    def setBestVlsr(self,vlsr_grid,mtmb_grid,chisquared):
+        
+        """
+        Set the best vlsr from the chi squared values of the shifted model 
+        profiles. See getBestVlsr. 
+        
+        @param vlsr_grid: The tested vlsr values
+        @type vlsr_grid: array
+        @param mtmb_grid: The shifted model profiles on the data velocity grid
+        @type mtmb_grid: array
+        @param chisquared: The chi squared value of every shifted profile
+        @type chisquared: array
+        
+        """
+        
+        #-- Get the minimum chi squared, set the best_vlsr and set the best 
+        #   shifted model profile
+        imin = argmin(chisquared)
+        self.chi2_best_vlsr = chisquared[imin]
+        self.best_vlsr = vlsr_grid[imin]
+
+        #-- Note that the velocity grid of best_mtmb is the data velocity
+        self.best_mtmb = array(mtmb_grid[imin])
+        
+        
+        
+    def getShiftedModels(self,index=0):
+        
+        """
+        Shift the sphinx model profile over a range of source velocities, 
+        and interpolate it on the data velocity grid, for getBestVlsr. 
+        
+        The profiles for all velocities are evaluated at once, as a 2d array.
+        
+        Method will attempt to call self.readData and readSphinx if either are 
+        not available. 
+       
+        @keyword index: The data list index of the requested noise value
+        
+                        (default: 0)
+        @type index: int
+        
+        @return: The tested vlsr values, the shifted model profiles (one per 
+                 row), the data points used for the comparison together with
+                 their selection, and the noise. None if the line is 
+                 unresolved or if data or sphinx are not available.
+        @rtype: (array,array,(array,array),float)
+        
+        """
+        
+        #-- Read the data.
+        #   This will set the vexp, soft parabola and gaussian profiles
+        self.readData()
         self.readSphinx()
         if self.unresolved or not self.lpdata or not self.sphinx:
-            return self.getVlsr(index=index)
+            return None
         
         #-- get all the profiles and noise values
         noise = self.getNoise(index=index)
@@ -1990,30 +2136,19 @@ class Transition():
         res = dvel[1]-dvel[0]
         nstep = int(0.5*self.getVexp(index=index)/res+1)
         
-        #-- Use the interpolation for the nstep*2+1 shifted velocity grids
-        mtmb_grid = [interpolator(dvel+i*res) for i in range(-nstep,nstep+1)]
+        #-- Use the interpolation for the nstep*2+1 shifted velocity grids, 
+        #   one grid per row
+        shifts = np.arange(-nstep,nstep+1)
+        mtmb_grid = interpolator(dvel[np.newaxis,:]+shifts[:,np.newaxis]*res)
         
         #-- Note that we shift the data velocity grid, while we should be 
         #   shifting the model velocity grid instead with several vlsr values. 
         #   Therefore perform the inverse operation to determine the actual vlsr
-        vlsr_grid = [self.getVlsr(index)-i*res for i in range(-nstep,nstep+1)]
-
-        #-- Calculate the chi squared for every shifted model
-        chisquared = [bs.calcChiSquared(data=dtmb[dtmb>=-3*noise],\
-                                        model=mtmbi[dtmb>=-3*noise],\
-                                        noise=noise)
-                      for mtmbi in mtmb_grid]
-                      
-        #-- Get the minimum chi squared, set the best_vlsr and set the best 
-        #   shifted model profile
-        imin = argmin(chisquared)
-        self.chi2_best_vlsr = chisquared[imin]
-        self.best_vlsr = vlsr_grid[imin]
-
-        #-- Note that the velocity grid of best_mtmb is the data velocity
-        self.best_mtmb = mtmb_grid[imin]
+        vlsr_grid = self.getVlsr(index)-shifts*res
         
-        return self.best_vlsr
+        #-- Only data points above -3 sigma are compared
+        selection = dtmb>=-3*noise
+        return (vlsr_grid,mtmb_grid,(dtmb[selection],selection),noise)
     
     
     def getIntIntIntSphinx(self,units='si',cont_subtract=1):
@@ -13,8 +13,8 @@ listed here.
 import os, collections, functools
 import numpy as np
 from scipy.interpolate import InterpolatedUnivariateSpline as spline1d
-from scipy.interpolate import interp1d
-from scipy.integrate import odeint, trapz, cumtrapz
+from scipy.interpolate import interp1d, splrep, splev
+from scipy.integrate import odeint, solve_ivp, trapz, cumtrapz
 from astropy import constants as cst
 from astropy import units as u
 
@@ -108,6 +108,54 @@ def dTdr(T,r,v,gamma,rates=None,warn=1):
 
 
 
+def dTdrFast(T,r,adiabatic,gamma,rates=None,ext=0):
+
+    '''
+    The differential equation for the kinetic temperature profile, with the 
+    radial profiles given as spline coefficients. 
+    
+    Equivalent to dTdr, but the velocity, its derivative and the heating and 
+    cooling rates are combined and precomputed on the radial grid, such that 
+    an evaluation only requires the spline evaluation of two radial profiles.
+    No extrapolation checks are done.
+    
+    This function is used by EnergyBalance to iterate and solve the ODE.
+    
+    @param T: The temperature at which to evaluate the differential equation
+    @type T: float
+    @param r: The radial point(s) (cm)
+    @type r: array/float
+    @param adiabatic: The spline coefficients (t,c,k) of the radial part of the
+                      adiabatic term: 1/r + 0.5/v dv/dr
+    @type adiabatic: tuple
+    @param gamma: The adiabatic coefficient profile as function of T
+    @type gamma: Profiler()
+    
+    @keyword rates: The spline coefficients (t,c,k) of the heating and cooling 
+                    rates, summed up (erg/s/cm3, H-C), including the density 
+                    factor and divided by the velocity. Default if only 
+                    adiabatic cooling is taken into account.
+              
+                    (default: None)
+    @type rates: tuple
+    @keyword ext: The extrapolation mode of the rates spline (see splev)
+    
+                  (default: 0)
+    @type ext: int
+    
+    @return: The derivative with respect to radius (K/cm)
+    @rtype: array/float
+    
+    '''
+    
+    tg = gamma.eval(T,warn=0)
+    Tprime = (2-2*tg) * splev(r,adiabatic) * T
+    if not rates is None: 
+        Tprime = Tprime + (tg-1) * splev(r,rates,ext=ext)
+    return Tprime
+
+
+
 class EnergyBalance(object):
     
     '''
@@ -159,6 +207,10 @@ class EnergyBalance(object):
     the formalism of Gail & Sedlmayr 2014 as opposed to the classical 
     implementations of Decin et al. 2006 and Schoïer et al. 2001. 
     
+    >>> eb = EB.EnergyBalance(ode_solver='LSODA')
+    solves the temperature ODE with the LSODA method of scipy's solve_ivp 
+    rather than with odeint. 
+    
     Furthermore, the iterative procedure can be adapted to user-specific 
     needs:
     >>> eb.iterT(conv=0.005,imax=200,step_size=0.05)
@@ -726,7 +778,7 @@ class EnergyBalance(object):
         #-- Pops were read when the abundances were set. Read the collision 
         #   rates
         imol = self.molecules.index(m)
-        self.collis[m] = self.colread(self.pars['collis'][imol])
+        self.collis[m] = self.colread.getShared(self.pars['collis'][imol])
     
         #-- ipop remembers the iteration number for which the level 
         #   populations were set, so they can be updated later.
@@ -783,7 +835,7 @@ class EnergyBalance(object):
             imol = self.molecules.index(m)
             fn = self.pars['collis'][imol].replace('collis','radiat')
             ny = max(self.collis[m]['coll_trans']['lup'])
-            self.mol[m] = RadiatReader.RadiatReader(fn,ny=ny)
+            self.mol[m] = RadiatReader.RadiatReader.getShared(fn,ny=ny)
         
         #-- Get T profile and other information
         T = self.T.eval()
@@ -1032,6 +1084,9 @@ class EnergyBalance(object):
         self.H = {}
         self.C = {}
         self.rates = {}
+        
+        #-- The number of evaluations of the temperature ODE per iteration
+        self.nfev = {}
     
     
     
@@ -1320,7 +1375,12 @@ class EnergyBalance(object):
         This is typically the condensation temperature.
         
         Additionals arguments are passed on to the spline1d interpolation of the
-        total cooling and heating terms, e.g. k=3, ext=0 are defaults.
+        total cooling and heating terms, e.g. k=3, ext=0 are defaults. If the 
+        fast_rhs input parameter is on, only k and ext are used.
+        
+        The ODE is solved with the solver set by the ode_solver input 
+        parameter: odeint, or any method of solve_ivp. The number of 
+        evaluations of the ODE is remembered in self.nfev.
         
         @keyword dTmax: The maximum allowed relative temperature change for this
                         T calculation. Set to 100% by default.
@@ -1334,7 +1394,9 @@ class EnergyBalance(object):
         @keyword ode_kwargs: Extra arguments for the ODE solver. They are added
                              to the dict ode_args made by the function, and 
                              hence overwrites any defaults. In principle, the 
-                             defaults are fine, but can be overwritten if needed
+                             defaults are fine, but can be overwritten if 
+                             needed. Given to odeint or solve_ivp, depending on
+                             the ode_solver input parameter.
         
                              (default: {})
         @type ode_kwargs: dict
@@ -1381,17 +1443,56 @@ class EnergyBalance(object):
         self.rates[self.i] = yrates/dens_term
         
         #-- Note that if no rates are requested, this will give an empty array
-        if self.r.size == Data.arrayify(yrates).size:
-            rp = Profiler.Profiler(self.r,spline1d(self.r,self.rates[self.i],\
-                                                   *args,**kwargs))
+        has_rates = self.r.size == Data.arrayify(yrates).size
+        
+        #-- Set the derivative of T, either with precomputed spline 
+        #   coefficients for the radial profiles or with the profile objects
+        if self.pars['fast_rhs']:
+            vi = self.v.eval()
+            adiabatic = splrep(self.r,1./self.r+0.5*1./vi*self.v.diff(),k=3)
+            if has_rates:
+                rp = splrep(self.r,self.rates[self.i]/vi,k=kwargs.get('k',3))
+            else:
+                rp = None
+            func = dTdrFast
+            fargs = (adiabatic,self.gamma,rp,kwargs.get('ext',0))
         else:
-            rp = None 
+            if has_rates:
+                rp = Profiler.Profiler(self.r,\
+                                       spline1d(self.r,self.rates[self.i],\
+                                                *args,**kwargs))
+            else:
+                rp = None 
+            func = dTdr
+            fargs = (self.v,self.gamma,rp,warn)
+        
+        #-- Count the evaluations of the derivative
+        self.nfev[self.i] = 0
+        def rhs(T,r,*fargs):
+            self.nfev[self.i] += 1
+            return func(T,r,*fargs)
         
         #-- Calculate the next iteration of the temperature profile
-        ode_args = {'func': dTdr, 'y0': self.T0, 't': self.r,
-                    'args': (self.v,self.gamma,rp,warn)}
-        ode_args.update(ode_kwargs)
-        Tr = odeint(**ode_args)[:,0]
+        solver = self.pars['ode_solver']
+        if solver.lower() == 'odeint':
+            ode_args = {'func': rhs, 'y0': self.T0, 't': self.r, 'args': fargs}
+            ode_args.update(ode_kwargs)
+            Tr = odeint(**ode_args)[:,0]
+        else:
+            ode_args = {'fun': lambda r,T: rhs(T,r,*fargs), 'y0': [self.T0],
+                        't_span': (self.r[0],self.r[-1]), 't_eval': self.r,
+                        'method': solver}
+            ode_args.update(ode_kwargs)
+            sol = solve_ivp(**ode_args)
+            
+            #-- If the solver failed, the missing part of the profile is set 
+            #   to nan, which stops the iteration.
+            Tr = np.empty_like(self.r)
+            Tr.fill(np.nan)
+            Tr[:sol.y.shape[1]] = sol.y[0]
+            if not sol.success: 
+                print('ODE solver {} failed: {}'.format(solver,sol.message))
+        print('Evaluated dT/dr {} times.'.format(self.nfev[self.i]))
         
         #-- Check the temperature change. Limit it to the requested maximum 
         #   allowed change. Only do this from the second iteration, to allow 
@@ -1886,91 +1987,6 @@ class EnergyBalance(object):
         
         '''
         
-        def calcLevelLC(llow,r,T):
-        
-            '''
-            Calculate the line cooling contribution for a single transition 
-            index, with a fixed lower level i and for which j > i, for the 
-            entire radial grid.
-            
-            Keep in mind, the goal is to include all transitions from every 
-            level to every level. It doesn't actually matter if the energy is 
-            lower or higher: The Sahai + Einstein equations change the sign if 
-            the lower level is really the upper level in terms of energy. 
-            
-            We can use the structure of the collision rate files, where all 
-            possible collisional transitions are included. By returning all 
-            transitions to a given lower level, we already have j > i. 
-            
-            A note must be made here. Normally one would want to work with 
-            all levels that have higher energy than Elow. However, for CO 
-            this leads to issues because some v=1 levels have lower energy
-            than some v=0 levels, while they are still sorted going v=0 to 
-            jmax, then v=1 to jmax, ie not sorted by energy. The collision
-            rates however assume that they are sorted by energy. Meaning 
-            that for some collisional transitions Eup-Elow becomes < 0 
-            because of how the CO spectroscopy is sorted. This is not 
-            necessarily a problem, hence why we assume Eup-Elow must be > 0
-            in what follows, and force it to be through abs(Eup-Elow). 
-            We assume the collision rate files are sorted properly, thus 
-            retrieve all "higher energy levels" by simply passing the llow
-            index to the getTI method. This leads to results that are 
-            identical with GASTRoNOoM CO cooling rates.
-            
-            
-            @param llow: index of the transition lower level.
-            @type llow: int
-            @param r: The radial grid in cm
-            @type r: array
-            @param T: The temperature in K for which to calculate the cooling
-            @type T: array
-            
-            @return: The contribution to the line cooling for a given lower 
-                     level i (in ergs * cm^3 / s). 
-            @rtype: float
-            
-            '''
-            
-            #-- Energy, weight and population of the lower level
-            Elow = self.mol[m].getLEnergy(index=llow,unit='erg')
-            glow = self.mol[m].getLWeight(index=llow)
-            poplow = self.pop[m].getInterp(llow)(r)
-            
-            #-- Get the transition indices that go to the level with index llow
-            #   Enforce indices to be an array.
-            indices = self.collis[m].getTI(itype='coll_trans',llow=(llow,))
-            
-            #-- In case no upper levels were found, llow is the highest level
-            #   available, and there are no collisions to be taken into account
-            #   return 0
-            if not indices.size: 
-                return 0.
-            
-            #-- Retrieve the level indices, energies, weights and populations of
-            #   upper levels
-            lups = self.collis[m].getTUpper(index=indices,itype='coll_trans') 
-            Eups = self.mol[m].getLEnergy(lups,unit='erg')
-            popups = np.array([self.pop[m].getInterp(lup)(r) for lup in lups])
-            gups = self.mol[m].getLWeight(index=lups)
-            
-            #-- Force gups/Eups into a column vector for array multiplication
-            gups.shape = (gups.size,1)
-            Eups.shape = (Eups.size,1)
-            
-            #-- Retrieve the rates between llow and all lups
-            #   Also get the respective weights and energies
-            Culs = np.array([self.collis[m].getInterp(i)(T) for i in indices])
-            
-            #-- Calculate the reversed rate for lower to upper level.
-            #   Based on the Einstein relation: Cul/Clu = gl/gu exp(Eul/kT)
-            expfac = np.exp(np.outer(-1*abs(Elow-Eups),1./(k_b*T)))
-            Clus = Culs*np.multiply(expfac,gups/glow) 
-            
-            #-- Calculate the sum of the cooling contribution across all j>i 
-            #   transitions
-            return np.sum((Clus*poplow-Culs*popups)*abs(Eups-Elow),axis=0)    
-        
-        
         #-- if cooling rate has already been calculated: don't do anything
         if self.C['lc_{}'.format(m)].has_key(self.i): 
             return 
@@ -1998,17 +2014,97 @@ class EnergyBalance(object):
         amol = self.abun[m].eval(warn=0)
 
         #-- Calculate the line cooling term for this molecule.
-        llows = self.pop[m].getLI()
-        LCterm = np.empty(shape=(len(self.r),len(llows)))
-        for i in llows: 
-            LCterm[:,i-1] = calcLevelLC(i,self.r,self.T.eval())
-        LCtotal = nh2*nh2*amol*np.sum(LCterm,axis=1)
+        LCtotal = nh2*nh2*amol*self.calcLineCooling(m,self.r,self.T.eval())
         
         #-- Do NOT Multiply by -1. This already gives the net energy lost
         self.C['lc_{}'.format(m)][self.i] = LCtotal
 
 
 
+    def calcLineCooling(self,m,r,T,chunk=1000):
+    
+        '''
+        Calculate the line cooling summed over all collisional transitions of a
+        molecule, for the entire radial grid. Follows Sahai 1990.
+        
+        Every collisional transition from a lower level i to an upper level j
+        is included, as long as the lower level is included in the level 
+        populations. All level populations and collision rates are evaluated 
+        in one go, and the sum is done as array algebra, in blocks of 
+        transitions to limit the memory use.
+        
+        Keep in mind, the goal is to include all transitions from every level 
+        to every level. It doesn't actually matter if the energy is lower or 
+        higher: The Sahai + Einstein equations change the sign if the lower 
+        level is really the upper level in terms of energy. 
+        
+        A note must be made here. Normally one would want to work with all 
+        levels that have higher energy than Elow. However, for CO this leads to
+        issues because some v=1 levels have lower energy than some v=0 levels, 
+        while they are still sorted going v=0 to jmax, then v=1 to jmax, ie not
+        sorted by energy. The collision rates however assume that they are 
+        sorted by energy. Meaning that for some collisional transitions 
+        Eup-Elow becomes < 0 because of how the CO spectroscopy is sorted. This 
+        is not necessarily a problem, hence why we assume Eup-Elow must be > 0 
+        in what follows, and force it to be through abs(Eup-Elow). We assume 
+        the collision rate files are sorted properly, thus take the upper and
+        lower level as given for every collisional transition. This leads to 
+        results that are identical with GASTRoNOoM CO cooling rates.
+        
+        @param m: The molecule name from the input molecules list.
+        @type m: str
+        @param r: The radial grid in cm
+        @type r: array
+        @param T: The temperature in K for which to calculate the cooling
+        @type T: array
+        
+        @keyword chunk: The number of collisional transitions handled at once
+        
+                        (default: 1000)
+        @type chunk: int
+        
+        @return: The line cooling on the radial grid (in ergs * cm^3 / s). 
+        @rtype: array
+        
+        '''
+        
+        #-- Select the collisional transitions of which the lower level is 
+        #   included in the level populations
+        indices = self.collis[m].getTI(itype='coll_trans')
+        llows = self.collis[m].getTLower(itype='coll_trans')
+        lups = self.collis[m].getTUpper(itype='coll_trans')
+        keep = np.in1d(llows,self.pop[m].getLI())
+        indices, llows, lups = indices[keep], llows[keep], lups[keep]
+        
+        #-- Evaluate the populations of all levels at once
+        pops = self.pop[m].evalInterp(r)
+        
+        LC = np.zeros(len(r))
+        for i in range(0,len(indices),chunk):
+            ii, ll, lu = indices[i:i+chunk], llows[i:i+chunk], lups[i:i+chunk]
+            
+            #-- Retrieve the energy differences and weight ratios. Force them 
+            #   into a column vector for array multiplication
+            dE = abs(self.mol[m].getLEnergy(lu,unit='erg') \
+                     - self.mol[m].getLEnergy(ll,unit='erg'))
+            gfac = self.mol[m].getLWeight(index=lu) \
+                    / self.mol[m].getLWeight(index=ll)
+            dE.shape = (dE.size,1)
+            gfac.shape = (gfac.size,1)
+            
+            #-- Retrieve the rates from upper to lower level, and calculate the
+            #   reversed rate for lower to upper level. 
+            #   Based on the Einstein relation: Cul/Clu = gl/gu exp(Eul/kT)
+            Culs = self.collis[m].evalInterp(T,index=ii)
+            Clus = Culs*np.exp(np.outer(-1*dE,1./(k_b*T)))*gfac
+            
+            #-- Sum the cooling contribution across all transitions
+            LC += np.sum((Clus*pops[ll-1]-Culs*pops[lu-1])*dE,axis=0)
+        
+        return LC
+
+
+
     def plotRateIterations(self,iterations=[],dTsign='C',mechanism='ad',\
                            scale=1,fn=None,cfg=None,**kwargs):
 
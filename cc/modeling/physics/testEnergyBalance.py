@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Regression test of the line cooling in EnergyBalance.
+
+The array version of the line cooling (EnergyBalance.calcLineCooling) is
+compared with the original sum over lower levels (calcLevelLC), on a small
+synthetic molecule. The level populations and collision rates are held by
+real PopReader and CollisReader objects, interpolated the way EnergyBalance
+does, so the combined spline evaluation (PopReader.evalInterp,
+CollisReader.evalInterp) is compared with the level-by-level interpolators.
+Run with
+
+    python -m unittest cc.modeling.physics.testEnergyBalance
+
+Author: R. Lombaert
+
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from cc.modeling.physics import EnergyBalance as eb
+from cc.tools.readers.PopReader import PopReader
+from cc.tools.readers.CollisReader import CollisReader
+
+#-- Relative tolerance of the comparison. Both versions evaluate the same
+#   splines, only the evaluation routine and the order of the summation
+#   differ.
+RTOL = 1e-10
+
+
+
+class FakeMol(object):
+
+    """
+    Energies and weights of the levels of a synthetic molecule.
+
+    """
+
+    def __init__(self,energies,weights):
+        self.energies = np.array(energies,dtype=float)
+        self.weights = np.array(weights,dtype=float)
+
+    def getLEnergy(self,index,unit='erg'):
+        return self.energies[np.array(index)-1]
+
+    def getLWeight(self,index):
+        return self.weights[np.array(index)-1]
+
+
+
+def writeCollis(fn,lups,llows,temps,rates,npad=2):
+
+    '''
+    Write collision rates in the GASTRoNOoM collis format read by CollisReader.
+
+    '''
+
+    pad = [0.]*npad
+    col = list(lups) + pad + list(llows) + pad
+    for i,T in enumerate(temps):
+        col += [T] + list(rates[:,i]) + pad
+    np.savetxt(fn,np.array(col,dtype=float))
+
+
+
+def calcLevelLC(self,m,llow,r,T):
+
+    '''
+    The original line cooling of one lower level, as in EnergyBalance.Clc
+    before the array version.
+
+    '''
+
+    Elow = self.mol[m].getLEnergy(index=llow,unit='erg')
+    glow = self.mol[m].getLWeight(index=llow)
+    poplow = self.pop[m].getInterp(llow)(r)
+    indices = self.collis[m].getTI(itype='coll_trans',llow=(llow,))
+    if not indices.size:
+        return 0.
+    lups = self.collis[m].getTUpper(index=indices,itype='coll_trans')
+    Eups = self.mol[m].getLEnergy(lups,unit='erg')
+    popups = np.array([self.pop[m].getInterp(lup)(r) for lup in lups])
+    gups = self.mol[m].getLWeight(index=lups)
+    gups.shape = (gups.size,1)
+    Eups.shape = (Eups.size,1)
+    Culs = np.array([self.collis[m].getInterp(i)(T) for i in indices])
+    expfac = np.exp(np.outer(-1*abs(Elow-Eups),1./(eb.k_b*T)))
+    Clus = Culs*np.multiply(expfac,gups/glow)
+    return np.sum((Clus*poplow-Culs*popups)*abs(Eups-Elow),axis=0)
+
+
+
+class LineCoolingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """ A molecule with 12 levels, not all sorted by energy """
+        m = '12C16O'
+        rs = np.random.RandomState(1)
+        nlev = 12
+        energies = np.sort(rs.uniform(0,3e-13,nlev))
+        energies[[8,9]] = energies[[9,8]]
+        weights = 2*np.arange(nlev)+1.
+
+        #-- The radial grid extends beyond the impact parameters, and the
+        #   temperature beyond the collision rate grid, so the boundary
+        #   value (pops) and the extrapolation (rates) are both used.
+        self.r = np.logspace(13.7,17.5,60)
+        self.T = 2500.*(self.r/self.r[0])**-0.7
+
+        pop = PopReader(None)
+        pop.setP(np.logspace(14,17,30))
+        pop.setNY(nlev)
+        for i in range(1,nlev+1):
+            pop.setPop(i,rs.uniform(0.01,1,len(pop.getP())))
+        pop.setInterp(itype='spline',k=3,ext=3)
+
+        pairs = [(i,j) for i in range(1,nlev+1) for j in range(i+1,nlev+1)]
+        temps = np.logspace(1,3,8)
+        rates = rs.uniform(0.1,10,(len(pairs),1))*1e-11*np.sqrt(temps/100.)
+        fd, self.fn = tempfile.mkstemp(suffix='.dat')
+        os.close(fd)
+        writeCollis(self.fn,[p[1] for p in pairs],[p[0] for p in pairs],\
+                    temps,rates)
+        collis = CollisReader(self.fn)
+        collis.setInterp(itype='spline',k=1,ext=0)
+
+        self.eb = eb.EnergyBalance.__new__(eb.EnergyBalance)
+        self.eb.mol = {m: FakeMol(energies,weights)}
+        self.eb.pop = {m: pop}
+        self.eb.collis = {m: collis}
+
+    def tearDown(self):
+        os.remove(self.fn)
+
+    def testStacks(self):
+        """ The combined splines equal the level-by-level interpolators """
+        pop, collis = self.eb.pop['12C16O'], self.eb.collis['12C16O']
+        self.assertTrue(pop['ipop_stack'] is not None)
+        self.assertTrue(collis['icoll_stack'] is not None)
+        for i,p in zip(pop.getLI(),pop.evalInterp(self.r)):
+            self.assertTrue(np.allclose(p,pop.getInterp(i)(self.r),\
+                                        rtol=RTOL,atol=0))
+        index = collis.getTI()[::-3]
+        for i,c in zip(index,collis.evalInterp(self.T,index=index)):
+            self.assertTrue(np.allclose(c,collis.getInterp(i)(self.T),\
+                                        rtol=RTOL,atol=0))
+        ntrans = len(collis.getTI())
+        self.assertRaises(KeyError,collis.evalInterp,self.T,[1,ntrans+1])
+
+    def testLineCooling(self):
+        """ EnergyBalance.calcLineCooling() equals the sum of calcLevelLC """
+        m = '12C16O'
+        old = np.zeros(len(self.r))
+        for llow in self.eb.pop[m].getLI():
+            old += calcLevelLC(self.eb,m,llow,self.r,self.T)
+        for chunk in [1000,7]:
+            new = self.eb.calcLineCooling(m,self.r,self.T,chunk=chunk)
+            self.assertTrue(np.allclose(new,old,rtol=RTOL,atol=0))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
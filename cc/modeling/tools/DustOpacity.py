@@ -158,9 +158,9 @@ class CustomOpacity():
         """
         
         self.species = species
-        self.index = DataIO.getInputData(keyword='SPECIES_SHORT',\
-                                         filename='Dust.dat')\
-                                        .index(self.species)
+        self.index = DataIO.getInputIndex(self.species,\
+                                          keyword='SPECIES_SHORT',\
+                                          filename='Dust.dat')
         self.filename =  DataIO.getInputData(keyword='PART_FILE',\
                                              filename='Dust.dat',\
                                              rindex=self.index)
@@ -205,8 +205,8 @@ class CustomOpacity():
             #- parameters and the short name can be kept, 
             #- nothing is changed in the Dust.dat file
             try:    
-                DataIO.getInputData(keyword='PART_FILE',filename='Dust.dat')\
-                                   .index(output_filename)
+                DataIO.getInputIndex(output_filename,keyword='PART_FILE',\
+                                     filename='Dust.dat')
             #- filename is not present: do the normal procedure, ie check if 
             #- short name is already present
             except ValueError:        
@@ -19,10 +19,9 @@ from cc.plotting.objects.PlottingSession import PlottingSession
 from cc.tools.io import DataIO
 from cc.modeling.objects import Transition
 from cc.plotting import Plotting2
-from cc.tools.readers import LineList
+from cc.tools.readers import LineList, ChemistryReader
 from cc.data.instruments import Pacs
 from cc.modeling.objects import Star
-#from cc.modeling.tools import CodeIO
 
 
 class PlotChem(PlottingSession):
@@ -144,10 +143,10 @@ class PlotChem(PlottingSession):
             folders = [os.path.join(cc.path.cout,'models',\
                     star['LAST_CHEMISTRY_MODEL'])+'/' for star in valid_sg]
             
-            radii = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'RADIUS') \
-                for folder in folders]
-            temps = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'VELOCITY') \
-                for folder in folders]
+            readers = [ChemistryReader.ChemistryReader(folder)
+                       for folder in folders]
+            radii = [cr.getPhysPar('RADIUS') for cr in readers]
+            temps = [cr.getPhysPar('VELOCITY') for cr in readers]
 
             if temps:    
                 keytags = [star['LAST_CHEMISTRY_MODEL'].replace('_','\_')
@@ -222,10 +221,10 @@ class PlotChem(PlottingSession):
             folders = [os.path.join(cc.path.cout,'models',\
                     star['LAST_CHEMISTRY_MODEL'])+'/' for star in valid_sg]
             
-            radii = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'RADIUS') \
-                for folder in folders]
-            temps = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'TEMP') \
-                for folder in folders]
+            readers = [ChemistryReader.ChemistryReader(folder)
+                       for folder in folders]
+            radii = [cr.getPhysPar('RADIUS') for cr in readers]
+            temps = [cr.getPhysPar('TEMP') for cr in readers]
 
             if temps:    
                 keytags = [star['LAST_CHEMISTRY_MODEL'].replace('_','\_')
@@ -305,10 +304,10 @@ class PlotChem(PlottingSession):
             folders = [os.path.join(cc.path.cout,'models',\
                     star['LAST_CHEMISTRY_MODEL'])+'/' for star in valid_sg]
             
-            radii = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'RADIUS') \
-                for folder in folders]
-            avs = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'A_V') \
-                for folder in folders]
+            readers = [ChemistryReader.ChemistryReader(folder)
+                       for folder in folders]
+            radii = [cr.getPhysPar('RADIUS') for cr in readers]
+            avs = [cr.getPhysPar('A_V') for cr in readers]
 
             if avs:    
                 keytags = [star['LAST_CHEMISTRY_MODEL'].replace('_','\_')
@@ -387,10 +386,10 @@ class PlotChem(PlottingSession):
             folders = [os.path.join(cc.path.cout,'models',\
                     star['LAST_CHEMISTRY_MODEL'])+'/' for star in valid_sg]
             
-            radii = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'RADIUS') \
-                for folder in folders]
-            cos = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'COK(PHOT)') \
-                for folder in folders]
+            readers = [ChemistryReader.ChemistryReader(folder)
+                       for folder in folders]
+            radii = [cr.getPhysPar('RADIUS') for cr in readers]
+            cos = [cr.getPhysPar('COK(PHOT)') for cr in readers]
 
             if cos:    
                 keytags = [star['LAST_CHEMISTRY_MODEL'].replace('_','\_')
@@ -470,10 +469,10 @@ class PlotChem(PlottingSession):
             folders = [os.path.join(cc.path.cout,'models',\
                     star['LAST_CHEMISTRY_MODEL'])+'/' for star in valid_sg]
             
-            radii = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'RADIUS') \
-                for folder in folders]
-            cos = [CodeIO.getChemistryPhysPar(folder+'csphyspar.out', 'COK(PHOT)') \
-                for folder in folders]
+            readers = [ChemistryReader.ChemistryReader(folder)
+                       for folder in folders]
+            radii = [cr.getPhysPar('RADIUS') for cr in readers]
+            cos = [cr.getPhysPar('COK(PHOT)') for cr in readers]
 
             if cos:    
                 keytags = [star['LAST_CHEMISTRY_MODEL'].replace('_','\_')
@@ -586,13 +585,10 @@ class PlotChem(PlottingSession):
             
             folder = os.path.join(cc.path.cout,'models',\
                         star['LAST_CHEMISTRY_MODEL'])+'/'
-            ddata[istar]['rad'] = CodeIO.getChemistryPhysPar(folder+\
-                'csphyspar.out', 'RADIUS')
+            cr = ChemistryReader.ChemistryReader(folder)
+            ddata[istar]['rad'] = cr.getPhysPar('RADIUS')
             ddata[istar]['id'] = star['LAST_CHEMISTRY_MODEL']
-            if frac:
-                species = CodeIO.getChemistryAbundances(folder+'csfrac.out')
-            else:
-                species = CodeIO.getChemistryAbundances(folder+'csnum.out')
+            species = cr.getAbundances(frac=frac)
             
             for molec in molecules: 
                 ddata[istar][molec] = species[molec]
@@ -59,7 +59,7 @@ class PlottingSession(object):
         
         self.inputfilename = inputfilename
         self.star_name = star_name
-        self.star_index = DataIO.getInputData(path=cc.path.usr).index(star_name)
+        self.star_index = DataIO.getInputIndex(star_name,path=cc.path.usr)
         self.star_name_plots = DataIO.getInputData(path=cc.path.usr,
                                                    keyword='STAR_NAME_PLOTS',\
                                                    remove_underscore=1,\
@@ -17,9 +17,14 @@ def calcChiSquared(data,model,noise,ndf=0,mode='diff'):
     Calculate the reduced chi-squared value of a data array minus a model array,
     taking into account the noise in the data array.
     
+    Several models can be compared with the data at once, by passing them 
+    as an array with the data points in the last dimension. One chi squared 
+    value is then returned for every model.
+    
     @param data: The data set. Must have same dimensions as model!
     @type data: array
-    @param model: The model array. Must have same dimensions as data!
+    @param model: The model array. Must have same dimensions as data, or 
+                  more dimensions with the last dimension equal to the data.
     @type model: array
     @param noise: the noise in the data array. Give one value for overall noise
                   or individual values for every entry in data/model. 
@@ -42,8 +47,8 @@ def calcChiSquared(data,model,noise,ndf=0,mode='diff'):
                    (default: 'diff')
     @type mode: str
     
-    @return: The chi squared value
-    @rtype: float
+    @return: The chi squared value, or an array of values for several models
+    @rtype: float/array
     
     """
     
@@ -52,9 +57,10 @@ def calcChiSquared(data,model,noise,ndf=0,mode='diff'):
         data = [data]
     data, model, noise = np.array(data), np.array(model), np.array(noise) 
     if mode == 'diff':
-        chi2 = ((data - model)**2./noise**2.).sum()/(len(data)-ndf-1)
+        chi2 = ((data - model)**2./noise**2.).sum(axis=-1)/(len(data)-ndf-1)
     elif mode == 'log':
-        chi2 = ((10**abs(np.log10(data/model))-1)**2./(noise/model)**2.).sum()
+        chi2 = ((10**abs(np.log10(data/model))-1)**2./(noise/model)**2.)\
+                    .sum(axis=-1)
         chi2 /= (len(data)-ndf-1)
     else:
         print 'Chi^2 mode not recognized.'
@@ -18,7 +18,7 @@ import numpy as np
 
 import cc.path
 from cc.tools.io import DataIO
-#from cc.modeling.tools import CodeIO
+from cc.tools.readers import ChemistryReader
 from cc.statistics.Statistics import Statistics
 import matplotlib.pyplot as plt
 from cc.modeling.objects import Transition
@@ -101,28 +101,9 @@ class ChemStats(object):
         '''
         
         #- Read in analyse.out
-        filename = os.path.join(cc.path.cout,'models',\
-                                star['LAST_CHEMISTRY_MODEL'],'analyse.out')
-        data = DataIO.readFile(filename)
-        data = [x.split() for x in data]
-        
-        #- Initialise output dictionary
-        analyse = dict()
-        
-        #- Determine and save routine radius
-        radius = float(data[0][-2])
-        index = np.where([len(i)==2 for i in data])[0]
-        analyse['radius'] = radius
-        
-        #- Save analyse routine output in dictionary per molecule
-        for ii in range(len(index[:-1])):
-            name = data[index[ii]][1][1:]
-            analyse[name] = dict()
-            analyse[name]['MAIN'] = data[index[ii]+1:index[ii+1]-1]
-            analyse[name]['DRATE'] = data[index[ii+1]-1][1]
-            analyse[name]['PRATE'] = data[index[ii+1]-1][3]
-        
-        return analyse
+        folder = os.path.join(cc.path.cout,'models',\
+                              star['LAST_CHEMISTRY_MODEL'])
+        return ChemistryReader.readAnalyse(os.path.join(folder,'analyse.out'))
 
     
     def getSecondaryPathways(self,analyse,molec,print_sec=1,\
@@ -138,6 +138,19 @@ class ResoStats(Statistics):
         self.no_stats = False
         self.stats = dict([('peak',self.ratiopeak),('int',self.ratioint),\
                            ('combo',self.ratiocombo)])
+        
+        #-- The same intensities, ratios and loglikelihoods as 2d arrays, 
+        #   one row per model, one column per sample transition in 
+        #   self.translist. Set by setMatrices.
+        self.minttmb_matrix = None
+        self.mpeaktmb_matrix = None
+        self.lll_matrix = None
+        self.ratioint_matrix = None
+        self.ratiopeak_matrix = None
+        #-- The data intensities and noise, one value per sample transition
+        self.dinttmb_array = None
+        self.dpeaktmb_array = None
+        self.noise_array = None
 
         #-- Default Flux calibration uncertainties from Telescope.dat
         #   I suggest to change these values based on what you want to use 
@@ -282,6 +295,10 @@ class ResoStats(Statistics):
                 self.noisy[ist] = False
             self.dinttmb[st]= st.getIntTmbData(use_fit=self.noisy[ist])[0]
             
+            #-- Determine the best vlsr of all models at once
+            if self.use_bestvlsr:
+                Transition.setBestVlsrs(self.trans_models[st])
+            
             #-- Collect the loglikelihoods for all models
             llls = array([mt.getLoglikelihood(use_bestvlsr=self.use_bestvlsr,\
                                               vmin=self.vmin,vmax=self.vmax,\
@@ -294,9 +311,144 @@ class ResoStats(Statistics):
             self.ratiopeak[st] = self.mpeaktmb[st]/self.dpeaktmb[st]
             self.ratiocombo[st] = zip(self.ratiopeak[st],self.ratioint[st])
 
+        self.setMatrices()
         self.calcLoglikelihoodThreshold()
     
     
+    
+    def setMatrices(self):
+        
+        '''
+        Collect the model intensities, ratios and loglikelihoods of all sample
+        transitions in 2d arrays, with one row per model and one column per
+        sample transition in self.translist. 
+        
+        The data intensities and noise are collected in 1d arrays, with one 
+        value per sample transition.
+        
+        The selection of best fit models is done on these arrays at once, 
+        rather than per model and per transition. Called by setIntensities 
+        and resetLineStrengths.
+        
+        '''
+        
+        ntrans = len(self.translist)
+        nmodels = ntrans and len(self.trans_models[self.translist[0]]) or 0
+        self.minttmb_matrix = np.empty((nmodels,ntrans))
+        self.mpeaktmb_matrix = np.empty((nmodels,ntrans))
+        self.lll_matrix = np.empty((nmodels,ntrans))
+        for ist,st in enumerate(self.translist):
+            self.minttmb_matrix[:,ist] = array(self.minttmb[st],dtype=float)
+            self.mpeaktmb_matrix[:,ist] = array(self.mpeaktmb[st],dtype=float)
+            self.lll_matrix[:,ist] = array(self.loglikelihood[st],dtype=float)
+        self.dinttmb_array = array([self.dinttmb[st] 
+                                    for st in self.translist],dtype=float)
+        self.dpeaktmb_array = array([self.dpeaktmb[st] 
+                                     for st in self.translist],dtype=float)
+        self.noise_array = array([st.getNoise() for st in self.translist],\
+                                 dtype=float)
+        self.ratioint_matrix = self.minttmb_matrix/self.dinttmb_array
+        self.ratiopeak_matrix = self.mpeaktmb_matrix/self.dpeaktmb_array
+        
+        
+        
+    def getValidModelIds(self):
+    
+        '''
+        Return the model ids of the models included in the statistics, i.e. 
+        the models with a successful cooling result, in the order of the rows
+        of the model x transition matrices.
+        
+        @return: The model ids
+        @rtype: list[str]
+        
+        '''
+        
+        if not self.translist: 
+            return []
+        return [star['GAS_LINES'][0].getModelId() 
+                for star in self.star_selection[self.translist[0]]]
+        
+        
+        
+    def getNoisyMask(self):
+        
+        '''
+        Return which sample transitions are flagged as noisy.
+        
+        @return: The noisy flag of every sample transition in self.translist
+        @rtype: array[bool]
+        
+        '''
+        
+        return array([bool(self.noisy[ist]) 
+                      for ist in range(len(self.translist))],dtype=bool)
+        
+        
+        
+    def getLLLThresholds(self):
+        
+        '''
+        Return the loglikelihood thresholds of the sample transitions. 
+        
+        Transitions without a threshold get -inf, such that no model falls 
+        below the threshold.
+        
+        @return: The threshold of every sample transition in self.translist
+        @rtype: array
+        
+        '''
+        
+        return array([-np.inf if self.lll_threshold[ist] is None 
+                             else self.lll_threshold[ist]
+                      for ist in range(len(self.translist))],dtype=float)
+    
+    
+    
+    def calcRatioVerdict(self,ratios,useNoisy=1,useRms=0,err=0.2,\
+                         err_noisy=0.3):
+        
+        '''
+        Check for every model and sample transition whether a model/data 
+        intensity ratio lies within the uncertainty interval around 1.
+        
+        @param ratios: The ratios, one row per model and one column per sample
+                       transition in self.translist
+        @type ratios: array
+        
+        @keyword useNoisy: assign a larger error to noisy lines
+        
+                           (default: 1)
+        @type useNoisy: bool
+        @keyword useRms: use statistical noise in addition to instrumental 
+                         error
+        
+                         (default: 0)
+        @type useRms: bool
+        @keyword err: error on data
+        
+                      (default: 0.2)
+        @type err: float
+        @keyword err_noisy: error on noisy data (only needed when useNoisy = 1)
+        
+                            (default: 0.3)
+        @type err_noisy: float
+        
+        @return: 1 if the ratio is within the interval, 0 if not, with the 
+                 same shape as ratios
+        @rtype: array[int]
+        
+        '''
+        
+        tolerance = ones(ratios.shape[1])*err
+        if useNoisy:
+            tolerance[self.getNoisyMask()] = err_noisy
+        if useRms:
+            tolerance = tolerance + self.noise_array
+        verdict = (ratios <= 1.+tolerance) & (ratios >= 1.-tolerance)
+        return verdict.astype(int)
+    
+    
     def calcLoglikelihoodThreshold(self,bfms=[],ist=None):
         
         '''
@@ -444,6 +596,8 @@ class ResoStats(Statistics):
                                               use_fit=self.noisy[ist])\
                           for mt in self.trans_models[st]])
             self.loglikelihood[st] = llls
+        
+        self.setMatrices()
 
 
 
@@ -678,37 +832,34 @@ class ResoStats(Statistics):
         if output:
             print 'Selecting best fit models in <%s> mode.'%mode
 
-        self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId() \
-            for ii in range(len(self.star_grid))]
+        #-- The rows of the matrices are the models with a cooling result
+        self.modellist = self.getValidModelIds()
         stars = array(self.modellist)
 
-        bfbools = ones(len(stars),dtype='bool')
-        for ist,st in enumerate(self.translist):
-            if ist in self.includedtrans:
-                dpeak = self.dpeaktmb[st]
-                noise = st.getNoise()
-                err = self.trans_uncertainties[ist]
-                lll_thresh = self.lll_threshold[ist]
-                for i,(rat,lll,mt) in enumerate(zip(self.stats[mode][st],\
-                                                    self.loglikelihood[st],\
-                                                    self.trans_models[st])):
-                    if self.noisy[ist]:
-                        this_bool = mt.getPeakTmbSphinx()*(1.-err) <= 3.*noise
-                        if not this_bool: 
-                            bfbools[i] = False
-                    elif mode == 'combo':
-                        this_bool = (rat[0] < 1.+err and rat[0] > 1.-err) and\
-                                    (rat[1] < 1.+err and rat[1] > 1.-err)
-                        if not this_bool: bfbools[i] = False
-                    else:
-                        this_bool = rat < 1.+err and rat > 1.-err
-                        if not this_bool: 
-                            bfbools[i] = False
-                            
-                    ##-- Loglikelihood is maximized by best fitting model
-                    if not lll_thresh is None and not self.noisy[ist] \
-                            and use_lll and lll < lll_thresh:
-                        bfbools[i] = False
+        #-- Work on the columns of the included transitions only. One row per
+        #   model.
+        incl = self.includedtrans
+        noisy = self.getNoisyMask()[incl]
+        errs = array([self.trans_uncertainties[ist] for ist in incl],\
+                     dtype=float)
+        ratios = dict([('int',[self.ratioint_matrix]),\
+                       ('peak',[self.ratiopeak_matrix]),\
+                       ('combo',[self.ratiopeak_matrix,self.ratioint_matrix])])
+        fits = ones((len(self.minttmb_matrix),len(incl)),dtype='bool')
+        for rat in ratios[mode]:
+            rat = rat[:,incl]
+            fits &= (rat < 1.+errs) & (rat > 1.-errs)
+        
+        #-- For noisy lines, the model peak is compared with the noise level
+        noisy_fits = self.mpeaktmb_matrix[:,incl]*(1.-errs) \
+                        <= 3.*self.noise_array[incl]
+        fits = np.where(noisy,noisy_fits,fits)
+        
+        ##-- Loglikelihood is maximized by best fitting model
+        if use_lll:
+            low_lll = self.lll_matrix[:,incl] < self.getLLLThresholds()[incl]
+            fits &= ~(low_lll & ~noisy)
+        bfbools = fits.all(axis=1)
                         
         self.bfm = stars[bfbools]
         self.bfm = list(self.bfm)
@@ -733,21 +884,13 @@ class ResoStats(Statistics):
             print 'Selecting best fit models, \
                    only based on loglikelihood statistic.'    
         
-        self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId() \
-            for ii in range(len(self.star_grid))]
+        #-- The rows of the matrices are the models with a cooling result
+        self.modellist = self.getValidModelIds()
         stars = array(self.modellist)
-        bfbools = ones(len(stars),dtype='bool')
-        for ist,st in enumerate(self.translist):
-            if ist in self.includedtrans:
-                lll_thresh = self.lll_threshold[ist]
-                for i,lll in enumerate(self.loglikelihood[st]):
-                    ##-- Loglikelihood is maximized by best fitting model
-                    #if not lll_thresh is None and not self.noisy[ist] \
-                            #and lll < lll_thresh:
-                        #bfbools[i] = False
-                    if not lll_thresh is None  \
-                            and lll < lll_thresh:
-                        bfbools[i] = False                
+        ##-- Loglikelihood is maximized by best fitting model
+        incl = self.includedtrans
+        low_lll = self.lll_matrix[:,incl] < self.getLLLThresholds()[incl]
+        bfbools = ~low_lll.any(axis=1)
         self.bfmlll = stars[bfbools]      
         self.bfmlll = list(self.bfmlll)
         
@@ -802,8 +945,9 @@ class ResoStats(Statistics):
             includedTrans = self.includedtrans
         
         for itr in includedTrans:
-            for i in range(len(self.star_grid)):
-                if self.confidenceLLL_verdict[self.translist[itr]][i] == 1:
+            verdict = self.confidenceLLL_verdict[self.translist[itr]]
+            for i in range(len(verdict)):
+                if verdict[i] == 1:
                     total.append(i)
         
         counted = [total.count(k) for k in set(total)]
@@ -943,8 +1087,8 @@ class ResoStats(Statistics):
             plot_id = 'plot_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
                 %(gmtime()[0],gmtime()[1],gmtime()[2],\
                     gmtime()[3],gmtime()[4],gmtime()[5])
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId()\
-                .replace('_','-') for ii in range(len(self.star_grid))]
+            self.modellist = [m.replace('_','-') \
+                for m in self.getValidModelIds()]
             
             plt.clf()
             fig = plt.figure(2, figsize = (15, 10))
@@ -991,31 +1135,19 @@ class ResoStats(Statistics):
         
         '''
         
-        self.line_lll = dict()
-        self.model_lll = []
-        for ist,st in enumerate(self.translist):
-            if ist in self.includedtrans:
-                self.line_lll[st] = []
-                lll_thresh = self.lll_threshold[ist]
-                for i,lll  in enumerate(self.loglikelihood[st]):
-                    if lll >= lll_thresh:
-                        self.line_lll[st].append(1)
-                    else:
-                        self.line_lll[st].append(0)
-
-        for ii in range(len(self.star_grid)):
-            self.model_lll.append([self.line_lll[tr][ii] \
-                for i,tr in enumerate(self.translist) \
-                if i in self.includedtrans])
-        self.verdict_model_lll = sum(self.model_lll, axis = 1)        
+        incl = self.includedtrans
+        verdict = self.lll_matrix[:,incl] >= self.getLLLThresholds()[incl]
+        self.model_lll = verdict.astype(int)
+        self.line_lll = dict([(self.translist[ist],self.model_lll[:,i])
+                              for i,ist in enumerate(incl)])
+        self.verdict_model_lll = self.model_lll.sum(axis=1)
         
         if plot:
             plot_id = 'plot_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
                 %(gmtime()[0],gmtime()[1],gmtime()[2],\
                     gmtime()[3],gmtime()[4],gmtime()[5])
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0]\
-                .getModelId().replace('_','-') \
-                for ii in range(len(self.star_grid))]
+            self.modellist = [m.replace('_','-') \
+                for m in self.getValidModelIds()]
             
             plt.clf()
             fig = plt.figure(1, figsize = (15, 10))
@@ -1065,35 +1197,22 @@ class ResoStats(Statistics):
         
         '''
         
-        self.line_lll_range = dict()
-        self.model_lll_range = []
-            
-        for ist,st in enumerate(self.translist):
-            if ist in self.includedtrans:
-                self.line_lll_range[st] = []
-                maxlll = max(self.loglikelihood[st])
-                lll_thresh = self.lll_threshold[ist]
-                for i,lll  in enumerate(self.loglikelihood[st]):                   
-                    if maxlll >= self.loglikelihood[st][kk] \
-                    and self.loglikelihood[st][kk] >= self.lll_threshold[ist]:
-                        self.line_lll_range[st].append(1)
-                    else:
-                        self.line_lll_range[st].append(0)
-            
-        for ii in range(len(self.star_grid)):
-            self.model_lll_range.append([self.line_lll_range[tr][ii] \
-                for i,tr in enumerate(self.translist) \
-                if i in self.includedtrans])
-        
-        self.verdict_model_lll_range = sum(self.model_lll_range, axis = 1)
+        incl = self.includedtrans
+        translist = [self.translist[i] for i in incl]
+        llls = self.lll_matrix[:,incl]
+        verdict = (llls <= llls.max(axis=0)) \
+                    & (llls >= self.getLLLThresholds()[incl])
+        self.model_lll_range = verdict.astype(int)
+        self.line_lll_range = dict([(st,self.model_lll_range[:,i])
+                                    for i,st in enumerate(translist)])
+        self.verdict_model_lll_range = self.model_lll_range.sum(axis=1)
         
         if plot:
             plot_id = 'plot_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
                 %(gmtime()[0],gmtime()[1],gmtime()[2],\
                     gmtime()[3],gmtime()[4],gmtime()[5])
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0]\
-                .getModelId().replace('_','-') \
-                for ii in range(len(self.star_grid))]
+            self.modellist = [m.replace('_','-') \
+                for m in self.getValidModelIds()]
             
             plt.clf()
             fig = plt.figure(1, figsize = (15, 10))
@@ -1162,54 +1281,22 @@ class ResoStats(Statistics):
         if useNoisy:
             print 'Error on noisy data = '+str(err_noisy)
         
-        self.line_ratioint = dict()        
-        translist = [self.translist[i] for i in self.includedtrans]
-        
-        for ist, st in enumerate(translist):
-            if useNoisy == 1 and useRms == 1:
-                if self.noisy[ist] ==  True:
-                    self.line_ratioint[st] = [1 \
-                        if x <= (1. + err_noisy + st.getNoise()) \
-                        and x >= (1. - err_noisy - st.getNoise()) \
-                        else 0 for x in self.ratioint[st]]
-                else:
-                    self.line_ratioint[st] = [1 \
-                        if x <= (1. + err + st.getNoise()) \
-                        and x >= (1. - err - st.getNoise()) \
-                        else 0 for x in self.ratioint[st]]        
-            elif useNoisy == 1 and useRms == 0:
-                if self.noisy[ist] ==  True:
-                    self.line_ratioint[st] = [1 \
-                        if x <= (1. + err_noisy) and x >= (1. - err_noisy) \
-                        else 0 for x in self.ratioint[st]]
-                else:
-                    self.line_ratioint[st] = [1 \
-                        if x <= 1. + err and x >= 1. - err \
-                        else 0 for x in self.ratioint[st]]        
-            elif useNoisy == 0 and useRms == 1:    
-                self.line_ratioint[st] = [1 \
-                    if x <= (1. + err + st.getNoise()) \
-                    and x >= (1. - err - st.getNoise()) \
-                    else 0 for x in self.ratioint[st]]            
-            else:
-                self.line_ratioint[st] = [1 if x <= 1. + err \
-                    and x >= 1. - err else 0 for x in self.ratioint[st]]
-        
-        
-        self.model_ratioint = []        
-        for ii in range(len(self.star_grid)):
-            self.model_ratioint.append([self.line_ratioint[tr][ii] \
-                for tr in translist])
-        self.verdict_model_ratioint = \
-            sum(array(self.model_ratioint), axis = 1)
+        incl = self.includedtrans
+        translist = [self.translist[i] for i in incl]
+        verdict = self.calcRatioVerdict(self.ratioint_matrix,useNoisy=useNoisy,\
+                                        useRms=useRms,err=err,\
+                                        err_noisy=err_noisy)
+        self.model_ratioint = verdict[:,incl]
+        self.line_ratioint = dict([(st,self.model_ratioint[:,i])
+                                   for i,st in enumerate(translist)])
+        self.verdict_model_ratioint = self.model_ratioint.sum(axis=1)
 
         if plot:
             plot_id = 'plot_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
                 %(gmtime()[0],gmtime()[1],gmtime()[2],\
                     gmtime()[3],gmtime()[4],gmtime()[5])
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0].\
-                getModelId().replace('_','-') \
-                for ii in range(len(self.star_grid))]
+            self.modellist = [m.replace('_','-') \
+                for m in self.getValidModelIds()]
             
             plt.clf()
             fig = plt.figure(2, figsize = (15, 10))
@@ -1242,26 +1329,20 @@ class ResoStats(Statistics):
         
         self.calcRatioIntTmb(useNoisy=useNoisy,useRms=useRms,\
             err=err,err_noisy=err_noisy)
-        self.combRatioIntLLL = []
         self.calcLLL()
         
         translist = [self.translist[i] for i in self.includedtrans]
         
-        for ii in range(len(self.star_grid)):
-            self.combRatioIntLLL.append([self.model_lll[ii][x] \
-                if self.model_lll[ii][x] == self.model_ratioint[ii][x] else 0 \
-                for x in range(len(translist))])
-        
-        self.verdict_combRatioIntLLL = sum(array(self.combRatioIntLLL), axis = 1)
+        self.combRatioIntLLL = self.model_lll*self.model_ratioint
+        self.verdict_combRatioIntLLL = self.combRatioIntLLL.sum(axis=1)
         
         if plot:
             plt.clf()
             plot_id = 'plot_%.4i-%.2i-%.2ih%.2i-%.2i-%.2i' \
                 %(gmtime()[0],gmtime()[1],gmtime()[2],\
                     gmtime()[3],gmtime()[4],gmtime()[5])
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0]\
-                .getModelId().replace('_','-') \
-                for ii in range(len(self.star_grid))]
+            self.modellist = [m.replace('_','-') \
+                for m in self.getValidModelIds()]
             
             fig = plt.figure(2, figsize = (15, 10))
             ax1 = fig.add_subplot(131)
@@ -1361,48 +1442,16 @@ class ResoStats(Statistics):
         if useNoisy:
             print 'Error on noisy data = '+str(err_noisy)
             
-        self.verdict_ratiopeak = dict()        
-        for ist, st in enumerate(self.translist):
-            if useNoisy == 1 and useRms == 1:
-                if self.noisy[ist] ==  True:
-                    self.verdict_ratiopeak[st] = [1 \
-                        if x <= (1. + err_noisy + st.getNoise()) \
-                        and x >= (1. - err_noisy - st.getNoise()) \
-                        else 0 for x in self.ratiopeak[st]]
-                else:
-                    self.verdict_ratiopeak[st] = [1 \
-                        if x <= (1. + err + st.getNoise()) \
-                        and x >= (1. - err - st.getNoise()) \
-                        else 0 for x in self.ratiopeak[st]]        
-            elif useNoisy == 1 and useRms == 0:
-                if self.noisy[ist] ==  True:
-                    self.verdict_ratiopeak[st] = [1 \
-                        if x <= (1. + err_noisy) \
-                        and x >= (1. - err_noisy)\
-                        else 0 for x in self.ratiopeak[st]]
-                else:
-                    self.verdict_ratiopeak[st] = [1 \
-                        if x <= 1. + err and x >= 1. - err \
-                        else 0 for x in self.ratiopeak[st]]        
-            elif useNoisy == 0 and useRms == 1:    
-                self.verdict_ratiopeak[st] = [1 \
-                    if x <= (1. + err + st.getNoise()) \
-                    and x >= (1. - err - st.getNoise()) \
-                    else 0 for x in self.ratiopeak[st]]            
-            else:
-                self.verdict_ratiopeak[st] = [1 if x <= 1. + err \
-                    and x >= 1. - err else 0 for x in self.ratiopeak[st]]
-        
-        
-        self.model_ratiopeak = []
-        for ii in range(len(self.star_grid)):
-            self.model_ratiopeak.append([self.verdict_ratiopeak[tr][ii] \
-                for tr in self.translist])
-        self.model_ratiopeak_verdict = sum(array(self.model_ratiopeak), axis = 1)    
+        self.model_ratiopeak = self.calcRatioVerdict(self.ratiopeak_matrix,\
+                                                     useNoisy=useNoisy,\
+                                                     useRms=useRms,err=err,\
+                                                     err_noisy=err_noisy)
+        self.verdict_ratiopeak = dict([(st,self.model_ratiopeak[:,ist])
+                                       for ist,st in enumerate(self.translist)])
+        self.model_ratiopeak_verdict = self.model_ratiopeak.sum(axis=1)
         
         if plot:
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId() \
-                for ii in range(len(self.star_grid))]
+            self.modellist = self.getValidModelIds()
             tr = [self.verdict_ratiopeak[st] for st in self.translist]
             
             plt.clf()
@@ -1468,55 +1517,21 @@ class ResoStats(Statistics):
         if useNoisy:
             print 'Error on noisy data = '+str(err_noisy)
 
-        self.verdict_ratiocombo = dict()
-        self.y = dict()        
-        for ist, st in enumerate(self.translist):
-            if useNoisy == 1 and useRms == 1:
-                if self.noisy[ist] ==  True:
-                    self.y[st] = [[1 if x <= (1. + err_noisy + st.getNoise()) \
-                        and x >= (1. - err_noisy - st.getNoise()) \
-                        else 0 for x in self.ratiocombo[st][i]] \
-                        for i in range(len(self.ratiocombo[st]))]
-                else:
-                    self.y[st] = [[1 if x <= (1. + err + st.getNoise()) \
-                        and x >= (1. - err - st.getNoise()) \
-                        else 0 for x in self.ratiocombo[st][i]] \
-                        for i in range(len(self.ratiocombo[st]))]
-            elif useNoisy == 1 and useRms == 0:
-                if self.noisy[ist] ==  True:
-                    self.y[st] = [[1 if x <= (1. + err_noisy) 
-                        and x >= (1. - err_noisy) \
-                        else 0 for x in self.ratiocombo[st][i]] \
-                        for i in range(len(self.ratiocombo[st]))]
-                else:
-                    self.y[st] = [[1 if x <= 1. + err \
-                        and x >= 1. - err \
-                        else 0 for x in self.ratiocombo[st][i]] \
-                        for i in range(len(self.ratiocombo[st]))]
-            elif useNoisy == 0 and useRms == 1:    
-                self.y[st] = [[1 if x <= (1. + err + st.getNoise()) \
-                    and x >= (1. - err - st.getNoise()) \
-                    else 0 for x in self.ratiocombo[st][i]] \
-                    for i in range(len(self.ratiocombo[st]))]
-            else:
-                self.y[st] = [[1 if x <= 1. + err and x >= 1. - err \
-                    else 0 for x in self.ratiocombo[st][i]] \
-                    for i in range(len(self.ratiocombo[st]))]
-                        
-        for st in self.translist:
-            self.verdict_ratiocombo[st] = [0 if 0 in self.y[st][i] \
-                else 1 for i in range(len(self.y[st]))]
+        kwargs = dict(useNoisy=useNoisy,useRms=useRms,err=err,\
+                      err_noisy=err_noisy)
+        peak = self.calcRatioVerdict(self.ratiopeak_matrix,**kwargs)
+        integrated = self.calcRatioVerdict(self.ratioint_matrix,**kwargs)
         
-        self.model_ratiocombo = []
-        for ii in range(len(self.star_grid)):
-            self.model_ratiocombo.append([self.verdict_ratiocombo[tr][ii] \
-                for tr in self.translist])
-        self.model_ratiocombo_verdict = \
-            sum(array(self.model_ratiocombo), axis = 1)    
+        #-- Per model the verdict for the peak and integrated ratio
+        self.y = dict([(st,np.column_stack([peak[:,ist],integrated[:,ist]]))
+                       for ist,st in enumerate(self.translist)])
+        self.model_ratiocombo = peak*integrated
+        self.verdict_ratiocombo = dict([(st,self.model_ratiocombo[:,ist])
+                                        for ist,st in enumerate(self.translist)])
+        self.model_ratiocombo_verdict = self.model_ratiocombo.sum(axis=1)
 
         if plot:
-            self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId() \
-                for ii in range(len(self.star_grid))]
+            self.modellist = self.getValidModelIds()
             tr = [self.verdict_ratiocombo[st] for st in self.translist]
             
             plt.clf()
@@ -1578,62 +1593,34 @@ class ResoStats(Statistics):
         
         '''
         
-        self.modellist = [self.star_grid[ii]['GAS_LINES'][0].getModelId() \
-            for ii in range(len(self.star_grid))]
+        self.modellist = self.getValidModelIds()
        
-        self.chiSquared = []
-        self.redChiSquared = []
-        data = array([self.dinttmb[st] for st in self.translist])
+        data = self.dinttmb_array
         dof = P - 1
-
-        for mm in range(len(self.modellist)):
-            model = array([self.minttmb[st][mm] for st in self.translist])
-           
-            if useTeleUncertainties == 1 and useNoisy == 1:
-                noise = array([self.tele_uncertainties[t.telescope]\
-                    *self.dinttmb[t] if not self.noisy[i] \
-                    else err_noisy*self.dinttmb[t] \
-                    for i,t in enumerate(self.translist)])
-                cs = BasicStats.calcChiSquared(data,model,noise,ndf=dof)
-                self.redChiSquared.append(cs)
-                self.chiSquared.append(cs*(len(data) - dof - 1))
-                
-            if useTeleUncertainties == 0 and useNoisy == 1: 
-                noise = array([err*self.dinttmb[t] if not self.noisy[i]\
-                    *self.dinttmb[t] else err_noisy*self.dinttmb[t] \
-                    for i,t in enumerate(self.translist)])
-                cs = BasicStats.calcChiSquared(data,model,noise,ndf=dof)
-                self.redChiSquared.append(\
-                    BasicStats.calcChiSquared(data,model,noise,ndf=dof))
-                self.chiSquared.append(cs*(len(data) - dof - 1))
-                                           
-            if useTeleUncertainties == 1 and useNoisy == 0:
-                noise = [self.tele_uncertainties[t.telescope] \
-                    for t in self.translist]*data
-                cs = BasicStats.calcChiSquared(data,model,noise,ndf=dof)
-                self.redChiSquared.append(\
-                    BasicStats.calcChiSquared(data,model,noise,ndf=dof))
-                self.chiSquared.append(cs*(len(data) - dof - 1))
-                                           
-            if useTeleUncertainties == 0 and useNoisy == 0:
-                noise = err*data
-                cs = BasicStats.calcChiSquared(data,model,noise,ndf=dof)
-                self.redChiSquared.append(\
-                    BasicStats.calcChiSquared(data,model,noise,ndf=dof))
-                self.chiSquared.append(cs*(len(data) - dof - 1))
-
-
+        
+        #-- The relative uncertainty of every transition
+        if useTeleUncertainties:
+            rel_err = array([self.tele_uncertainties[t.telescope]
+                             for t in self.translist],dtype=float)
+        else:
+            rel_err = ones(len(self.translist))*err
+        if useNoisy:
+            rel_err[self.getNoisyMask()] = err_noisy
+        noise = rel_err*data
+        
+        #-- All models at once: one chi squared per row of the model matrix
+        self.redChiSquared = BasicStats.calcChiSquared(data,\
+                                                       self.minttmb_matrix,\
+                                                       noise,ndf=dof)
+        self.chiSquared = self.redChiSquared*(len(data) - dof - 1)
         self.errRedChiSquared = (2.0/len(self.translist))**0.5
        
-        best = np.where(np.array(self.redChiSquared) \
-            == min(self.redChiSquared))[0][0]
-       
+        minchi = self.redChiSquared.min()
+        best = np.where(self.redChiSquared == minchi)[0][0]
         self.redChiSquaredWithinThreeSigma = \
-            [ii for ii in range(len(self.modellist)) \
-            if self.redChiSquared[ii]>\
-                (min(self.redChiSquared)-3*self.errRedChiSquared)\
-            and self.redChiSquared[ii] \
-                < (min(self.redChiSquared) + 3*self.errRedChiSquared)]
+            list(np.where((self.redChiSquared>minchi-3*self.errRedChiSquared)\
+                          &(self.redChiSquared<minchi+3*self.errRedChiSquared))\
+                 [0])
       
         print '*******************************************************'
         print '****************** Chi Squared ************************'
@@ -167,8 +167,19 @@ class SedStats(Statistics):
             self.mflux.append(f)
         
         if self.photbands.size:
-            self.mphot_ivs = [Sed.calcPhotometry(w,f,self.photbands)
-                              for w,f in zip(self.mwave,self.mflux)]
+            #-- Models that share a wavelength grid are integrated at once.
+            #   The integration weights are saved with the models.
+            folder = os.path.join(cc.path.mout,'photometry')
+            groups = dict()
+            for i,w in enumerate(self.mwave):
+                groups.setdefault(np.asarray(w).tostring(),[]).append(i)
+            self.mphot_ivs = [None]*len(self.mwave)
+            for ii in groups.values():
+                mphot = Sed.calcGridPhotometry(self.mwave[ii[0]],\
+                                               [self.mflux[i] for i in ii],\
+                                               self.photbands,folder=folder)
+                for i,iphot in zip(ii,mphot):
+                    self.mphot_ivs[i] = iphot
             
         for fn in self.dphot_other.keys():
             self.mphot_other[fn] = []
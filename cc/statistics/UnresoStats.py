@@ -18,6 +18,7 @@ from cc.tools.io import DataIO
 from cc.modeling.objects import Transition
 from cc.statistics.Statistics import Statistics
 from cc.statistics import BasicStats as bs
+from cc.tools.numerical import Operators as op
 from cc.plotting import Plotting2
 
 
@@ -78,6 +79,12 @@ class UnresoStats(Statistics):
         self.chi2_inttot = dict()
         self.chi2_con = dict()
         
+        #-- Remember the convolved models of the whole star grid per band, one
+        #   row per model in self.star_grid.
+        #   key: filename
+        #   value: array
+        self.mflux_grids = dict()
+        
         
     
     def setInstrument(self,instrument_name,*args,**kwargs):
@@ -97,6 +104,21 @@ class UnresoStats(Statistics):
         
         
 
+    def setModels(self,*args,**kwargs):
+        
+        '''
+        Load the models, see Statistics.py. 
+        
+        The cached model flux grids are reset, since they are indexed by the
+        rows of the previous star grid.
+        
+        '''
+        
+        super(UnresoStats,self).setModels(*args,**kwargs)
+        self.mflux_grids = dict()
+        
+        
+
     def setLineStrengths(self):
         
         ''' 
@@ -121,6 +143,7 @@ class UnresoStats(Statistics):
         #   around a central wavelength in the data. As a default, this is 
         #   equal to the PACS_OVERSAMPLING. No point in changing this.
         self.tolerance = inst.oversampling
+        self.mflux_grids = dict()
         
         for ifn,(fn,dwav) in enumerate(zip(inst.data_filenames,\
                                            inst.data_wave_list)):
@@ -185,6 +208,14 @@ class UnresoStats(Statistics):
                                    filename=filename)
         all_derrs = self.getRatios(sel_type='dint_bands',data_type='derr_bands',\
                                    filename=filename)
+        if not filename:
+            fns = inst.data_filenames
+            fluxes = inst.data_flux_list
+        else:
+            fns = filename is None and inst.data_filenames or [filename]
+            fluxes = [inst.data_flux_list[inst.data_filenames.index(fn)]
+                      for fn in fns]
+        mfluxes = [self.getModelFluxes(fn) for fn in fns]
         
         for istar,star in enumerate(self.star_grid):
             this_id = star['LAST_%s_MODEL'%inst.instrument.upper()]
@@ -209,19 +240,11 @@ class UnresoStats(Statistics):
             all_dflux = []
             all_mflux = []
             all_dstd = []
-            if not filename:
-                fns = inst.data_filenames
-                fluxes = inst.data_flux_list
-            else:
-                fns = filename is None and inst.data_filenames or [filename]
-                fluxes = [inst.data_flux_list[inst.data_filenames.index(fn)]
-                          for fn in fns]
-                          
-            for fn,dflux in zip(fns,fluxes):
+            for fn,dflux,mflux_grid in zip(fns,fluxes,mfluxes):
                 dstd = self.data_stats[fn]['std']
                 #-- Cannot return empty list as the selection of existing 
                 #   convolutions is done in Statistics.setModels()
-                mflux = inst.getSphinxConvolution(star,fn)[1]
+                mflux = mflux_grid[istar]
                 #-- Make sure all points are positive. Some data points may be 
                 #   <0 due to continuum subtraction.
                 mflux = mflux[dflux>0]
@@ -234,6 +257,32 @@ class UnresoStats(Statistics):
                                                        mode=chi2_method,ndf=ndf)
             
             
+            
+    def getModelFluxes(self,fn):
+        
+        '''
+        Return the convolved models of all stars in the star grid for a data 
+        set, with one row per model. 
+        
+        The convolutions are read only once per data set, see 
+        Instrument.getSphinxConvolutions.
+        
+        @param fn: The filename of the data set.
+        @type fn: string
+        
+        @return: The convolved model fluxes on the wavelength grid of the data
+        @rtype: array
+        
+        '''
+        
+        if not self.mflux_grids.has_key(fn):
+            mflux_grid = self.instrument.getSphinxConvolutions(self.star_grid,\
+                                                               fn)[1]
+            self.mflux_grids[fn] = mflux_grid
+        return self.mflux_grids[fn]
+        
+        
+        
     def __setIntRatios(self,ifn,fn):
         
         '''
@@ -353,47 +402,55 @@ class UnresoStats(Statistics):
         d_sigma = self.data_stats[fn]['sigma']
         
         self.peak_ratios[fn] = dict()
-    
-        for star in self.star_grid:
-            #-- Read the convolved sphinx model
-            mwav, mflux = inst.getSphinxConvolution(star,fn)
-            if list(mflux[mflux < 0]) != []: 
-                print 'There are negative sphinx flux values! They will '+\
-                      'not be taken into account.'
-            
-            #-- Calculate the peak-to-peak ratios. 
-            #   1) Central wavelengths of mtrans are set in previous method
-            #   2) Get the central model flux, which should coincide exactly 
-            #      with the Doppler shifted rest wavelength of the line. If the 
-            #      model flux is negative, the value is not used.
-            central_mflux = [mflux[argmin(abs(mwav-wav))] > 0 \
-                                and mflux[argmin(abs(mwav-wav))] \
-                                or None
-                             for wav in self.central_mwav[fn]]
-            #   3) Get the central data flux, at the Doppler shifted central 
-            #      wavelength expected from the model. The maximum flux is 
-            #      taken in the wavelength bin tolerance*wav_resolution/2.
-            #      allowing for small wave shifts due to instrumental effects.
-            central_dflux = [max(dflux[abs(dwav-wav)<= \
-                             self.tolerance/2.*( dwav[argmin(abs(dwav-wav))+1]\
-                                                -dwav[argmin(abs(dwav-wav))])])
-                             for wav in self.central_mwav[fn]]
-            #   4) Check if the data flux point is actually significant 
-            #      compared to the noise in the spectrum. Compare with dstd, 
-            #      given d_sigma from path_combocode/usr/Data.dat .
-            #      Insignificant values are multiplied by -1, to indicate they
-            #      are upper limits in the data at that wavelength.
-            central_dflux = [d >= d_mean+(d_std*d_sigma) \
-                                and d \
-                                or -1*abs(d_mean+(d_std*d_sigma)) 
-                             for d in central_dflux]
-            #   5) Calculate the ratios, only if the model flux is not None 
-            #      (was a negative model flux value: We don't want that)
-            #      Negative ratios are possible, in case of ratio lower limits 
+        
+        #-- Calculate the peak-to-peak ratios. 
+        #   1) Central wavelengths of mtrans are set in previous method. The 
+        #      data wavelength grid is sorted, so the nearest points are found
+        #      through a binary search.
+        cwav = array(self.central_mwav[fn],dtype=float)
+        
+        #   2) Get the central data flux, at the Doppler shifted central 
+        #      wavelength expected from the model. The maximum flux is 
+        #      taken in the wavelength bin tolerance*wav_resolution/2.
+        #      allowing for small wave shifts due to instrumental effects.
+        #      This does not depend on the model. 
+        idwav = op.findNearest(dwav,cwav)
+        widths = self.tolerance/2.*(dwav[idwav+1]-dwav[idwav])
+        i0s = np.searchsorted(dwav,cwav-widths,side='left') - 1
+        i1s = np.searchsorted(dwav,cwav+widths,side='right') + 1
+        central_dflux = []
+        for wav,width,i0,i1 in zip(cwav,widths,i0s,i1s):
+            i0 = max(i0,0)
+            sel = abs(dwav[i0:i1]-wav) <= width
+            central_dflux.append(max(dflux[i0:i1][sel]))
+        
+        #   3) Check if the data flux point is actually significant 
+        #      compared to the noise in the spectrum. Compare with dstd, 
+        #      given d_sigma from path_combocode/usr/Data.dat .
+        #      Insignificant values are multiplied by -1, to indicate they
+        #      are upper limits in the data at that wavelength.
+        central_dflux = array([d >= d_mean+(d_std*d_sigma) \
+                                  and d \
+                                  or -1*abs(d_mean+(d_std*d_sigma)) 
+                               for d in central_dflux],dtype=float)
+        
+        #   4) Get the central model flux of all models at once, which should 
+        #      coincide exactly with the Doppler shifted rest wavelength of the
+        #      line. The convolved models are given on the data grid. 
+        mflux_grid = self.getModelFluxes(fn)
+        if (mflux_grid < 0).any(): 
+            print 'There are negative sphinx flux values! They will '+\
+                  'not be taken into account.'
+        central_mflux = mflux_grid[:,op.findNearest(dwav,cwav)]
+        
+        #   5) Calculate the ratios, only if the model flux is positive 
+        #      (negative model flux values: We don't want that)
+        #      Negative ratios are possible, in case of ratio lower limits 
+        ratios = central_mflux/central_dflux
+        for star,mcentral,ratio in zip(self.star_grid,central_mflux,ratios):
             this_id = star['LAST_%s_MODEL'%inst.instrument.upper()]
-            self.peak_ratios[fn][this_id] = [not m is None and m/d or None
-                                             for m,d in zip(central_mflux,\
-                                                            central_dflux)]
+            self.peak_ratios[fn][this_id] = [m > 0 and r or None
+                                             for m,r in zip(mcentral,ratio)]
             
                                                                                 
     def getRatios(self,this_id=None,sel_type='peak_ratios',\
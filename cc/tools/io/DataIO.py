@@ -7,7 +7,7 @@ Author: R. Lombaert
 
 """
 
-import os, sys
+import os, sys, re, time
 import subprocess
 from glob import glob
 import numpy as np
@@ -16,6 +16,22 @@ from PyPDF2 import PdfFileMerger
 from matplotlib import mlab
 
 import cc.path
+from cc.tools.io.FileCache import FileCache
+from cc.tools.io.TextTable import TextTable, FLOAT_CHARS
+
+#-- The data read from model output files during this session. See 
+#   readCachedFile, readTable, getKeyData and getGastronoomOutput.
+file_cache = FileCache()
+
+#-- The tables read from the ComboCode/usr input files during this session, 
+#   kept apart from the model output. See getInputData, getInputIndex and 
+#   reloadInputData.
+input_cache = FileCache(max_bytes=32*2**20)
+
+#-- A number in fortran double notation, as a whole token, e.g. 1.0D+02. Used
+#   by parseColumns to replace the D by an E.
+FORTRAN_DOUBLE = re.compile(r'(?<![^\s])([+-]?(?:\d+\.?\d*|\.\d+))[dD]'+\
+                            r'([+-]?\d+)(?![^\s])')
 
 
 def read(func,module=sys.modules[__name__],return_func=0,*args,**kwargs):
@@ -106,7 +122,7 @@ def findKey(i,data,key):
     
     
     
-def getKeyData(incr,filename,keyword,single=1):
+def getKeyData(incr,filename,keyword,single=1,binary=1):
     
     """
     Search a data file with data in a single (or multiple) columns, separated by
@@ -139,28 +155,53 @@ def getKeyData(incr,filename,keyword,single=1):
     
                      (default: 1)
     @type single: bool
+    @keyword binary: Read the data from the binary sidecar of the file, which
+                     is written if needed. See readTable. Only used if single
+                     is on.
+                     
+                     (default: 1)
+    @type binary: bool
     
     @return: The requested data
     @rtype: list[]
     
     """
     
-    data = readFile(filename,' ')
-    
-    #-- The line with the key is usually not what we want. So add 1.
-    i = findKey(0,data,keyword) + 1
-
     #-- If incr is 0, we need the line itself, and not just the first value.
     if not incr:
         single = 0
-        i -= 1
-        incr = 1
+    
+    def extract():
+        #-- The binary table falls back on the text if it cannot be sure the 
+        #   result is the same.
+        if single and binary:
+            table = readTable(filename)
+            i = table.findKey(keyword)
+            if not i is None:
+                col = table.getColumn(0,i+1,i+1+int(incr),dexp=0)
+                if not col is None:
+                    return col.tolist()
+        
+        data = readCachedFile(filename)
         
-    #-- Return a single value (first of the line) or the entire line.
+        #-- The line with the key is usually not what we want. So add 1.
+        i = findKey(0,data,keyword) + 1
+        if not incr:
+            i -= 1
+        
+        #-- Return a single value (first of the line) or the entire line.
+        if single:
+            return [float(line[0]) for line in data[i:i+int(incr or 1)]]
+        else:
+            return [line for line in data[i:i+int(incr or 1)]]
+    
+    #-- The cached lists are copied, so they can be changed by the caller.
+    key = ('getKeyData',int(incr),keyword,bool(single))
+    cached = file_cache.get(filename,key,extract)
     if single:
-        return [float(line[0]) for line in data[i:i+int(incr)]]
+        return list(cached)
     else:
-        return [line for line in data[i:i+int(incr)]]
+        return [list(line) for line in cached]
 
 
 
@@ -194,7 +235,7 @@ def readFortranFile(convert_cols,func=np.loadtxt,*args,**kwargs):
 
 
 def getGastronoomOutput(filename,keyword='RADIUS',begin_index=0,\
-                        return_array=0,key_index=0):
+                        return_array=0,key_index=0,binary=1):
     
     """
     Search GASTRoNOoM output for relevant envelope information.
@@ -220,32 +261,58 @@ def getGastronoomOutput(filename,keyword='RADIUS',begin_index=0,\
                         
                         (default: 0)
     @type key_index: int
+    @keyword binary: Read the data from the binary sidecar of the file, which
+                     is written if needed. See readTable.
+                     
+                     (default: 1)
+    @type binary: bool
     
     @return: The requested data from the GASTRoNOoM output
     @rtype: list/array
     """
   
     keyword = keyword.upper()
-    data = readFile(filename,' ')
-    data_col_1 = [d[0] for d in data]
-    key_i = findString(begin_index,data_col_1)
-    key_j = findFloat(key_i,data_col_1)
-    if not key_index:
-        keys = ' '.join([' '.join(d).replace('\n','') 
-                         for d in data[key_i:key_j]]).split()
-        key_index = [key[:len(keyword)].upper() for key in keys].index(keyword)
-    #- Data never start on the first line
-    #- Starting from 1st float, all floats into list, until EOF OR end of block
-    data_i = key_j
-    #- Data may end at EOF or before a new block of data (sphinx fi)
-    data_j = findString(data_i,data_col_1)     
+    
+    def extract(key_index=key_index):
+        if binary:
+            table = readTable(filename)
+            key_i = table.findString(begin_index)
+            key_j = table.findFloat(key_i)
+            index = key_index
+            if not index:
+                keys = ' '.join(table.getText(key_i,key_j)).split()
+                index = [key[:len(keyword)].upper() 
+                         for key in keys].index(keyword)
+            dd = table.getColumn(index,key_j,table.findString(key_j))
+            if not dd is None:
+                return dd
+        
+        data = readCachedFile(filename)
+        data_col_1 = [d[0] for d in data]
+        key_i = findString(begin_index,data_col_1)
+        key_j = findFloat(key_i,data_col_1)
+        if not key_index:
+            keys = ' '.join([' '.join(d).replace('\n','') 
+                             for d in data[key_i:key_j]]).split()
+            key_index = [key[:len(keyword)].upper() 
+                         for key in keys].index(keyword)
+        #- Data never start on the first line
+        #- Starting from 1st float, all floats into list, until EOF OR end of 
+        #- block
+        data_i = key_j
+        #- Data may end at EOF or before a new block of data (sphinx fi)
+        data_j = findString(data_i,data_col_1)     
+        return array([float(line[key_index].replace('D+','E+')\
+                                           .replace('D-','E-')) 
+                      for line in data[data_i:data_j]])
+    
+    #-- The cached array is copied, so it can be changed by the caller.
+    key = ('getGastronoomOutput',keyword,begin_index,key_index)
+    dd = file_cache.get(filename,key,extract)
     if return_array:
-        dd = array([float(line[key_index].replace('D+','E+').replace('D-','E-')) 
-                    for line in data[data_i:data_j]])
-        return dd
+        return dd.copy()
     else:   
-        return [float(line[key_index].replace('D+','E+').replace('D-','E-')) 
-                for line in data[data_i:data_j]]
+        return dd.tolist()
     
     
     
@@ -300,10 +367,138 @@ def getInputData(path=cc.path.usr,keyword='STAR_NAME',filename='Star.dat',\
      
     """
     
+    #-- The columns are remembered for the rest of the session, and read anew
+    #   if the file changed on the hard disk. 
     keyword = keyword.upper()
-    data = [line 
-            for line in readFile(os.path.join(path,filename),' ')
-            if ''.join(line).strip()]
+    filename = os.path.join(path,filename)
+    key = ('getInputData',keyword,int(start_index),bool(make_float),\
+           bool(remove_underscore))
+    elements = input_cache.get(filename,key,\
+                               lambda: readInputColumn(filename,keyword,\
+                                                       remove_underscore,\
+                                                       make_float,\
+                                                       start_index))
+    if not rindex is None:
+        return elements[rindex]
+    else:
+        return list(elements)
+
+
+
+def getInputIndex(value,path=cc.path.usr,keyword='STAR_NAME',\
+                  filename='Star.dat',remove_underscore=0,make_float=1,\
+                  start_index=1):
+    
+    """
+    Find the row index of a value in a column of a ComboCode/usr file. 
+    
+    Equivalent to getInputData(...).index(value), but the index is looked up
+    in a dictionary that is made once per column and session.
+    
+    @param value: The value that is searched, e.g. a star name
+    @type value: string/float
+    
+    @keyword path: Location of the input file
+    
+                   (default: cc.path.usr)
+    @type path: string
+    @keyword keyword: The column that is searched
+                      
+                      (default: STAR_NAME)
+    @type keyword: string
+    @keyword filename: filename in that includes wanted information
+                       
+                       (default: 'Star.dat')
+    @type filename: string
+    @keyword remove_underscore: remove the underscores from the entries and 
+                                replace them by spaces.
+                                
+                                (default: 0)
+    @type remove_underscore: bool
+    @keyword make_float: set to 0, if no floats are desired at all. If 1, all
+                         entries will be converted to floats and on failure,
+                         the string is returned instead
+                         
+                         (default: 1)
+    @type make_float: bool
+    @keyword start_index: Start search for keyword on the line before this index
+     
+                          (default: 1)
+    @type start_index: int
+    
+    @return: The index of the first row that contains the value
+    @rtype: int
+    
+    """
+    
+    def extract():
+        elements = getInputData(path=path,keyword=keyword,filename=filename,\
+                                remove_underscore=remove_underscore,\
+                                make_float=make_float,start_index=start_index)
+        index = dict()
+        for i,el in enumerate(elements):
+            index.setdefault(el,i)
+        return index
+    
+    key = ('getInputIndex',keyword.upper(),int(start_index),bool(make_float),\
+           bool(remove_underscore))
+    index = input_cache.get(os.path.join(path,filename),key,extract)
+    try:
+        return index[value]
+    except (KeyError,TypeError):
+        raise ValueError('%s is not in %s of %s.'%(str(value),keyword,filename))
+
+
+
+def reloadInputData():
+    
+    """
+    Forget all tables read from the ComboCode/usr input files. 
+    
+    Files that changed on the hard disk are read anew anyway. This is only 
+    needed if a file is changed within the resolution of its modification time.
+    
+    """
+    
+    input_cache.clear()
+
+
+
+def readInputColumn(filename,keyword,remove_underscore=0,make_float=1,\
+                    start_index=1):
+    
+    """
+    Read a column from a ComboCode/usr file. Use getInputData, which remembers
+    the result.
+    
+    @param filename: The full filename of the input file
+    @type filename: string
+    @param keyword: The column requested, in upper case
+    @type keyword: string
+    
+    @keyword remove_underscore: remove the underscores from the entries and 
+                                replace them by spaces.
+                                
+                                (default: 0)
+    @type remove_underscore: bool
+    @keyword make_float: Convert all entries to floats, or none if any fails
+                         
+                         (default: 1)
+    @type make_float: bool
+    @keyword start_index: Start search for keyword on the line before this index
+     
+                          (default: 1)
+    @type start_index: int
+    
+    @return: The column
+    @rtype: tuple
+    
+    """
+    
+    data = input_cache.get(filename,('readFile',),\
+                           lambda: [line 
+                                    for line in readFile(filename,' ')
+                                    if ''.join(line).strip()])
     i = int(start_index)
     while ' '.join(data[i-1]).find(keyword) == -1:
         i += 1
@@ -332,10 +527,62 @@ def getInputData(path=cc.path.usr,keyword='STAR_NAME',filename='Star.dat',\
             elements = [line[data_index] 
                         for line in data[i:end_index] 
                         if line[0]]
-    if not rindex is None:
-        return elements[rindex]
-    else:
-        return elements
+    return tuple(elements)
+
+
+def readCachedFile(filename):
+    
+    """
+    Read a file split on spaces, as readFile(filename,' '), and remember the 
+    content for the rest of the session. 
+    
+    The file is read anew if it changed on the hard disk. 
+    
+    The returned lines are shared with every other caller and must not be 
+    changed. Use readFile if you need to change them.
+    
+    @param filename: the full filename of to be read file
+    @type filename: string
+    
+    @return: The lines in the file, split into substrings
+    @rtype: list[list[string]]
+    
+    """
+    
+    #-- A line split into strings takes roughly 10 times its size on disk. 
+    try:
+        size = 10*os.path.getsize(filename)
+    except OSError:
+        size = None
+    return file_cache.get(filename,('readFile',),\
+                          lambda: readFile(filename,' '),size=size)
+
+
+
+def readTable(filename):
+    
+    """
+    Read a file in columnar form, and remember the content for the rest of the
+    session.
+    
+    The table is loaded from the binary sidecar of the file if the sidecar is
+    newer than the file. Otherwise the file is parsed, and the sidecar is 
+    written for later sessions. See TextTable.
+    
+    The returned table is shared with every other caller and must not be 
+    changed.
+    
+    @param filename: the full filename of to be read file
+    @type filename: string
+    
+    @return: The content of the file
+    @rtype: TextTable()
+    
+    """
+    
+    return file_cache.get(filename,('readTable',),\
+                          lambda: TextTable.load(filename))
+
 
 
 def readFile(filename,delimiter=None,replace_spaces=1):
@@ -678,7 +925,7 @@ def removeComments(lines,comment_chars=['#','!',';']):
 
 def readCols(filename,delimiter=' ',make_float=1,start_row=0,make_array=1,\
              nans=0,start_from_keyword='',return_comments=0,\
-             comment_chars=['#','!',';'],end_row=None):
+             comment_chars=['#','!',';'],end_row=None,binary=0,fast=1):
     
     '''
     Read columns, remove comments and turn into floats.
@@ -736,6 +983,20 @@ def readCols(filename,delimiter=' ',make_float=1,start_row=0,make_array=1,\
                         
                       (default: None)
     @type end_row: int
+    @keyword binary: Read the columns from the binary sidecar of the file, 
+                     which is written if needed. See readTable. Meant for 
+                     model output. Only used for numerical data split on 
+                     spaces, without start_from_keyword and return_comments.
+                     
+                     (default: 0)
+    @type binary: bool
+    @keyword fast: Convert the columns in bulk with parseColumns if they are 
+                   split on spaces and fully numerical. Only used if 
+                   make_float is on. Numbers in fortran double notation are 
+                   then also converted.
+                   
+                   (default: 1)
+    @type fast: bool
     
     @return: The columns are returned, with in addition the comments if 
              requested
@@ -743,6 +1004,14 @@ def readCols(filename,delimiter=' ',make_float=1,start_row=0,make_array=1,\
     
     '''
     
+    #-- The binary table falls back on the text if any line is not numerical.
+    if binary and make_float and delimiter == ' ' \
+            and not str(start_from_keyword) and not return_comments \
+            and not [c for c in comment_chars if c.upper() in FLOAT_CHARS]:
+        cols = readTable(filename).getColumns(start_row,end_row)
+        if not cols is None:
+            return make_array and cols or [col.tolist() for col in cols]
+    
     lines = readFile(filename)
     if str(start_from_keyword):
         #-- Find occurrences of searchstring
@@ -764,6 +1033,14 @@ def readCols(filename,delimiter=' ',make_float=1,start_row=0,make_array=1,\
               'are available in %s. Returning empty list.'%filename
         return []
     
+    #-- Numerical lines are converted in bulk. Anything else is done one by
+    #   one.
+    if fast and make_float and delimiter == ' ':
+        cols = parseColumns([' '.join(line) for line in lines])
+        if not cols is None:
+            cols = make_array and cols or [col.tolist() for col in cols]
+            return return_comments and (cols,comments) or cols
+    
     #-- Apply requests for floatsand arrays and return.
     if make_float:
         lines = [[convertFloat(l,nans=nans) for l in line] for line in lines]
@@ -776,6 +1053,130 @@ def readCols(filename,delimiter=' ',make_float=1,start_row=0,make_array=1,\
 
 
 
+def parseColumns(lines):
+
+    '''
+    Convert lines of numbers separated by white space to float columns, all 
+    at once.
+    
+    As in readCols, the number of columns is the minimum number of numbers
+    in a line. Numbers in fortran double notation (e.g. 1.0D+02) are 
+    converted as well.
+    
+    @param lines: The lines, without comments
+    @type lines: list[string]
+    
+    @return: The columns, or None if a value in the columns is not a number,
+             or if there are no lines.
+    @rtype: list[array]
+    
+    '''
+    
+    if not lines:
+        return None
+    ntokens = [len(line.split()) for line in lines]
+    ndata = min(ntokens)
+    text = ' '.join(lines)
+    if ndata != max(ntokens):
+        text = ' '.join([' '.join(line.split()[:ndata]) for line in lines])
+    try:
+        values = np.array(text.split(),dtype=float)
+    except ValueError:
+        try:
+            text = FORTRAN_DOUBLE.sub(r'\1E\2',text)
+            values = np.array(text.split(),dtype=float)
+        except ValueError:
+            return None
+    values = values.reshape(len(lines),ndata)
+    return [np.array(col) for col in values.T]
+
+
+
+def parseFixedWidth(lines,width=14,ncols=8):
+
+    '''
+    Convert lines of fixed-width fields to a 2d float array, all at once.
+    
+    The result is the same as np.genfromtxt with delimiter=[width]*ncols for
+    the same lines: fields that are blank, or missing at the end of a short 
+    line, are NaN. Characters beyond the last field are ignored.
+    
+    @param lines: The lines, none of them empty
+    @type lines: list[string]
+    
+    @keyword width: The number of characters per field
+    
+                    (default: 14)
+    @type width: int
+    @keyword ncols: The number of fields per line
+    
+                    (default: 8)
+    @type ncols: int
+    
+    @return: The values, one row per line. None if a field is not a number.
+    @rtype: array
+    
+    '''
+    
+    if not lines:
+        return np.empty((0,ncols))
+    nchars = width*ncols
+    text = ''.join([line.rstrip('\r\n')[:nchars].ljust(nchars) 
+                    for line in lines])
+    fields = np.char.strip(np.frombuffer(text,dtype='S%i'%width))
+    fields[fields == ''] = 'nan'
+    try:
+        values = fields.astype(float)
+    except ValueError:
+        return None
+    return values.reshape(len(lines),ncols)
+
+
+
+def benchmarkReadCols(filenames,repeat=3,**kwargs):
+
+    '''
+    Compare reading columns with and without the bulk conversion of 
+    parseColumns in speed and result.
+    
+    Typical input are GASTRoNOoM and MCMax output files, e.g. sphinx files, 
+    cooling output or MCMax spectra. 
+    
+    @param filenames: The files to be read
+    @type filenames: list[string]
+    
+    @keyword repeat: The number of times each file is read. The fastest read
+                     is kept.
+    
+                     (default: 3)
+    @type repeat: int
+    
+    @return: Per file the time in seconds without and with the bulk 
+             conversion, and whether both give the same columns
+    @rtype: dict(string: (float,float,bool))
+    
+    '''
+    
+    results = dict()
+    for fn in filenames:
+        times = dict()
+        cols = dict()
+        for fast in [0,1]:
+            times[fast] = []
+            for i in xrange(repeat):
+                t0 = time.time()
+                cols[fast] = readCols(fn,fast=fast,**kwargs)
+                times[fast].append(time.time()-t0)
+        same = len(cols[0]) == len(cols[1]) \
+                and all([np.array_equal(np.asarray(c0),np.asarray(c1)) 
+                         for c0,c1 in zip(cols[0],cols[1])])
+        results[fn] = (min(times[0]),min(times[1]),same)
+        print '%s: %.4f s -> %.4f s. Same result: %s.'\
+              %(os.path.split(fn)[1],min(times[0]),min(times[1]),same)
+    return results
+
+
+
 def splitLines(lines,delimiter=None,replace_spaces=1):
 
     """
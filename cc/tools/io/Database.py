@@ -16,7 +16,11 @@ from glob import glob
 
 import cc.path
 from cc.tools.io import DataIO
+from cc.tools.io.DbIndex import DbIndex, getIndexFilename
 
+#-- A journal is compacted into the database file once it grows larger than the
+#   database file itself, and at least this number of bytes.
+JOURNAL_COMPACT_SIZE = 10*1024**2
 
 
 def updateAllDbs(func,db_name,*args,**kwargs):
@@ -981,7 +985,7 @@ class Database(dict):
     '''
     
     
-    def __init__(self,db_path):
+    def __init__(self,db_path,journal=0):
         
         '''
         Initializing a Database class.
@@ -993,20 +997,67 @@ class Database(dict):
         
         If no database exists at db_path, a new dictionary will be created.
         
+        In journal mode, sync() does not rewrite the database file. Instead, 
+        the changed and deleted keys are appended to a journal file next to 
+        the database (db_path + '_journal'), and only the journal entries 
+        written by other sessions are read. The journal is compacted into the
+        database file once it grows larger than the database file. Any 
+        Database() instance switches to journal mode when a journal is present
+        for its database.
+        
+        Access to the database is coordinated through a lock file next to the 
+        database (db_path + '_lock'), which also holds the generation counter
+        of the database (see getGeneration).
+        
         @param db_path: The path to the database on the hard disk.
         @type db_path: string
+        
+        @keyword journal: Use the journal for synchronizing the database.
+        
+                          (default: 0)
+        @type journal: bool
   
         '''
         
         super(Database, self).__init__()
         self.path = db_path
         self.folder = os.path.split(self.path)[0]
+        self.journal = journal
+        self.__jpath = '%s_journal'%self.path
+        self.__jsnap = None
+        self.__joffset = 0
+        self.__lockpath = '%s_lock'%self.path
+        self.__lockfile = None
+        self.__nlocks = 0
+        self.__generation = None
+        self.__indices = dict()
         self.read()
         self.__changed = []
         self.__deleted = []
       
       
       
+    def __getstate__(self):
+        
+        '''
+        Return the instance attributes to be pickled along with the Database.
+        
+        The parameter indices are not saved as part of the database, but in 
+        their own files.
+        
+        @return: The instance attributes
+        @rtype: dict
+        
+        '''
+        
+        state = self.__dict__.copy()
+        for k in ['indices','jsnap','joffset','lockfile','nlocks',\
+                  'generation']:
+            state.pop('_Database__%s'%k,None)
+        return state
+      
+      
+      
     def __delitem__(self,key):
         
         '''
@@ -1024,6 +1075,7 @@ class Database(dict):
         '''
         
         self.__deleted.append(key)
+        self.__markStale([key])
         return super(Database,self).__delitem__(key)
         
     
@@ -1050,6 +1102,7 @@ class Database(dict):
         '''
         
         self.__changed.append(key)
+        self.__markStale([key])
         return super(Database,self).__setitem__(key,value)
         
         
@@ -1073,6 +1126,7 @@ class Database(dict):
         
         if not self.has_key(key):
             self.__changed.append(key)
+            self.__markStale([key])
         return super(Database,self).setdefault(key,*args)
         
         
@@ -1101,6 +1155,7 @@ class Database(dict):
         
         if self.has_key(key):
             self.__deleted.append(key)
+            self.__markStale([key])
         return super(Database,self).pop(key,*args)
         
         
@@ -1122,6 +1177,7 @@ class Database(dict):
         
         (key,value) = super(Database,self).popitem()
         self.__deleted.append(key)
+        self.__markStale([key])
         return (key,value)
             
             
@@ -1144,6 +1200,7 @@ class Database(dict):
         
         self.__changed.extend(kwargs.keys())
         self.__changed.extend(args[0].keys())
+        self.__markStale(kwargs.keys()+args[0].keys())
         return super(Database,self).update(*args,**kwargs)
                
                
@@ -1169,37 +1226,283 @@ class Database(dict):
         
         Reading and saving of the database is done by cPickle-ing the dict(). 
         
+        If a journal is present, its entries are applied to the database read
+        from the hard disk. 
+        
+        The database is read under a shared lock, so any number of sessions 
+        can read at the same time, but not while another session writes.
+        
+        '''
+        
+        own = self.__acquire(shared=1)
+        try:
+            self.__read()
+        finally:
+            self.__release(own)
+    
+    
+    
+    def __read(self):
+        
+        '''
+        Read the database and its journal from the hard disk. The lock has to
+        be held by the caller.
+        
         '''
         
         try:
-            while True:
-                #dbfile = open(self.path,'r')
-                #portalocker.lock(dbfile, portalocker.LOCK_EX)
-                dbfile = self._open('r')
+            db = self.__load()
+        except IOError:
+            print 'No database present at %s. Creating a new one.'\
+                  %self.path
+            self.__save()
+            db = dict(self)
+        self.__jsnap = self.__getSnapStamp()
+        self.__joffset = 0
+        if os.path.isfile(self.__jpath):
+            self.journal = 1
+            jfile = open(self.__jpath,'rb')
+            try:
+                changed, deleted = self.__replay(jfile)
+            finally:
+                jfile.close()
+            for key in deleted:
+                dict.pop(db,key,None)
+            dict.update(db,changed)
+        
+        #-- Keys that differ from the version in memory have to be 
+        #   re-indexed, if any indices are attached.
+        if self.__indices:
+            stale = set(self.keys()) ^ set(db.keys())
+            stale.update([k 
+                          for k,v in db.iteritems() 
+                          if self.has_key(k) and self[k] != v])
+            self.__markStale(stale)
+        self.clear()
+        super(Database,self).update(db)
+        self.__generation = self.getGeneration()
+    
+    
+    
+    def __load(self):
+        
+        '''
+        Load the database file from the hard disk. 
+        
+        An IOError is raised if the file does not exist.
+        
+        @return: The database saved on the hard disk, without journal entries
+        @rtype: dict
+        
+        '''
+        
+        while True:
+            dbfile = self._open('r')
+            try:
                 try:
-                    try:
-                        db = cPickle.load(dbfile)
-                        dbfile.close()
-                        break
-                    except ValueError:
-                        print 'Loading database failed: ValueError ~ ' + \
-                              'insecure string pickle. Waiting 5 seconds ' + \
-                              'and trying again.' 
-                        dbfile.close()
-                        time.sleep(5)
-                except EOFError:
-                    print 'Loading database failed: EOFError. Waiting 5 ' + \
-                          'seconds and trying again.'
+                    db = cPickle.load(dbfile)
+                    dbfile.close()
+                    return db
+                except ValueError:
+                    print 'Loading database failed: ValueError ~ ' + \
+                          'insecure string pickle. Waiting 5 seconds ' + \
+                          'and trying again.' 
                     dbfile.close()
                     time.sleep(5)
-            self.clear()
-            super(Database,self).update(db)
-        except IOError:
-            print 'No database present at %s. Creating a new one.'%self.path
-            self.__save()
-                
-                
-                
+            except EOFError:
+                print 'Loading database failed: EOFError. Waiting 5 ' + \
+                      'seconds and trying again.'
+                dbfile.close()
+                time.sleep(5)
+    
+    
+    
+    def __acquire(self,shared=0):
+        
+        '''
+        Lock the database, through the lock file next to the database 
+        (db_path + '_lock'). 
+        
+        Reading happens under a shared lock, writing under an exclusive lock. 
+        If this instance already holds the lock (see lock()), nothing is done.
+        
+        @keyword shared: Take a shared lock instead of an exclusive one.
+        
+                         (default: 0)
+        @type shared: bool
+        
+        @return: Was a new lock taken? If so, it has to be released by the 
+                 caller.
+        @rtype: bool
+        
+        '''
+        
+        if not self.__lockfile is None:
+            return False
+        lockfile = open(self.__lockpath,'a+')
+        portalocker.lock(lockfile,shared and portalocker.LOCK_SH \
+                                         or portalocker.LOCK_EX)
+        self.__lockfile = lockfile
+        return True
+    
+    
+    
+    def __release(self,own):
+        
+        '''
+        Release the lock taken by __acquire.
+        
+        @param own: Was the lock taken by the caller? If not, nothing is done.
+        @type own: bool
+        
+        '''
+        
+        if own:
+            self.__lockfile.close()
+            self.__lockfile = None
+    
+    
+    
+    def lock(self):
+        
+        '''
+        Lock the database exclusively until unlock() is called. 
+        
+        Meant for a check-and-reserve sequence, such as a check for a model in
+        the database followed by adding the model in progress. No other 
+        session can read or write the database in the meantime, while sync() 
+        and read() can still be called by this instance. 
+        
+        Note that in a case of a crash before unlock() is called, the python 
+        shell must be exited to unlock the database again.
+        
+        '''
+        
+        self.__acquire()
+        self.__nlocks += 1
+    
+    
+    
+    def unlock(self):
+        
+        '''
+        Release the lock taken with lock(). 
+        
+        '''
+        
+        if not self.__nlocks:
+            return
+        self.__nlocks -= 1
+        if not self.__nlocks:
+            self.__release(1)
+    
+    
+    
+    def getGeneration(self):
+        
+        '''
+        Return the generation of the database on the hard disk.
+        
+        The generation combines a counter kept in the lock file, which is 
+        increased by every sync() that writes to the database, with the state 
+        of the database file and the size of the journal. If it equals the 
+        generation of the last read or sync of this instance, nobody else 
+        wrote to the database in the meantime.
+        
+        @return: The generation of the database
+        @rtype: tuple
+        
+        '''
+        
+        try:
+            lockfile = open(self.__lockpath,'r')
+            try:
+                counter = int(lockfile.read().strip() or 0)
+            finally:
+                lockfile.close()
+        except (IOError,ValueError):
+            counter = 0
+        try:
+            jsize = os.path.getsize(self.__jpath)
+        except OSError:
+            jsize = 0
+        return (counter,self.__getSnapStamp(),jsize)
+    
+    
+    
+    def __nextGeneration(self):
+        
+        '''
+        Increase the counter in the lock file after writing to the database. 
+        The exclusive lock has to be held by the caller.
+        
+        '''
+        
+        counter = self.getGeneration()[0] + 1
+        self.__lockfile.seek(0)
+        self.__lockfile.truncate(0)
+        self.__lockfile.write('%i\n'%counter)
+        self.__lockfile.flush()
+        self.__generation = self.getGeneration()
+    
+    
+    
+    def __getSnapStamp(self):
+        
+        '''
+        Return the identity of the database file on the hard disk. If it 
+        differs from the one remembered when the journal was last read, the 
+        database file has been compacted or rewritten by another session.
+        
+        @return: inode, modification time and size of the database file
+        @rtype: tuple
+        
+        '''
+        
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino,stat.st_mtime,stat.st_size)
+    
+    
+    
+    def __replay(self,jfile):
+        
+        '''
+        Read the journal entries from the last read position onwards. 
+        
+        The entries are merged such that for every key only the last change
+        is returned. An incomplete entry at the end of the journal (eg from a 
+        crashed session) is ignored, and overwritten by the next entry.
+        
+        @param jfile: The opened journal
+        @type jfile: file()
+        
+        @return: The changed keys with their values, and the deleted keys
+        @rtype: (dict,set)
+        
+        '''
+        
+        changed, deleted = dict(), set()
+        jfile.seek(self.__joffset)
+        while True:
+            try:
+                jchanged, jdeleted = cPickle.load(jfile)
+            except (EOFError,ValueError,TypeError,IndexError,\
+                    cPickle.UnpicklingError):
+                break
+            for key in jdeleted:
+                changed.pop(key,None)
+                deleted.add(key)
+            for key in jchanged.keys():
+                deleted.discard(key)
+            changed.update(jchanged)
+            self.__joffset = jfile.tell()
+        return (changed,deleted)
+    
+    
+    
     def sync(self):
         
         ''' 
@@ -1217,47 +1520,173 @@ class Database(dict):
         to which entries can be added manually using the addChangedKey method, 
         or automatically by calling .update(), .__setitem__() or .setdefault().
         
+        The database is only read anew if another session wrote to it since 
+        the last read or sync, based on the generation of the database. The
+        database is locked exclusively only while the changes are written.
+        
+        In journal mode, only the journal entries written by other sessions 
+        are read, and the changes are appended to the journal. Other keys are
+        left untouched in memory.
+        
         '''
         
-        if self.__changed or self.__deleted:
-            current_db = dict([(k,v) 
-                               for k,v in self.items() 
-                               if k in set(self.__changed)])
-            while True:    
-                self.read()
-                self.__deleted = list(set(self.__deleted))
-                for key in self.__deleted:
-                    try:
-                        super(Database,self).__delitem__(key)
-                    except KeyError:
-                        pass
-                super(Database,self).update(current_db)
-                backup_file = self.__save()
+        if os.path.isfile(self.__jpath):
+            self.journal = 1
+        
+        #-- Nothing changed in this instance of the db. Just read the db saved
+        #   to hard disk to update this instance to the real-time version, if 
+        #   anything changed there. 
+        if not self.__changed and not self.__deleted:
+            own = self.__acquire(shared=1)
+            try:
+                if self.getGeneration() != self.__generation:
+                    if self.journal: 
+                        self.__update()
+                    else:
+                        self.__read()
+            finally:
+                self.__release(own)
+            return
+        
+        current_db = dict([(k,v) 
+                           for k,v in self.items() 
+                           if k in set(self.__changed)])
+        deleted = set(self.__deleted)
+        own = self.__acquire()
+        try:
+            #-- Apply the changes made by other sessions, if any
+            if self.getGeneration() != self.__generation:
+                if self.journal: 
+                    self.__update()
+                else:
+                    self.__read()
+            
+            #-- Apply the changes of this instance
+            for key in deleted:
                 try:
-                    #-- Read the object, if TypeError, catch and repeat (which  
-                    #   can happen if db written into by two instances of 
-                    #   Database at the same time)
-                    testread = Database(self.path)
-                    #-- If the read object is not the same as the one in memory, 
-                    #   repeat writing as well. 
-                    if testread != self:
-                        raise TypeError
-                    #-- Remove backup if all is fine. If not, it won't be 
-                    #   removed: tracer for issues if they occur.
-                    if backup_file and os.path.isfile(backup_file):
-                        subprocess.call(['rm %s'%(backup_file)],shell=True)
-                    break
-                except TypeError: 
-                    #-- Just wait a few seconds to allow other instances to 
-                    #   finish writing
-                    time.sleep(2)
+                    super(Database,self).__delitem__(key)
+                except KeyError:
+                    pass
+            super(Database,self).update(current_db)
+            self.__markStale(list(deleted) + current_db.keys())
+            
+            #-- Write the changes
+            if self.journal:
+                self.__append(current_db,deleted)
+            else:
+                self.__save()
+            self.__nextGeneration()
             self.__deleted = []
             self.__changed = []
+            stamp = self.__generation
+        finally:
+            self.__release(own)
+        self.__saveIndices(stamp)
+    
+    
+    
+    def __update(self):
         
-        #-- Nothing changed in this instance of the db. Just read the db saved
-        #   to hard disk to update this instance to the real-time version. 
-        else:
-            self.read()
+        '''
+        Apply the journal entries written by other sessions since the last read
+        or sync. The database is read anew if the database file was replaced or 
+        the journal was truncated in the meantime. The lock has to be held by 
+        the caller.
+        
+        '''
+        
+        if self.__getSnapStamp() != self.__jsnap \
+                or not os.path.isfile(self.__jpath) \
+                or os.path.getsize(self.__jpath) < self.__joffset:
+            self.__read()
+            return
+        jfile = open(self.__jpath,'rb')
+        try:
+            changed, deleted = self.__replay(jfile)
+        finally:
+            jfile.close()
+        for key in deleted:
+            try:
+                super(Database,self).__delitem__(key)
+            except KeyError:
+                pass
+        super(Database,self).update(changed)
+        self.__markStale(list(deleted) + changed.keys())
+        self.__generation = self.getGeneration()
+    
+    
+    
+    def __append(self,changed,deleted,compact=0):
+        
+        '''
+        Append changed and deleted keys to the journal as a single entry. The
+        journal is compacted into the database file if it grows larger than 
+        the database file. The exclusive lock has to be held by the caller, 
+        and the journal has to be up to date.
+        
+        @param changed: The changed keys with their values
+        @type changed: dict
+        @param deleted: The deleted keys
+        @type deleted: set
+        
+        @keyword compact: Compact the journal into the database file, 
+                          regardless of its size.
+        
+                          (default: 0)
+        @type compact: bool
+        
+        '''
+        
+        jfile = open(self.__jpath,'ab')
+        try:
+            #-- Overwrite an incomplete entry left by a crashed session
+            jfile.truncate(self.__joffset)
+            jfile.seek(0,2)
+            if changed or deleted:
+                cPickle.dump((changed,deleted),jfile,cPickle.HIGHEST_PROTOCOL)
+                jfile.flush()
+                os.fsync(jfile.fileno())
+            self.__joffset = jfile.tell()
+        finally:
+            jfile.close()
+        dbsize = self.__jsnap and self.__jsnap[2] or 0
+        if compact or self.__joffset > max(dbsize,JOURNAL_COMPACT_SIZE):
+            self.__save()
+            jfile = open(self.__jpath,'ab')
+            jfile.truncate(0)
+            jfile.close()
+            self.__joffset = 0
+            self.__jsnap = self.__getSnapStamp()
+    
+    
+    
+    def compact(self):
+        
+        '''
+        Synchronize the database and compact the journal into the database 
+        file, in journal mode. 
+        
+        This happens automatically when the journal grows larger than the 
+        database file. A call to this method is only needed, for instance, 
+        before using the database file with an older version of ComboCode 
+        that does not read the journal.
+        
+        In normal mode, this is the same as sync().
+        
+        '''
+        
+        self.sync()
+        if not self.journal:
+            return
+        own = self.__acquire()
+        try:
+            if self.getGeneration() != self.__generation:
+                self.__update()
+            self.__append(dict(),set(),compact=1)
+            self.__nextGeneration()
+        finally:
+            self.__release(own)
+    
     
     
     def __save(self):
@@ -1270,27 +1699,20 @@ class Database(dict):
         
         Reading and saving of the database is done by cPickle-ing the dict(). 
         
-        @return: the filename of the backup database is returned
-        @rtype: string
+        The database is written to a temporary file first, and then moved into
+        place, so readers never see a partial database. 
         
         '''
         
-        backup_file = ''
-        if os.path.isfile(self.path):
-            i = 0
-            backup_file =  '%s_backup%i'%(self.path,i)
-            while os.path.isfile(backup_file):
-                i += 1
-                backup_file = '%s_backup%i'%(self.path,i)
-            subprocess.call(['mv %s %s'%(self.path,backup_file)],\
-                            shell=True)
-        #-- Write the file, dump the object
-        #dbfile = open(self.path,'w')
-        #portalocker.lock(dbfile, portalocker.LOCK_EX)
-        dbfile = self._open('w')
-        cPickle.dump(self,dbfile)
-        dbfile.close()
-        return backup_file
+        tmp_path = '%s_%i.tmp'%(self.path,os.getpid())
+        dbfile = open(tmp_path,'w')
+        try:
+            cPickle.dump(self,dbfile)
+            dbfile.flush()
+            os.fsync(dbfile.fileno())
+        finally:
+            dbfile.close()
+        os.rename(tmp_path,self.path)
             
     
     
@@ -1300,7 +1722,8 @@ class Database(dict):
         Open the database on the disk for writing, reading or appending access.
         
         A lock is added to the database, which remains in place until the file 
-        object is closed again. 
+        object is closed again. The lock is shared when reading, and exclusive
+        otherwise.
         
         @return: The opened file 
         @rtype: file()
@@ -1308,7 +1731,8 @@ class Database(dict):
         '''
         
         dbfile = open(self.path,mode)
-        portalocker.lock(dbfile, portalocker.LOCK_EX)
+        portalocker.lock(dbfile, mode == 'r' and portalocker.LOCK_SH \
+                                             or portalocker.LOCK_EX)
         return dbfile
         
     
@@ -1330,6 +1754,7 @@ class Database(dict):
         '''
         
         if key not in self.__changed: self.__changed.append(key)
+        self.__markStale([key])
     
     
     
@@ -1358,6 +1783,105 @@ class Database(dict):
         '''
         
         return self.__changed
+        
+        
+        
+    def __markStale(self,keys):
+        
+        '''
+        Mark keys as changed for all parameter indices of the database. 
+        
+        @param keys: The changed keys
+        @type keys: list
+        
+        '''
+        
+        for index in self.__indices.values():
+            index.markStale(keys)
+    
+    
+    
+    def __saveIndices(self,stamp):
+        
+        '''
+        Save all parameter indices to the hard disk, after re-indexing the
+        changed keys. 
+        
+        @param stamp: The generation of the database on the disk to which the
+                      indices correspond. 
+        @type stamp: tuple
+        
+        '''
+        
+        if stamp[1] is None: 
+            return
+        for name,index in self.__indices.items():
+            index.refresh(self)
+            index.save(getIndexFilename(self.path,name),stamp)
+    
+    
+    
+    def getIndex(self,name,keywords=None,exclude=[]):
+        
+        '''
+        Return a parameter index for the database, to find entries matching a
+        parameter set without comparing every entry. See DbIndex.
+        
+        The index is created upon the first call, from the version saved on 
+        the hard disk if it corresponds to the current database file, or by 
+        indexing all entries otherwise. Afterwards, it is updated for changed
+        keys only and saved with every sync().
+        
+        @param name: The name of the index, eg the subcode for which it is used
+        @type name: string
+        
+        @keyword keywords: The keywords to be indexed. If None, all keywords 
+                           present in the entries are indexed.
+                           
+                           (default: None)
+        @type keywords: list[string]
+        @keyword exclude: Keywords that are never indexed, only relevant if
+                          keywords is None.
+                          
+                          (default: [])
+        @type exclude: list[string]
+        
+        @return: The index
+        @rtype: DbIndex()
+        
+        '''
+        
+        if self.__indices.has_key(name):
+            return self.__indices[name]
+        index = DbIndex(name=name,keywords=keywords,exclude=exclude)
+        fn = getIndexFilename(self.path,name)
+        stamp = self.getGeneration()
+        if self.__changed or self.__deleted or stamp != self.__generation \
+                or not index.load(fn,stamp):
+            index.build(self)
+            if not self.__changed and not self.__deleted \
+                    and stamp == self.__generation:
+                index.save(fn,stamp)
+        self.__indices[name] = index
+        return index
+    
+    
+    
+    def reindex(self):
+        
+        '''
+        Rebuild all parameter indices of the database from scratch, and save 
+        them to the hard disk. 
+        
+        Only required if entries were changed on a deeper level without 
+        calling addChangedKey().
+        
+        '''
+        
+        for index in self.__indices.values():
+            index.build(self)
+        if not self.__changed and not self.__deleted: 
+            self.__saveIndices(self.getGeneration())
 
 
 
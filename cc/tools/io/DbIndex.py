@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+
+"""
+A parameter index for model databases.
+
+The modeling sessions check if a model has been calculated before by comparing
+the command list of the session with every entry in a Database(). A float
+parameter matches if it lies within 0.1% of the requested value, any other
+parameter has to be equal.
+
+A DbIndex keeps, for every keyword, a map of quantized values to the model ids
+that have such a value. Querying the index for a command list returns a small
+set of candidate model ids, which is a superset of the ids that would pass the
+full comparison. The candidates are then checked with the exact comparison,
+so the tolerance semantics of compareCommandLists are left unchanged.
+
+The index is saved next to the database, and updated incrementally for the
+keys that were changed in the Database(), either in memory or upon reading the
+version on the hard disk.
+
+Author: R. Lombaert
+
+"""
+
+import os
+import cPickle
+from math import log, floor, isinf, isnan
+
+
+
+#-- Relative tolerance used by ModelingSession.compareCommandLists, and the
+#   absolute tolerance used for values equal to zero.
+REL_TOL = 0.001
+ZERO_TOL = 1e-10
+
+#-- Width of a float bucket in natural log space (1%, larger than the
+#   relative tolerance such that at most a few buckets are queried).
+BUCKET_WIDTH = log(1.01)
+
+#-- Version of the index file layout. Index files with a different version are
+#   rebuilt.
+VERSION = 1
+
+
+
+def getIndexFilename(db_path,name):
+
+    '''
+    Return the filename of a database index saved to the hard disk.
+
+    @param db_path: The path to the database on the hard disk.
+    @type db_path: string
+    @param name: The name of the index
+    @type name: string
+
+    @return: The filename of the index
+    @rtype: string
+
+    '''
+
+    return '%s_index_%s'%(db_path,name)
+
+
+
+def getBuckets(value):
+
+    '''
+    Determine the buckets a database value is stored in.
+
+    Numerical values (anything float() accepts) go into logarithmic buckets
+    per sign. Values that are smaller than the tolerance for zero are also
+    added to the zero bucket. Non-finite values can never match and get their
+    own bucket. Other hashable values are bucketed on themselves, unhashable
+    values go into a wildcard bucket that is returned for any query.
+
+    @param value: The value of a keyword in a database entry
+    @type value: any
+
+    @return: The buckets
+    @rtype: list[tuple]
+
+    '''
+
+    try:
+        fval = float(value)
+    except (ValueError,TypeError):
+        try:
+            hash(value)
+        except TypeError:
+            return [('*',)]
+        return [('=',value)]
+    if isnan(fval) or isinf(fval):
+        return [('x',)]
+    buckets = []
+    if abs(fval) < ZERO_TOL:
+        buckets.append(('z',))
+    if fval != 0:
+        buckets.append(('f',fval > 0,int(floor(log(abs(fval))/BUCKET_WIDTH))))
+    return buckets
+
+
+
+def getQueryBuckets(value):
+
+    '''
+    Determine the buckets in which database values can be found that match a
+    given value, following the tolerance rules of compareCommandLists.
+
+    The neighbouring float buckets are included to guard against round-off at
+    the bucket edges. The wildcard bucket is always included.
+
+    @param value: The value of a keyword in a command list
+    @type value: any
+
+    @return: The buckets
+    @rtype: list[tuple]
+
+    '''
+
+    try:
+        fval = float(value)
+    except (ValueError,TypeError):
+        try:
+            hash(value)
+        except TypeError:
+            return [('*',)]
+        return [('=',value),('*',)]
+    if isnan(fval) or isinf(fval):
+        return []
+    if fval == 0:
+        return [('z',),('*',)]
+    lval = log(abs(fval))
+    ilow = int(floor((lval+log(1.-REL_TOL))/BUCKET_WIDTH))-1
+    iup = int(floor((lval+log(1.+REL_TOL))/BUCKET_WIDTH))+1
+    return [('f',fval > 0,i) for i in range(ilow,iup+1)] + [('*',)]
+
+
+
+class DbIndex(object):
+
+    '''
+    A parameter index for a Database() of model parameter dictionaries.
+
+    The index is either defined for a fixed list of keywords (e.g. the cooling
+    keywords), or for all keywords present in the database entries, minus an
+    optional list of excluded keywords (e.g. for MCMax).
+
+    A keyword that is absent from an entry is indexed in the absent bucket. An
+    entry only matches a command list that lacks the keyword if the entry
+    lacks it as well.
+
+    '''
+
+    def __init__(self,name,keywords=None,exclude=[]):
+
+        '''
+        Initializing a DbIndex.
+
+        The index is empty upon initialisation. Use build() or load() to fill
+        it.
+
+        @param name: The name of the index, used for the filename on the disk
+        @type name: string
+
+        @keyword keywords: The keywords to be indexed. If None, all keywords
+                           present in the entries are indexed.
+
+                           (default: None)
+        @type keywords: list[string]
+        @keyword exclude: Keywords that are never indexed, only relevant if
+                          keywords is None.
+
+                          (default: [])
+        @type exclude: list[string]
+
+        '''
+
+        self.name = name
+        self.all_keys = keywords is None
+        self.keywords = set(keywords or [])
+        self.exclude = set(exclude)
+        self.buckets = dict([(k,dict()) for k in self.keywords])
+        self.entries = dict()
+        self.stamp = None
+        self.__pending = set()
+
+
+
+    def __len__(self):
+
+        '''
+        The number of entries in the index.
+
+        '''
+
+        return len(self.entries)
+
+
+
+    def __add(self,key,bucket,entry_id):
+
+        '''
+        Add an entry id to a bucket of a keyword.
+
+        @param key: The keyword
+        @type key: string
+        @param bucket: The bucket
+        @type bucket: tuple
+        @param entry_id: The entry id
+        @type entry_id: string
+
+        '''
+
+        self.buckets[key].setdefault(bucket,set()).add(entry_id)
+
+
+
+    def __addKeyword(self,key):
+
+        '''
+        Start indexing a new keyword. All entries indexed so far are added to
+        the absent bucket of the keyword.
+
+        @param key: The keyword
+        @type key: string
+
+        '''
+
+        self.keywords.add(key)
+        self.buckets[key] = dict()
+        if self.entries:
+            self.buckets[key][('-',)] = set(self.entries.keys())
+        for sig in self.entries.values():
+            sig[key] = [('-',)]
+
+
+
+    def addEntry(self,entry_id,entry):
+
+        '''
+        Add an entry to the index. If the entry was already indexed, it is
+        removed first.
+
+        @param entry_id: The id of the entry in the database
+        @type entry_id: string
+        @param entry: The parameter dictionary of the entry
+        @type entry: dict
+
+        '''
+
+        if self.entries.has_key(entry_id):
+            self.removeEntry(entry_id)
+        if not isinstance(entry,dict):
+            return
+        if self.all_keys:
+            for key in entry.keys():
+                if key not in self.keywords and key not in self.exclude:
+                    self.__addKeyword(key)
+        sig = dict()
+        for key in self.keywords:
+            if entry.has_key(key):
+                sig[key] = getBuckets(entry[key])
+            else:
+                sig[key] = [('-',)]
+            for bucket in sig[key]:
+                self.__add(key,bucket,entry_id)
+        self.entries[entry_id] = sig
+
+
+
+    def removeEntry(self,entry_id):
+
+        '''
+        Remove an entry from the index, if present.
+
+        @param entry_id: The id of the entry in the database
+        @type entry_id: string
+
+        '''
+
+        sig = self.entries.pop(entry_id,None)
+        if sig is None:
+            return
+        for key,buckets in sig.items():
+            for bucket in buckets:
+                ids = self.buckets[key].get(bucket)
+                if ids is None:
+                    continue
+                ids.discard(entry_id)
+                if not ids:
+                    del self.buckets[key][bucket]
+
+
+
+    def build(self,db):
+
+        '''
+        (Re)build the full index from a database.
+
+        @param db: The database
+        @type db: Database()
+
+        '''
+
+        self.buckets = dict([(k,dict()) for k in self.keywords])
+        self.entries = dict()
+        self.__pending = set()
+        for k,v in db.items():
+            self.addEntry(k,v)
+
+
+
+    def markStale(self,keys):
+
+        '''
+        Remember keys of the database that have changed since the last update
+        of the index. They are re-indexed upon the next query.
+
+        @param keys: The changed keys
+        @type keys: list
+
+        '''
+
+        self.__pending.update(keys)
+
+
+
+    def refresh(self,db):
+
+        '''
+        Re-index the keys that were marked as stale.
+
+        @param db: The database
+        @type db: Database()
+
+        '''
+
+        for k in self.__pending:
+            if db.has_key(k):
+                self.addEntry(k,db[k])
+            else:
+                self.removeEntry(k)
+        self.__pending = set()
+
+
+
+    def query(self,db,this_list):
+
+        '''
+        Return the ids of all database entries that can match a command list.
+
+        The returned ids are sorted, as with a regular scan over the sorted
+        database keys. Every id still needs to be checked with the exact
+        comparison. Any id not returned is guaranteed to fail that comparison.
+
+        @param db: The database, used to re-index stale entries
+        @type db: Database()
+        @param this_list: The parameters in this modeling session
+        @type this_list: dict
+
+        @return: The candidate ids
+        @rtype: list[string]
+
+        '''
+
+        self.refresh(db)
+
+        #-- In the all keys case, a keyword that is not present in any entry
+        #   can never give a match.
+        if self.all_keys:
+            for key in this_list.keys():
+                if key not in self.keywords and key not in self.exclude:
+                    return []
+
+        #-- Collect the bucket sets per keyword.
+        selection = []
+        for key in self.keywords:
+            if this_list.has_key(key):
+                qbuckets = getQueryBuckets(this_list[key])
+            else:
+                qbuckets = [('-',)]
+            sets = [self.buckets[key][b]
+                    for b in qbuckets
+                    if self.buckets[key].has_key(b)]
+            if not sets:
+                return []
+            selection.append((sum([len(s) for s in sets]),sets))
+
+        if not selection:
+            return sorted(self.entries.keys())
+
+        #-- Intersect, starting from the most selective keyword, so every step
+        #   scales with the number of remaining candidates.
+        selection.sort(key=lambda x: x[0])
+        candidates = set().union(*selection[0][1])
+        for size,sets in selection[1:]:
+            if len(sets) == 1:
+                candidates &= sets[0]
+            else:
+                candidates = set().union(*[candidates & s for s in sets])
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+
+
+    def load(self,fn,stamp):
+
+        '''
+        Load the index from the hard disk.
+
+        The index is only accepted if it was saved for the same state of the
+        database file, and with the same keyword definitions.
+
+        @param fn: The filename of the index
+        @type fn: string
+        @param stamp: The state of the database file on the disk.
+        @type stamp: tuple
+
+        @return: Was the index loaded successfully?
+        @rtype: bool
+
+        '''
+
+        try:
+            idxfile = open(fn,'rb')
+            try:
+                saved = cPickle.load(idxfile)
+            finally:
+                idxfile.close()
+        except (IOError,EOFError,ValueError,TypeError,cPickle.UnpicklingError):
+            return False
+        if not isinstance(saved,dict) or saved.get('version') != VERSION \
+                or saved.get('stamp') != stamp \
+                or saved.get('all_keys') != self.all_keys \
+                or saved.get('exclude') != self.exclude \
+                or (not self.all_keys and saved['keywords'] != self.keywords):
+            return False
+        self.keywords = saved['keywords']
+        self.buckets = saved['buckets']
+        self.entries = saved['entries']
+        self.stamp = stamp
+        self.__pending = set()
+        return True
+
+
+
+    def save(self,fn,stamp):
+
+        '''
+        Save the index to the hard disk.
+
+        The file is written to a temporary file first, and then moved into
+        place, so a concurrent load never reads a partial index.
+
+        @param fn: The filename of the index
+        @type fn: string
+        @param stamp: The state of the database file on the disk to which the
+                      index corresponds.
+        @type stamp: tuple
+
+        '''
+
+        saved = {'version':VERSION,'stamp':stamp,'all_keys':self.all_keys,\
+                 'exclude':self.exclude,'keywords':self.keywords,\
+                 'buckets':self.buckets,'entries':self.entries}
+        tmp_fn = '%s_%i.tmp'%(fn,os.getpid())
+        idxfile = open(tmp_fn,'wb')
+        try:
+            cPickle.dump(saved,idxfile,cPickle.HIGHEST_PROTOCOL)
+        finally:
+            idxfile.close()
+        os.rename(tmp_fn,fn)
+        self.stamp = stamp
+
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+A memory-bounded cache for data read from model output files.
+
+Model output, such as MCMax denstemp.dat files or GASTRoNOoM cooling output, is
+typically read many times in a single session, e.g. by plotting and statistics
+routines. The FileCache remembers what was read from a file, keyed by the path
+of the file, its modification time and size, and a description of what was
+read. When a file changes on the hard disk, the old entries no longer match
+and the file is read anew.
+
+The cache is bounded in memory. Once the estimated size of all entries exceeds
+the maximum, the least recently used entries are removed.
+
+Author: R. Lombaert
+
+"""
+
+import os
+from collections import OrderedDict
+
+
+
+class FileCache(object):
+
+    """
+    A least-recently-used cache for data read from files.
+
+    """
+
+    def __init__(self,max_bytes=256*2**20):
+
+        """
+        Initializing a FileCache instance.
+
+        @keyword max_bytes: The maximum estimated memory use of the cache in
+                            bytes.
+
+                            (default: 256*2**20)
+        @type max_bytes: int
+
+        """
+
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+
+
+    def __len__(self):
+
+        '''
+        The number of entries in the cache.
+
+        @return: The number of entries
+        @rtype: int
+
+        '''
+
+        return len(self.__entries)
+
+
+
+    def getFileKey(self,filename):
+
+        '''
+        Return the part of the cache key that identifies a file, i.e. its
+        absolute path, modification time and size.
+
+        @param filename: The filename
+        @type filename: string
+
+        @return: The key, or None if the file does not exist.
+        @rtype: tuple
+
+        '''
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return (os.path.abspath(filename),stat.st_mtime,stat.st_size)
+
+
+
+    def get(self,filename,key,func,size=None):
+
+        '''
+        Return the data read from a file, from the cache if possible.
+
+        If the data are not cached, func() is called, and its result is cached.
+        If the file does not exist, func() is called without caching, such
+        that the usual errors are raised.
+
+        The cached object itself is returned. The caller should not change it,
+        or should return a copy.
+
+        @param filename: The file from which the data are read
+        @type filename: string
+        @param key: The description of the data read from the file, e.g. the
+                    keyword and the arguments of the read function
+        @type key: tuple
+        @param func: Function without arguments that reads the data
+        @type func: function
+
+        @keyword size: The estimated memory use of the data in bytes. If None,
+                       it is estimated from the data itself.
+
+                       (default: None)
+        @type size: int
+
+        @return: The data
+        @rtype: any
+
+        '''
+
+        file_key = self.getFileKey(filename)
+        if file_key is None:
+            return func()
+        full_key = file_key + tuple(key)
+        if self.__entries.has_key(full_key):
+            self.hits += 1
+            value, nbytes = self.__entries.pop(full_key)
+            self.__entries[full_key] = (value,nbytes)
+            return value
+
+        self.misses += 1
+        value = func()
+        if size is None:
+            size = estimateSize(value)
+        self.__entries[full_key] = (value,size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and len(self.__entries) > 1:
+            old_value, old_size = self.__entries.popitem(last=False)[1]
+            self.nbytes -= old_size
+        return value
+
+
+
+    def clear(self):
+
+        '''
+        Remove all entries from the cache.
+
+        '''
+
+        self.__entries.clear()
+        self.nbytes = 0
+
+
+
+def estimateSize(value):
+
+    '''
+    Estimate the memory use of data read from a file.
+
+    Arrays, and other objects that know their size in bytes, are counted by
+    their data, lists and tuples by their elements, with an overhead per
+    element. Anything else is counted as a small object.
+
+    @param value: The data
+    @type value: any
+
+    @return: The estimated memory use in bytes
+    @rtype: int
+
+    '''
+
+    if hasattr(value,'nbytes'):
+        return value.nbytes + 100
+    if isinstance(value,(list,tuple)):
+        if not value:
+            return 72
+        #-- Lines of a file are estimated from the first few lines.
+        sample = value[:10]
+        per_item = sum([estimateSize(v) for v in sample])/len(sample)
+        return 72 + len(value)*(8+per_item)
+    if isinstance(value,str):
+        return 40 + len(value)
+    return 24
+
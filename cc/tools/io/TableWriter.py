@@ -123,7 +123,7 @@ def writeIntIntTable(filename,stars,trans,instrument='PACS',ddict=dict(),\
         for ifn in range(len(ddict[star].data_filenames)):
             ddict[star].intIntMatch(trans,ifn)
     
-    istars = [DataIO.getInputData().index(star) for star in stars]
+    istars = [DataIO.getInputIndex(star) for star in stars]
     pstars = [DataIO.getInputData(keyword='STAR_NAME_PLOTS',rindex=istar)
               for istar in istars]
     pstars = [s.replace('_',' ') for s in pstars]
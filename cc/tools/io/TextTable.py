@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+
+"""
+A binary columnar copy of text output from model codes.
+
+Model output of MCMax and GASTRoNOoM is written as whitespace separated text,
+which is slow to parse when it is read many times, e.g. for every model in a
+grid that is plotted. A TextTable holds the content of such a file as arrays:
+every token that can be converted to a float is kept in a 2d float array, and
+the lines that are not entirely numerical, such as headers, are kept as text.
+
+On first access, the table is written to a sidecar file in numpy .npz format.
+Later sessions load the sidecar instead of parsing the text, as long as the
+sidecar is newer than the text file. The sidecars are kept in a hidden folder
+next to the text file, such that searches for output files with wildcards in
+the model folders do not find them.
+
+The methods of the TextTable mirror the corresponding text methods in DataIO,
+and give the same results. When a result cannot be guaranteed to be the same,
+e.g. because a keyword may appear in a numerical line, None is returned and
+the caller reads the text file instead.
+
+Author: R. Lombaert
+
+"""
+
+import os
+import numpy as np
+
+
+
+#-- Version of the sidecar layout. Sidecars with a different version are
+#   rebuilt.
+VERSION = 1
+
+#-- The hidden folder, next to the text file, that contains the sidecars.
+SIDECAR_FOLDER = '.cc_cache'
+
+#-- Characters that may appear in a line of floats. A keyword made only of
+#   these characters could be found in a numerical line.
+FLOAT_CHARS = set('0123456789.+-EDNAIFTY ')
+
+
+
+def getSidecarFilename(filename):
+
+    '''
+    Return the filename of the binary sidecar of a text file.
+
+    @param filename: The filename of the text file
+    @type filename: string
+
+    @return: The filename of the sidecar
+    @rtype: string
+
+    '''
+
+    path,fn = os.path.split(os.path.abspath(filename))
+    return os.path.join(path,SIDECAR_FOLDER,fn+'.npz')
+
+
+
+def convertToken(token):
+
+    '''
+    Convert a token to a float, allowing for fortran double notation.
+
+    @param token: The token
+    @type token: string
+
+    @return: The float, and whether double notation was used. The float is
+             None if the token is not a number.
+    @rtype: (float,bool)
+
+    '''
+
+    try:
+        return float(token), False
+    except ValueError:
+        pass
+    try:
+        return float(token.replace('D+','E+').replace('D-','E-')), True
+    except ValueError:
+        return None, False
+
+
+
+class TextTable(object):
+
+    """
+    The content of a whitespace separated text file in columnar form.
+
+    Row i of the table corresponds to row i of DataIO.readFile(filename,' '),
+    i.e. empty lines are not counted.
+
+    """
+
+    def __init__(self,values,valid,ntokens,dexp,text_rows,text):
+
+        """
+        Initializing a TextTable instance.
+
+        Use TextTable.read or TextTable.load to create a table from a file.
+
+        @param values: The float value of every token. NaN if the token is not
+                       a number, or if the row is shorter.
+        @type values: array[nrows,ncols]
+        @param valid: Whether the token is a number, allowing for double
+                      notation
+        @type valid: array[nrows,ncols]
+        @param ntokens: The number of tokens in every row
+        @type ntokens: array[nrows]
+        @param dexp: Whether a row contains numbers in double notation
+        @type dexp: array[nrows]
+        @param text_rows: The indices of rows that are not entirely numerical
+        @type text_rows: array
+        @param text: The content of these rows, tokens joined by single spaces
+        @type text: list[string]
+
+        """
+
+        self.values = values
+        self.valid = valid
+        self.ntokens = ntokens
+        self.dexp = dexp
+        self.text_rows = text_rows
+        self.text = text
+        self.numeric = np.ones(len(ntokens),dtype=bool)
+        self.numeric[text_rows] = False
+
+
+
+    def __len__(self):
+
+        '''
+        The number of rows in the table.
+
+        @return: The number of rows
+        @rtype: int
+
+        '''
+
+        return len(self.ntokens)
+
+
+
+    def getNbytes(self):
+
+        '''
+        Estimate the memory use of the table.
+
+        @return: The memory use in bytes
+        @rtype: int
+
+        '''
+
+        return self.values.nbytes + self.valid.nbytes + self.ntokens.nbytes \
+                + self.dexp.nbytes + self.text_rows.nbytes \
+                + sum([40+len(t) for t in self.text])
+
+    nbytes = property(getNbytes)
+
+
+
+    @classmethod
+    def read(cls,filename):
+
+        '''
+        Parse a text file into a table.
+
+        @param filename: The filename of the text file
+        @type filename: string
+
+        @return: The table
+        @rtype: TextTable()
+
+        '''
+
+        FILE = open(filename,'r')
+        lines = [line.split() for line in FILE]
+        FILE.close()
+        lines = [line for line in lines if line]
+
+        nrows = len(lines)
+        ntokens = np.array([len(line) for line in lines],dtype=int)
+        ncols = nrows and ntokens.max() or 0
+        values = np.empty((nrows,ncols))
+        values.fill(np.nan)
+        valid = np.zeros((nrows,ncols),dtype=bool)
+        dexp = np.zeros(nrows,dtype=bool)
+        text_rows = []
+        text = []
+        for i,line in enumerate(lines):
+            #-- Most lines are plain floats. Only check tokens one by one if
+            #   that fails.
+            try:
+                values[i,:len(line)] = [float(t) for t in line]
+                valid[i,:len(line)] = True
+                continue
+            except ValueError:
+                pass
+            numeric = True
+            for j,t in enumerate(line):
+                val,is_dexp = convertToken(t)
+                if val is None:
+                    numeric = False
+                    continue
+                values[i,j] = val
+                valid[i,j] = True
+                dexp[i] = dexp[i] or is_dexp
+            if not numeric:
+                text_rows.append(i)
+                text.append(' '.join(line))
+        return cls(values,valid,ntokens,dexp,np.array(text_rows,dtype=int),\
+                   text)
+
+
+
+    @classmethod
+    def load(cls,filename,write=1):
+
+        '''
+        Load the table of a text file from its sidecar, if the sidecar is
+        newer than the text file. Otherwise, parse the text file and write
+        the sidecar.
+
+        Failing to write the sidecar, e.g. in a read-only folder, is not an
+        error.
+
+        @param filename: The filename of the text file
+        @type filename: string
+
+        @keyword write: Write the sidecar if it is missing or outdated
+
+                        (default: 1)
+        @type write: bool
+
+        @return: The table
+        @rtype: TextTable()
+
+        '''
+
+        if not os.path.isfile(filename):
+            raise IOError('File %s not found.'%filename)
+        sidecar = getSidecarFilename(filename)
+        mtime = os.path.getmtime(filename)
+        if os.path.isfile(sidecar) and os.path.getmtime(sidecar) > mtime:
+            try:
+                npz = np.load(sidecar)
+                try:
+                    if int(npz['version']) == VERSION:
+                        return cls(npz['values'],npz['valid'],\
+                                   npz['ntokens'],npz['dexp'],\
+                                   npz['text_rows'],\
+                                   [str(t) for t in npz['text']])
+                finally:
+                    npz.close()
+            except (IOError,ValueError,KeyError):
+                pass
+
+        table = cls.read(filename)
+        if write:
+            table.save(sidecar)
+        return table
+
+
+
+    def save(self,sidecar):
+
+        '''
+        Write the table to a sidecar file.
+
+        The table is written to a temporary file first, which is then moved,
+        such that other sessions never read a partial sidecar.
+
+        @param sidecar: The filename of the sidecar
+        @type sidecar: string
+
+        @return: Whether the sidecar was written
+        @rtype: bool
+
+        '''
+
+        tmp = '%s.%i.tmp'%(sidecar,os.getpid())
+        try:
+            folder = os.path.dirname(sidecar)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            FILE = open(tmp,'wb')
+            np.savez(FILE,version=np.array(VERSION),values=self.values,\
+                     valid=self.valid,ntokens=self.ntokens,dexp=self.dexp,\
+                     text_rows=self.text_rows,\
+                     text=np.array(self.text or [''])[:len(self.text)])
+            FILE.close()
+            os.rename(tmp,sidecar)
+        except (IOError,OSError):
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+
+
+    def findKey(self,key,start=0):
+
+        '''
+        Find the index of the first row from start that contains a keyword.
+
+        The search is case-insensitive, as DataIO.findKey.
+
+        @param key: The keyword
+        @type key: string
+
+        @keyword start: The index of the row where the search starts
+
+                        (default: 0)
+        @type start: int
+
+        @return: The index of the row. None if the keyword could also appear
+                 in a numerical row.
+        @rtype: int
+
+        '''
+
+        key = key.upper()
+        if set(key) <= FLOAT_CHARS:
+            return None
+        for i,t in zip(self.text_rows,self.text):
+            if i >= start and t.upper().find(key) != -1:
+                return int(i)
+        #-- DataIO.findKey runs off the end of the file in this case.
+        raise IndexError('Keyword %s not found.'%key)
+
+
+
+    def getText(self,i,j):
+
+        '''
+        Return the text of the rows from i up to j, which must all be text
+        rows.
+
+        @param i: The first row
+        @type i: int
+        @param j: The row after the last row
+        @type j: int
+
+        @return: The text of the rows
+        @rtype: list[string]
+
+        '''
+
+        k = np.searchsorted(self.text_rows,i)
+        return self.text[k:k+j-i]
+
+
+
+    def findString(self,index,col=0):
+
+        '''
+        Starting from index, find the index of the next row of which the token
+        in a column is not a number, as DataIO.findString does for the first
+        column.
+
+        @param index: The index of the row where the search starts
+        @type index: int
+
+        @keyword col: The column
+
+                      (default: 0)
+        @type col: int
+
+        @return: The index of the row, or the number of rows if no such row
+                 is found
+        @rtype: int
+
+        '''
+
+        hits = np.flatnonzero(~self.valid[index:,col])
+        if hits.size:
+            return int(index+hits[0])
+        return len(self)
+
+
+
+    def findFloat(self,index,col=0):
+
+        '''
+        Starting from index, find the index of the next row of which the token
+        in a column is a number, as DataIO.findFloat does for the first
+        column.
+
+        @param index: The index of the row where the search starts
+        @type index: int
+
+        @keyword col: The column
+
+                      (default: 0)
+        @type col: int
+
+        @return: The index of the row, or the number of rows if no such row
+                 is found
+        @rtype: int
+
+        '''
+
+        hits = np.flatnonzero(self.valid[index:,col])
+        if hits.size:
+            return int(index+hits[0])
+        return len(self)
+
+
+
+    def getColumn(self,col,i=0,j=None,dexp=1):
+
+        '''
+        Return the floats in a column for a range of rows.
+
+        @param col: The column
+        @type col: int
+
+        @keyword i: The first row
+
+                    (default: 0)
+        @type i: int
+        @keyword j: The row after the last row. Up to the last row if None.
+
+                    (default: None)
+        @type j: int
+        @keyword dexp: Allow numbers in double notation
+
+                       (default: 1)
+        @type dexp: bool
+
+        @return: The floats. None if a token in the column is missing or is
+                 not a number.
+        @rtype: array
+
+        '''
+
+        if col >= self.values.shape[1]:
+            return None if self.ntokens[i:j].size else np.empty(0)
+        if not self.valid[i:j,col].all():
+            return None
+        if not dexp and self.dexp[i:j].any():
+            return None
+        return self.values[i:j,col].copy()
+
+
+
+    def getColumns(self,i=0,j=None):
+
+        '''
+        Return the columns of a range of rows that are entirely numerical, as
+        DataIO.readCols does for such rows.
+
+        The number of columns is the minimum number of tokens in a row.
+
+        @keyword i: The first row
+
+                    (default: 0)
+        @type i: int
+        @keyword j: The row after the last row. Up to the last row if None.
+
+                    (default: None)
+        @type j: int
+
+        @return: The columns. None if a row is not entirely numerical, if
+                 double notation is used, or if there are no rows.
+        @rtype: list[array]
+
+        '''
+
+        ntokens = self.ntokens[i:j]
+        if not ntokens.size or not self.numeric[i:j].all() \
+                or self.dexp[i:j].any():
+            return None
+        return [col.copy() for col in self.values[i:j,:ntokens.min()].T]
+
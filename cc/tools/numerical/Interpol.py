@@ -7,10 +7,12 @@ Author: R. Lombaert
 
 """
 
+import numpy as np
 from scipy import array, hstack
 from scipy import exp
 from scipy.optimize import leastsq
 from scipy import isnan
+from scipy.interpolate import BSpline
 
 from cc.plotting import Plotting2
 
@@ -154,3 +156,65 @@ def linInterpol(x_in,y_in,x):
         print 'Identical x-coordinates were submitted: Division by zero. ' + \
               'Aborting.'
         return
+
+
+
+def stackSplines(splines):
+
+    """
+    Combine univariate splines into a single vector-valued spline, such that 
+    all of them can be evaluated in one call with evalSplineStack. 
+    
+    This is only possible if the splines share their knots, degree and 
+    extrapolation mode, e.g. interpolating splines (scipy's 
+    InterpolatedUnivariateSpline) for different quantities on the same x-grid.
+    Only extrapolation modes 0 (extrapolate) and 3 (boundary value) are 
+    supported.
+    
+    @param splines: The splines
+    @type splines: list[UnivariateSpline]
+    
+    @return: The combined spline and the x-range outside of which the boundary
+             value is returned. None if the splines cannot be combined.
+    @rtype: (BSpline,float,float)
+    
+    """
+    
+    if not splines:
+        return None
+    t,c,k = splines[0]._eval_args
+    ext = splines[0].ext
+    if ext not in [0,3]:
+        return None
+    for spl in splines[1:]:
+        if spl._eval_args[2] != k or spl.ext != ext \
+                or not np.array_equal(spl._eval_args[0],t):
+            return None
+    
+    #-- FITPACK pads the coefficients with k+1 zeros.
+    n = len(t)-k-1
+    coeffs = np.array([spl._eval_args[1][:n] for spl in splines])
+    bspl = BSpline(t,coeffs.T,k,extrapolate=True)
+    if ext == 3:
+        return (bspl,t[k],t[n])
+    return (bspl,-np.inf,np.inf)
+    
+    
+
+def evalSplineStack(stack,x):
+
+    """
+    Evaluate all splines combined by stackSplines.
+    
+    @param stack: The combined spline, as returned by stackSplines
+    @type stack: (BSpline,float,float)
+    @param x: The x values
+    @type x: array
+    
+    @return: The values of every spline, with shape (n_splines,len(x))
+    @rtype: array
+    
+    """
+    
+    bspl,xmin,xmax = stack
+    return bspl(np.clip(x,xmin,xmax)).T
@@ -30,4 +30,46 @@ def diff_central(y,x):
     z2 = np.hstack((y[1:], y[-1]))
     dx1 = np.hstack((0, np.diff(x)))
     dx2 = np.hstack((np.diff(x), 0))
-    return (z2-z1) / (dx2+dx1)
\ No newline at end of file
+    return (z2-z1) / (dx2+dx1)
+
+
+
+def findNearest(grid,values):
+
+    '''
+    Find the index of the grid point nearest to each of the values.
+    
+    The result is the same as argmin(abs(grid-value)) for every value, i.e. 
+    the first index is taken in case of a tie, but found through a binary 
+    search on the sorted grid. The grid does not have to be sorted. If it 
+    contains the same value more than once, argmin is used.
+    
+    @param grid: The grid
+    @type grid: array
+    @param values: The values
+    @type values: array
+    
+    @return: The index of the nearest grid point, for every value
+    @rtype: array[int]
+
+    '''
+    
+    grid = np.asarray(grid,dtype=float)
+    values = np.asarray(values,dtype=float)
+    order = np.argsort(grid,kind='mergesort')
+    sgrid = grid[order]
+    if grid.size < 2 or not np.isfinite(grid).all() \
+            or np.any(sgrid[1:] == sgrid[:-1]):
+        return np.array([np.argmin(abs(grid-v)) for v in values.ravel()],\
+                        dtype=int).reshape(values.shape)
+    
+    #-- Compare the grid points on either side of every value. 
+    i = np.clip(np.searchsorted(sgrid,values),1,grid.size-1)
+    left = values - sgrid[i-1]
+    right = sgrid[i] - values
+    ilow, ihigh = order[i-1], order[i]
+    nearest = np.where(right < left, ihigh, ilow)
+    nearest = np.where(right == left, np.minimum(ilow,ihigh), nearest)
+    
+    #-- argmin gives the first index for NaNs
+    return np.where(np.isnan(values),0,nearest)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+"""
+A class for reading and managing Chemistry output.
+
+Author: M. Van de Sande
+
+"""
+
+import os
+from collections import OrderedDict
+import numpy as np
+
+from cc.tools.readers.Reader import Reader
+from cc.tools.io import DataIO
+
+
+
+class ChemistryReader(Reader):
+
+    '''
+    A Reader for the output of a Chemistry model.
+
+    The output files are found in the model folder:
+        - csphyspar.out: The physical parameters as a function of radius
+        - csfrac.out: The fractional abundances of all species with respect to
+          H2 as a function of radius
+        - csnum.out: The number densities of all species as a function of
+          radius
+        - analyse.out: The main formation and destruction pathways of the
+          species at one radius, if the analyse routine was performed.
+
+    The first three files are given in blocks, each with a line of column
+    names, e.g. RADIUS and a number of species, followed by one row per
+    radius. All blocks are collected into named arrays. The files are read
+    through DataIO.readTable, which keeps a binary columnar copy of the file
+    next to it, such that a grid of models is read fast after the first time.
+
+    The abundances are kept as a single 2d array per file, with one row per
+    species and one column per radius, in self['frac_array'] and
+    self['num_array']. The species in self['frac'] and self['num'] are views
+    of these rows.
+
+    '''
+
+    def __init__(self,fn,*args,**kwargs):
+
+        '''
+        Creating a Chemistry Reader object ready for reading Chemistry output.
+
+        Additional args and kwargs are passed to the dict creation (parent of
+        Reader)
+
+        @param fn: The model folder that contains the output files of the
+                   Chemistry model.
+        @type fn: string
+
+        '''
+
+        super(ChemistryReader, self).__init__(fn=fn,*args,**kwargs)
+        self.read()
+
+
+
+    def read(self):
+
+        '''
+        Read the physical parameters and the abundances of the Chemistry
+        model. Files that are not present are skipped.
+
+        The analyse output is read upon request, see getAnalyse.
+
+        '''
+
+        #-- The physical parameters, with column names as keys
+        fn = os.path.join(self.fn,'csphyspar.out')
+        if os.path.isfile(fn):
+            self['physpar'] = readNamedColumns(fn)
+        else:
+            self['physpar'] = OrderedDict()
+
+        #-- The abundances: one row per species in one 2d array
+        for key,fn in [('frac','csfrac.out'),('num','csnum.out')]:
+            fn = os.path.join(self.fn,fn)
+            cols = readNamedColumns(fn) if os.path.isfile(fn) else dict()
+            species = [k for k in cols.keys() if k.upper() != 'RADIUS']
+            if species:
+                self[key+'_array'] = np.array([cols[k] for k in species])
+            else:
+                self[key+'_array'] = np.empty((0,0))
+            self[key] = OrderedDict(zip(species,self[key+'_array']))
+
+
+
+    def getPhysPar(self,keyword='RADIUS'):
+
+        '''
+        Return a physical parameter as a function of radius.
+
+        @keyword keyword: The name of the parameter, as in csphyspar.out, e.g.
+                          RADIUS, TEMP, VELOCITY, A_V, COK(PHOT). Not case
+                          sensitive.
+
+                          (default: 'RADIUS')
+        @type keyword: str
+
+        @return: The parameter
+        @rtype: array
+
+        '''
+
+        for k,v in self['physpar'].items():
+            if k.upper() == keyword.upper():
+                return v
+        raise KeyError('Physical parameter %s unknown. Choose from %s.'\
+                       %(keyword,', '.join(self['physpar'].keys())))
+
+
+
+    def getRadius(self):
+
+        '''
+        Return the radial grid of the model in cm.
+
+        @return: The radius
+        @rtype: array
+
+        '''
+
+        return self.getPhysPar('RADIUS')
+
+
+
+    def getSpecies(self,frac=1):
+
+        '''
+        Return the names of the species for which abundances are given.
+
+        @keyword frac: The species of the fractional abundances, or of the
+                       number densities.
+
+                       (default: 1)
+        @type frac: bool
+
+        @return: The species, in the order of the rows of the abundance array
+        @rtype: list[str]
+
+        '''
+
+        return self['frac' if frac else 'num'].keys()
+
+
+
+    def getAbundances(self,species=None,frac=1):
+
+        '''
+        Return the abundances as a function of radius.
+
+        @keyword species: The species. If None, a dictionary with all species
+                          is returned. If a list, an array with one row per
+                          species is returned.
+
+                          (default: None)
+        @type species: str/list[str]
+        @keyword frac: Return the fractional abundances with respect to H2
+                       (csfrac.out), otherwise the number densities
+                       (csnum.out).
+
+                       (default: 1)
+        @type frac: bool
+
+        @return: The abundances of the species
+        @rtype: dict/array
+
+        '''
+
+        key = 'frac' if frac else 'num'
+        if species is None:
+            return self[key]
+        if isinstance(species,str):
+            return self[key][species]
+        return np.array([self[key][s] for s in species])
+
+
+
+    def getAnalyse(self):
+
+        '''
+        Return the output of the analyse routine, read from analyse.out.
+
+        The file is read once, and kept for the rest of the session.
+
+        @return: The radius of the analysis (key 'radius'), and for every
+                 species (e.g. key 'SiO') a dictionary with the main pathways
+                 (key 'MAIN', one list of strings per reaction), the
+                 destruction rate (key 'DRATE') and the production rate
+                 (key 'PRATE').
+        @rtype: dict
+
+        '''
+
+        if not self.has_key('analyse'):
+            self['analyse'] = readAnalyse(os.path.join(self.fn,'analyse.out'))
+        return self['analyse']
+
+
+
+def readNamedColumns(filename):
+
+    '''
+    Read a file of blocks with named columns, such as the Chemistry output.
+
+    Every block consists of a line with column names, followed by lines with
+    one number per column. Columns that are repeated in different blocks,
+    such as the radius, are taken from the first block.
+
+    The file is read with DataIO.readTable.
+
+    @param filename: The filename
+    @type filename: str
+
+    @return: The columns by name
+    @rtype: dict(str: array)
+
+    '''
+
+    table = DataIO.readTable(filename)
+    columns = OrderedDict()
+    ends = list(table.text_rows[1:]) + [len(table)]
+    for i,end,header in zip(table.text_rows,ends,table.text):
+        names = header.split()
+
+        #-- Skip titles, which are not followed by numbers
+        if end <= i+1 or table.ntokens[i+1:end].min() != len(names):
+            continue
+        for j,name in enumerate(names):
+            col = table.getColumn(j,i+1,end)
+            if not col is None and not columns.has_key(name):
+                columns[name] = col
+    return columns
+
+
+
+def readAnalyse(filename):
+
+    '''
+    Read the output of the Chemistry analyse routine.
+
+    The first line gives the radius of the analysis. Every species starts
+    with a line of two words, the second of which is the species name
+    preceded by one character. The lines that follow give the main reactions,
+    and the last line of the species gives the destruction and production
+    rates as the second and fourth words.
+
+    @param filename: The filename of analyse.out
+    @type filename: str
+
+    @return: The analyse output, see ChemistryReader.getAnalyse
+    @rtype: dict
+
+    '''
+
+    data = DataIO.readCachedFile(filename)
+
+    #-- Determine and save routine radius
+    analyse = dict()
+    analyse['radius'] = float(data[0][-2])
+    index = [i for i,line in enumerate(data) if len(line) == 2]
+
+    #-- Save analyse routine output in dictionary per molecule
+    for i0,i1 in zip(index[:-1],index[1:]):
+        name = data[i0][1][1:]
+        analyse[name] = dict()
+        analyse[name]['MAIN'] = [list(line) for line in data[i0+1:i1-1]]
+        analyse[name]['DRATE'] = data[i1-1][1]
+        analyse[name]['PRATE'] = data[i1-1][3]
+
+    return analyse
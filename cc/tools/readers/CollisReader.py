@@ -12,6 +12,7 @@ import numpy as np
 
 from cc.tools.readers.SpectroscopyReader import SpectroscopyReader
 from cc.tools.io import DataIO
+from cc.tools.numerical import Interpol
 
 import matplotlib.pyplot as p
 
@@ -329,8 +330,8 @@ class CollisReader(SpectroscopyReader):
         #-- Set the indices: 
         if index is None:
             index = range(1,self['pars']['ncoll_trans']+1)
-        elif not isinstance(indices,collections.Iterable) \
-                or isinstance(indices,str):
+        elif not isinstance(index,collections.Iterable) \
+                or isinstance(index,str):
             index = [index]
                 
         self['icoll'] = dict()
@@ -340,6 +341,14 @@ class CollisReader(SpectroscopyReader):
             self['icoll'][i] = interp(x=self['coll_temp'],\
                                       y=self.get('coll_trans','rates',i),\
                                       *args,**kwargs)
+        
+        #-- The splines of all transitions share their knots. Combine them so
+        #   all transitions can be evaluated at once with evalInterp.
+        self['icoll_stack'] = None
+        if interp == spline1d:
+            self['icoll_index'] = np.array(sorted(index),dtype=int)
+            self['icoll_stack'] = Interpol.stackSplines([self['icoll'][i] 
+                                            for i in self['icoll_index']])
             
             
     
@@ -360,6 +369,45 @@ class CollisReader(SpectroscopyReader):
         return self['icoll'][index]
         
         
+    
+    def evalInterp(self,T,index=None):
+    
+        '''
+        Evaluate the collision rate interpolators for a set of transition 
+        indices.
+        
+        If spline interpolation is used, all transitions are evaluated in a 
+        single call. A KeyError is raised for indices without interpolator.
+        
+        @param T: The temperatures in K
+        @type T: array
+        
+        @keyword index: The transition indices. If None, all transitions for 
+                        which an interpolator was set are returned.
+        
+                        (default: None)
+        @type index: list/array
+        
+        @return: The collision rates (in cm^3 s^-1), with shape 
+                 (len(index),len(T))
+        @rtype: array
+        
+        '''
+        
+        if index is None: 
+            index = sorted(self['icoll'].keys())
+        if not self.has_key('icoll_stack') or self['icoll_stack'] is None:
+            return np.array([self.getInterp(i)(T) for i in index])
+        index = np.array(index,dtype=int)
+        known = np.in1d(index,self['icoll_index'])
+        if not known.all():
+            raise KeyError('No interpolator set for transition indices %s.'\
+                           %', '.join([str(i) for i in index[~known]]))
+        rates = Interpol.evalSplineStack(self['icoll_stack'],T)
+        rows = np.searchsorted(self['icoll_index'],index)
+        return rates[rows]
+        
+        
         
     def plotCollis(self,fn=None,indices=None):
     
@@ -164,8 +164,8 @@ class LPDataReader(Reader):
         """
         
         try:
-            star_index = DataIO.getInputData(keyword='STAR_NAME')\
-                                            .index(self.star_name)
+            star_index = DataIO.getInputIndex(self.star_name,\
+                                              keyword='STAR_NAME')
             vlsr = DataIO.getInputData(keyword='V_LSR',rindex=star_index)
         except KeyError,ValueError: 
             print 'Star not found in Star.dat for %s. '%(self.fn) + \
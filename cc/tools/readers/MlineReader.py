@@ -199,11 +199,15 @@ class MlineReader(MolReader,PopReader):
         #      given in self['props']['P']. Converted to cgs it is 
         #      given in self['props']['P_cm']. 
         #
-        #-- Define the function that reads the fixed-format file per block
+        #   4) The file is read once. Every block is kept as a single 2d array
+        #      in self['ml3'], with one row per index, and one column per 
+        #      impact parameter. The per-index arrays are views of the rows.
+        #
+        #-- Define the function that reads the fixed-format lines per block
         def readBlock(N_block):
             
             '''
-            Read a block of data from ml3. 
+            Read a block of data from the lines of ml3. 
             
             @param N_block: The index of the block (0 => 5)
             @type N_block: int
@@ -226,15 +230,29 @@ class MlineReader(MolReader,PopReader):
             else: 
                 ind0 += nblock_nline
 
-            #-- Read data and return. fn defined in mother function
-            return np.genfromtxt(fn,skip_header=ind0,max_rows=nblock,\
-                                 delimiter=[14]*8)
-        
-        #-- Grab filename and set the contents values for the six blocks.
+            #-- Select the lines of the block. As for np.genfromtxt, empty 
+            #   lines are not counted. lines defined in mother function
+            rows = []
+            i = ind0
+            while len(rows) < nblock and i < len(lines):
+                if lines[i].rstrip('\r\n'): 
+                    rows.append(lines[i])
+                i += 1
+            
+            #-- Convert all fields at once. If that fails, leave it to numpy.
+            dd = DataIO.parseFixedWidth(rows,width=14,ncols=8)
+            if dd is None:
+                dd = np.genfromtxt(fn,skip_header=ind0,max_rows=nblock,\
+                                   delimiter=[14]*8)
+            return dd
+        
+        #-- Grab filename and read the file once.
         fn = self.fn.replace('ml*','ml3')
+        FILE = open(fn,'r')
+        lines = FILE.readlines()
+        FILE.close()
         props = ['si','sf','lo','pop','DsiDloXlo','DsiDsfXsf']
-        for pr in props: 
-            self[pr] = dict()
+        self['ml3'] = dict()
         
         #-- Gather some relevant parameters. Length of block based on n_impact 
         #   and number of values (nline or ny). Assuming 8 columns.
@@ -249,22 +267,43 @@ class MlineReader(MolReader,PopReader):
         #-- Read data, looping over the 6 blocks.         
         dds = [readBlock(N) for N in xrange(6)]
         
-        #-- Set all the transition-specific information. Note indexing (0-based
-        #   in python, 1-based in fortran). Note that the arrays are reversed to
-        #   match the increasing impact parameter grid.
+        #-- Set the transition-specific information, and the level populations
+        #   for the fourth block. Every sub-block of an impact parameter is one
+        #   row after reshaping, with the values in index order. Note that the 
+        #   arrays are reversed to match the increasing impact parameter grid.
         for dd,pr in zip(dds,props):
-            if pr == 'pop': continue
-            for i in xrange(nline): 
-                self[pr][i+1] = dd[i/8::nline_l,i%8][::-1]
-                
-        #-- Set the level populations. Note indexing (0-based in python, 1-based
-        #   in fortran). Note that the arrays are reversed to match the 
-        #   increasing impact parameter grid.
-        for i in xrange(ny): 
-            self['pop'][i+1] = dds[3][i/8::ny_l,i%8][::-1]
+            nval, nval_l = (ny,ny_l) if pr == 'pop' else (nline,nline_l)
+            block = dd.reshape(n_impact,nval_l*8)[:,:nval].T[:,::-1]
+            self['ml3'][pr] = np.ascontiguousarray(block)
+            
+            #-- Note indexing (0-based in python, 1-based in fortran).
+            self[pr] = dict([(i+1,row) 
+                             for i,row in enumerate(self['ml3'][pr])])
 
     
     
+    def getML3Block(self,prop):
+    
+        '''
+        Return a block of the ml3 file for all transitions, or for all levels 
+        in case of the level populations. 
+        
+        Row i - 1 gives the values for index i as a function of the impact
+        parameter grid in getP(). The same rows are found in self[prop].
+        
+        @param prop: The requested block. One of si, sf, lo, pop, DsiDloXlo,
+                     DsiDsfXsf.
+        @type prop: str
+        
+        @return: The block, one row per index, one column per impact parameter
+        @rtype: array
+        
+        '''
+        
+        return self['ml3'][prop]
+        
+        
+        
     def getProp(self,prop):
     
         '''
@@ -11,6 +11,7 @@ import os, collections
 import numpy as np
 from cc.tools.io import DataIO
 from cc.tools.readers.Reader import Reader
+from cc.tools.numerical import Interpol
 
 import matplotlib.pyplot as p
 
@@ -240,6 +241,13 @@ class PopReader(Reader):
         for i in self.getLI():
             self['ipop'][i] = interp(x=self['p'],y=self['pop'][i],\
                                      *args,**kwargs)
+        
+        #-- The splines of all levels share their knots. Combine them so all 
+        #   levels can be evaluated at once with evalInterp.
+        self['ipop_stack'] = None
+        if interp == spline1d:
+            self['ipop_stack'] = Interpol.stackSplines([self['ipop'][i] 
+                                                        for i in self.getLI()])
             
             
     
@@ -261,6 +269,36 @@ class PopReader(Reader):
         
         
     
+    def evalInterp(self,p,index=None):
+    
+        '''
+        Evaluate the level population interpolators for a set of level indices.
+        
+        If spline interpolation is used, all levels are evaluated in a single 
+        call. 
+        
+        @param p: The impact parameters in cm
+        @type p: array
+        
+        @keyword index: The level indices. If None, all levels are returned.
+        
+                        (default: None)
+        @type index: list/array
+        
+        @return: The level populations, with shape (len(index),len(p))
+        @rtype: array
+        
+        '''
+        
+        if index is None: 
+            index = self.getLI()
+        if not self.has_key('ipop_stack') or self['ipop_stack'] is None:
+            return np.array([self.getInterp(i)(p) for i in index])
+        pops = Interpol.evalSplineStack(self['ipop_stack'],p)
+        return pops[np.array(index,dtype=int)-1]
+        
+        
+    
     def plotPop(self,fn=None):
     
         '''
@@ -165,4 +165,7 @@ class RadiatReader(MolReader):
             
             #-- Retrieve information
             self[ptype][prop] = radiat[start_i:start_i+nval]
+        
+        #-- Index the transitions by their level indices for getTI
+        self.setTIMap('trans')
         
\ No newline at end of file
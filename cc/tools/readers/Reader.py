@@ -7,9 +7,16 @@ Author: R. Lombaert
 
 """
 
+import os
+import numpy as np
+
 from cc.tools.io import DataIO
 
 
+#-- The Reader instances shared within this session. See Reader.getShared.
+shared_readers = dict()
+
+
 class Reader(dict):
     
     ''' 
@@ -53,6 +60,81 @@ class Reader(dict):
         
     
     
+    @classmethod
+    def getShared(cls,fn,*args,**kwargs):
+    
+        '''
+        Return a Reader instance for a file that is shared with every other 
+        caller asking for the same file with the same arguments. 
+        
+        The file is read only once per session, unless it changed on the hard 
+        disk. The arrays of the shared instance are made read-only, such that 
+        they are not changed by accident. Use the class itself for a private 
+        instance that can be changed.
+        
+        Typically used for input spectroscopy, e.g. 
+        >>> RadiatReader.getShared(fn,ny=ny,nline=nline)
+        
+        Additional args & kwargs are passed to the class.
+        
+        @param fn: The filename of the file that is being read. 
+        @type fn: str
+        
+        @return: The shared instance
+        @rtype: Reader()
+        
+        '''
+        
+        try:
+            stat = os.stat(fn)
+            fkey = (os.path.abspath(fn),stat.st_mtime,stat.st_size)
+        except OSError:
+            fkey = (fn,)
+        key = (cls,) + fkey + (args,tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            #-- Unhashable arguments, such as lists, cannot be shared.
+            return cls(fn,*args,**kwargs)
+        if not shared_readers.has_key(key):
+            reader = cls(fn,*args,**kwargs)
+            for v in reader.values():
+                if isinstance(v,np.ndarray):
+                    v.flags.writeable = False
+            shared_readers[key] = reader
+        return shared_readers[key]
+        
+    
+    
+    @staticmethod
+    def getSharedMemory():
+    
+        '''
+        Report the memory used by the arrays of the shared Reader instances.
+        
+        @return: The memory use in bytes for each shared instance, given by 
+                 class name, filename and the arguments of the instance.
+        @rtype: dict((str,str,tuple): int)
+        
+        '''
+        
+        return dict([((k[0].__name__,k[1],k[-2]+k[-1]),getNbytes(reader))
+                     for k,reader in shared_readers.items()])
+        
+    
+    
+    @staticmethod
+    def clearShared():
+    
+        '''
+        Forget all shared Reader instances. They are read anew when requested.
+        
+        '''
+        
+        shared_readers.clear()
+        
+    
+    
     def readFile(self,wildcard='*',*args,**kwargs):
         
         '''
@@ -116,4 +198,34 @@ class Reader(dict):
             self.readFile(wildcard,*args,**kwargs)
             
         return self['contents'][fn]
-    
\ No newline at end of file
+    
+
+
+
+def getNbytes(value):
+
+    '''
+    Estimate the memory used by the arrays held by a Reader instance or any 
+    other (nested) dictionary, list or array.
+    
+    @param value: The object
+    @type value: any
+    
+    @return: The memory use in bytes
+    @rtype: int
+    
+    '''
+    
+    if isinstance(value,np.ndarray):
+        if value.dtype.names:
+            return value.nbytes + sum([getNbytes(value[n]) 
+                                       for n in value.dtype.names
+                                       if value.dtype[n].hasobject])
+        if value.dtype.hasobject:
+            return value.nbytes + sum([getNbytes(v) for v in value.flat])
+        return value.nbytes
+    if isinstance(value,dict):
+        return sum([getNbytes(v) for v in value.values()])
+    if isinstance(value,(list,tuple)):
+        return sum([getNbytes(v) for v in value])
+    return 0
@@ -46,6 +46,10 @@ class SpectroscopyReader(Reader):
         #-- Create the dictionary instance 
         super(SpectroscopyReader,self).__init__(fn,*args,**kwargs)
         
+        #-- Maps of (lup,llow) to transition indices, one per index type. Made
+        #   by setTIMap()
+        self.__tmaps = dict()
+        
     
     
     def get(self,ptype,prop,index=None):
@@ -132,6 +136,17 @@ class SpectroscopyReader(Reader):
         if lup is None and llow is None: 
             return self[itype]['index']
         
+        #-- A single transition is looked up in the (lup,llow) map. 
+        if not lup is None and not llow is None \
+                and not isinstance(lup,collections.Iterable) \
+                and not isinstance(llow,collections.Iterable):
+            if not self.__tmaps.has_key(itype):
+                self.setTIMap(itype)
+            selection = self.__tmaps[itype].get((lup,llow),[])
+            if len(selection) == 1:
+                return selection[0]
+            return np.array(selection,dtype=self[itype]['index'].dtype)
+        
         #-- Check for matches for given lup and llow. Will be empty array if no
         #   match found.
         bools = np.ones(shape=self[itype]['index'].shape,dtype=bool)
@@ -153,6 +168,29 @@ class SpectroscopyReader(Reader):
     
     
     
+    def setTIMap(self,itype):
+        
+        '''
+        Map the upper and lower level indices of the transitions to the 
+        transition indices, for fast look up of single transitions in getTI.
+        
+        Done once for every type of index. Readers call this at the end of 
+        their read method, or getTI does on first use.
+        
+        @param itype: The type of index. 'trans' or 'coll_trans'.
+        @type itype: str
+        
+        '''
+        
+        tmap = dict()
+        for i,lup,llow in zip(self[itype]['index'].tolist(),\
+                              self[itype]['lup'].tolist(),\
+                              self[itype]['llow'].tolist()):
+            tmap.setdefault((lup,llow),[]).append(i)
+        self.__tmaps[itype] = tmap
+        
+        
+        
     def getTUpper(self,index=None,itype='trans'):
         
         '''
@@ -67,7 +67,8 @@ class SphinxReader(Reader):
         
         
         self['sph1'] = dict()
-        data = DataIO.readCols(self.fn.replace('*','1'),start_row=1)
+        data = DataIO.readCols(self.fn.replace('*','1'),start_row=1,\
+                                binary=1)
         self['sph1']['p'] = data[0]
         self['sph1']['norm_intens'] = data[1] 
         self['sph1']['weighted_intens'] = data[2] 